@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.repositories.calc_result import CalcResultRepository
+from app.services.calc_export import EXPORT_FORMATS, CalcExportService, row_cursor
+from app.session_manager.session_manager import make_session_manager
+
+log = logging.getLogger(__name__)
+
+TAIL_BYTES = 64 * 1024
+
+
+def resume_cursor(path: Path, export_format: str) -> tuple[datetime, int] | None:
+    if not path.exists():
+        return None
+    with path.open("r+b") as file:
+        size = file.seek(0, os.SEEK_END)
+        start = file.seek(max(0, size - TAIL_BYTES))
+        tail = file.read()
+        complete = tail.rfind(b"\n") + 1
+        if complete < len(tail):
+            file.truncate(start + complete)
+            log.info(
+                "Отброшена неполная последняя строка: %s байт", len(tail) - complete
+            )
+        lines = tail[:complete].splitlines()
+    if not lines:
+        return None
+    return row_cursor(lines[-1], export_format)
+
+
+async def export_results(
+    service: CalcExportService,
+    path: Path,
+    *,
+    export_format: str,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    resume: bool = False,
+) -> int:
+    after = resume_cursor(path, export_format) if resume else None
+    if after is not None:
+        log.info("Выгрузка продолжается после (%s, %s)", after[0].isoformat(), after[1])
+    rows = 0
+    with path.open("ab" if after is not None else "wb") as file:
+        async for chunk in service.export(
+            export_format=export_format,
+            after=after,
+            created_from=created_from,
+            created_to=created_to,
+        ):
+            file.write(chunk)
+            file.flush()
+            rows += chunk.count(b"\n")
+            log.info("Выгружено строк: %s", rows)
+    return rows
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.main import DATABASE_DSN, POSTGRES_SCHEMA, async_session_ctx
+
+    engine = create_async_engine(
+        DATABASE_DSN,
+        connect_args={"server_settings": {"search_path": POSTGRES_SCHEMA}},
+    )
+    session_manager = make_session_manager(
+        session_factory=async_sessionmaker(bind=engine, expire_on_commit=False),
+        session_ctx=async_session_ctx,
+    )
+    try:
+        rows = await export_results(
+            CalcExportService(
+                calc_result_repository=CalcResultRepository(
+                    session_manager=session_manager
+                ),
+                chunk_size=args.chunk_size,
+            ),
+            args.out,
+            export_format=args.format,
+            created_from=args.start,
+            created_to=args.end,
+            resume=args.resume,
+        )
+        log.info("Выгрузка calc_results завершена: %s строк в %s", rows, args.out)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Потоковая выгрузка calc_results в NDJSON или CSV"
+    )
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить после последней полной строки файла --out",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
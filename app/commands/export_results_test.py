@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.commands.export_results import export_results, resume_cursor
+from app.services.calc_export import CalcExportService
+
+NOW = datetime(2025, 11, 14, 12, tzinfo=timezone.utc)
+
+
+def make_service(*chunks):
+    service = MagicMock(spec=CalcExportService)
+    calls = []
+
+    async def export(**kwargs):
+        calls.append(kwargs)
+        for chunk in chunks:
+            yield chunk
+
+    service.export.side_effect = export
+    return service, calls
+
+
+@pytest.mark.asyncio
+async def test_resume_drops_partial_line_and_continues_after_last_row(tmp_path):
+    path = tmp_path / "results.ndjson"
+    path.write_bytes(
+        b'{"id":1,"total_cost_rub":"1.00","created_at":"2025-11-14T12:00:00+00:00"}\n'
+        b'{"id":2,"total_cost_rub":"2.00","created_at":"2025-11-14T12:00:00+00:00"}\n'
+        b'{"id":3,"total_cost_'
+    )
+    service, calls = make_service(
+        b'{"id":3,"total_cost_rub":"3.00","created_at":"2025-11-14T12:00:00+00:00"}\n'
+    )
+
+    rows = await export_results(service, path, export_format="ndjson", resume=True)
+
+    assert rows == 1
+    assert calls[0]["after"] == (NOW, 2)
+    assert [line[:7] for line in path.read_bytes().splitlines()] == [
+        b'{"id":1',
+        b'{"id":2',
+        b'{"id":3',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_without_resume_or_rows_starts_from_scratch(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_bytes(b"id,total_cost_rub,created_at\n")
+    service, calls = make_service(
+        b"id,total_cost_rub,created_at\n", b"1,1.00,2025-11-14T12:00:00+00:00\n"
+    )
+
+    await export_results(service, path, export_format="csv", resume=True)
+
+    assert calls[0]["after"] is None
+    assert path.read_bytes().count(b"id,total_cost_rub") == 1
+    assert resume_cursor(path, "csv") == (NOW, 1)
+    assert resume_cursor(tmp_path / "missing.csv", "csv") is None
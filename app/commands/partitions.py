@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+import asyncpg
+
+log = logging.getLogger(__name__)
+
+PARENT_TABLE = "calc_results"
+PARTITION_PREFIX = "calc_results_p"
+DEFAULT_PARTITION = "calc_results_default"
+DEFAULT_BOUND = "DEFAULT"
+ITEMS_TABLE = "calc_result_items"
+
+LIST_PARTITIONS_SQL = """
+SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_namespace n ON n.oid = p.relnamespace
+WHERE n.nspname = $1 AND p.relname = $2
+"""
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+_SHORT_OFFSET_RE = re.compile(r"([+-]\d{2})$")
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: datetime | None
+    upper: datetime | None
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1)
+
+
+def parse_bound(bound: str) -> tuple[datetime | None, datetime | None]:
+    match = _BOUND_RE.search(bound)
+    if match is None:
+        raise ValueError(f"Неподдерживаемая граница секции: {bound}")
+    return tuple(
+        None
+        if value in ("MINVALUE", "MAXVALUE")
+        else datetime.fromisoformat(_SHORT_OFFSET_RE.sub(r"\1:00", value))
+        for value in (v.strip("'") for v in match.groups())
+    )
+
+
+def plan_partitions(
+    existing: list[Partition], now: datetime, premake_months: int
+) -> list[Partition]:
+    planned = []
+    for offset in range(premake_months + 1):
+        lower = add_months(month_start(now), offset)
+        upper = add_months(lower, 1)
+        overlaps = any(
+            (p.lower is None or p.lower < upper)
+            and (p.upper is None or lower < p.upper)
+            for p in existing
+        )
+        if not overlaps:
+            planned.append(Partition(f"{PARTITION_PREFIX}{lower:%Y%m}", lower, upper))
+    return planned
+
+
+def expired_partitions(
+    existing: list[Partition], now: datetime, retention_months: int
+) -> list[Partition]:
+    cutoff = add_months(month_start(now), -retention_months)
+    return sorted(
+        (p for p in existing if p.upper is not None and p.upper <= cutoff),
+        key=lambda p: p.upper,
+    )
+
+
+async def list_partitions(
+    connection: asyncpg.Connection, schema: str
+) -> list[Partition]:
+    records = await connection.fetch(LIST_PARTITIONS_SQL, schema, PARENT_TABLE)
+    return [
+        Partition(r["name"], *parse_bound(r["bound"]))
+        for r in records
+        if r["bound"] != DEFAULT_BOUND
+    ]
+
+
+async def create_partition(
+    connection: asyncpg.Connection, schema: str, partition: Partition
+) -> None:
+    async with connection.transaction():
+        await connection.execute(
+            f'CREATE TABLE "{schema}"."{partition.name}" '
+            f'(LIKE "{schema}"."{PARENT_TABLE}" INCLUDING DEFAULTS)'
+        )
+        moved = await connection.execute(
+            f'WITH moved AS (DELETE FROM "{schema}"."{DEFAULT_PARTITION}" '
+            "WHERE created_at >= $1 AND created_at < $2 RETURNING *) "
+            f'INSERT INTO "{schema}"."{partition.name}" SELECT * FROM moved',
+            partition.lower,
+            partition.upper,
+        )
+        await connection.execute(
+            f'ALTER TABLE "{schema}"."{PARENT_TABLE}" '
+            f'ATTACH PARTITION "{schema}"."{partition.name}" '
+            f"FOR VALUES FROM ('{partition.lower.isoformat()}') "
+            f"TO ('{partition.upper.isoformat()}')"
+        )
+    rows = int(moved.split()[-1])
+    if rows:
+        log.warning(
+            "Секция %s создана с опозданием: из %s перенесено %s строк",
+            partition.name,
+            DEFAULT_PARTITION,
+            rows,
+        )
+    log.info("Создана секция %s", partition.name)
+
+
+async def _archive(path: Path, copy, *args, **kwargs) -> None:
+    tmp_path = path.with_suffix(".gz.tmp")
+    with gzip.open(tmp_path, "wb") as archive:
+
+        async def write(chunk: bytes) -> None:
+            archive.write(chunk)
+
+        await copy(*args, output=write, format="csv", header=True, **kwargs)
+    os.replace(tmp_path, path)
+
+
+async def archive_partition(
+    connection: asyncpg.Connection,
+    schema: str,
+    partition: Partition,
+    archive_dir: Path,
+) -> Path:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{partition.name}.csv.gz"
+    await _archive(
+        path,
+        connection.copy_from_table,
+        partition.name,
+        schema_name=schema,
+    )
+    log.info("Секция %s выгружена в %s", partition.name, path)
+    items_path = archive_dir / f"{partition.name}_items.csv.gz"
+    await _archive(
+        items_path,
+        connection.copy_from_query,
+        f'SELECT * FROM "{schema}".{ITEMS_TABLE} WHERE result_created_at < $1',
+        partition.upper,
+    )
+    log.info("Строки расчетов секции %s выгружены в %s", partition.name, items_path)
+
+    async with connection.transaction():
+        await connection.execute(
+            f'ALTER TABLE "{schema}"."{PARENT_TABLE}" '
+            f'DETACH PARTITION "{schema}"."{partition.name}"'
+        )
+        await connection.execute(
+            f'DELETE FROM "{schema}".calc_result_idempotency_keys '
+            "WHERE result_created_at < $1",
+            partition.upper,
+        )
+        await connection.execute(
+            f'DELETE FROM "{schema}".{ITEMS_TABLE} WHERE result_created_at < $1',
+            partition.upper,
+        )
+        await connection.execute(f'DROP TABLE "{schema}"."{partition.name}"')
+    log.info("Секция %s отсоединена и удалена", partition.name)
+    return path
+
+
+async def maintain_partitions(
+    connection: asyncpg.Connection,
+    *,
+    schema: str,
+    now: datetime,
+    premake_months: int,
+    retention_months: int,
+    archive_dir: Path,
+) -> None:
+    existing = await list_partitions(connection, schema)
+    for partition in plan_partitions(existing, now, premake_months):
+        await create_partition(connection, schema, partition)
+    for partition in expired_partitions(existing, now, retention_months):
+        await archive_partition(connection, schema, partition, archive_dir)
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.main import (
+        ASYNCPG_DSN,
+        CALC_ARCHIVE_DIR,
+        CALC_PARTITION_PREMAKE_MONTHS,
+        CALC_RETENTION_MONTHS,
+        POSTGRES_SCHEMA,
+    )
+
+    if args.premake_months is None:
+        args.premake_months = CALC_PARTITION_PREMAKE_MONTHS
+    if args.retention_months is None:
+        args.retention_months = CALC_RETENTION_MONTHS
+
+    connection = await asyncpg.connect(ASYNCPG_DSN, server_settings={"timezone": "UTC"})
+    try:
+        await maintain_partitions(
+            connection,
+            schema=POSTGRES_SCHEMA,
+            now=datetime.now(timezone.utc),
+            premake_months=args.premake_months,
+            retention_months=args.retention_months,
+            archive_dir=Path(args.archive_dir or CALC_ARCHIVE_DIR),
+        )
+    finally:
+        await connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Обслуживание секций calc_results: создание, архивация, удаление"
+    )
+    parser.add_argument("--premake-months", type=int)
+    parser.add_argument("--retention-months", type=int)
+    parser.add_argument("--archive-dir")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import asyncpg
+import pytest
+
+from app.commands.partitions import (
+    Partition,
+    add_months,
+    expired_partitions,
+    list_partitions,
+    maintain_partitions,
+    month_start,
+    parse_bound,
+    plan_partitions,
+)
+
+TEST_POSTGRES_DSN = os.getenv("TEST_POSTGRES_DSN")
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+TEST_SCHEMA = "calc_partitions_test"
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+NOW = utc(2025, 11, 14, 12)
+LEGACY = Partition("calc_results_legacy", None, utc(2025, 12, 1))
+
+
+def test_parse_bound():
+    assert parse_bound("FOR VALUES FROM (MINVALUE) TO ('2025-12-01 00:00:00+00')") == (
+        None,
+        utc(2025, 12, 1),
+    )
+    assert parse_bound(
+        "FOR VALUES FROM ('2025-12-01 00:00:00+00') TO ('2026-01-01 00:00:00+00')"
+    ) == (utc(2025, 12, 1), utc(2026, 1, 1))
+
+
+def test_add_months_crosses_year():
+    assert add_months(utc(2025, 11, 1), 3) == utc(2026, 2, 1)
+    assert add_months(utc(2025, 1, 1), -1) == utc(2024, 12, 1)
+
+
+def test_plan_partitions_skips_covered_months():
+    planned = plan_partitions([LEGACY], NOW, premake_months=2)
+
+    assert planned == [
+        Partition("calc_results_p202512", utc(2025, 12, 1), utc(2026, 1, 1)),
+        Partition("calc_results_p202601", utc(2026, 1, 1), utc(2026, 2, 1)),
+    ]
+
+
+def test_expired_partitions_respects_retention():
+    old = Partition("calc_results_p202409", utc(2024, 9, 1), utc(2024, 10, 1))
+    recent = Partition("calc_results_p202411", utc(2024, 11, 1), utc(2024, 12, 1))
+
+    assert expired_partitions([recent, old, LEGACY], NOW, retention_months=12) == [old]
+
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_archives_before_dropping(tmp_path: Path):
+    connection = AsyncMock()
+    connection.transaction = lambda: AsyncMock()
+    connection.execute.return_value = "INSERT 0 0"
+    connection.fetch.return_value = [
+        {"name": "calc_results_default", "bound": "DEFAULT"},
+        {
+            "name": "calc_results_p202409",
+            "bound": "FOR VALUES FROM ('2024-09-01 00:00:00+00') "
+            "TO ('2024-10-01 00:00:00+00')",
+        },
+        {
+            "name": "calc_results_p202511",
+            "bound": "FOR VALUES FROM ('2025-11-01 00:00:00+00') "
+            "TO ('2025-12-01 00:00:00+00')",
+        },
+    ]
+
+    async def copy_from_table(table, *, schema_name, output, format, header):
+        await output(b"id,total_cost_rub,created_at\n1,10.00,2024-09-02\n")
+
+    connection.copy_from_table.side_effect = copy_from_table
+
+    async def copy_from_query(query, *args, output, format, header):
+        await output(b"result_id,line_no\n1,1\n")
+
+    connection.copy_from_query.side_effect = copy_from_query
+
+    await maintain_partitions(
+        connection,
+        schema="calc_schema",
+        now=NOW,
+        premake_months=1,
+        retention_months=12,
+        archive_dir=tmp_path,
+    )
+
+    statements = [c.args[0] for c in connection.execute.await_args_list]
+    assert statements[0].startswith('CREATE TABLE "calc_schema"."calc_results_p202512"')
+    assert 'DELETE FROM "calc_schema"."calc_results_default"' in statements[1]
+    assert "ATTACH PARTITION" in statements[2]
+    assert "DETACH PARTITION" in statements[3]
+    assert statements[-1] == 'DROP TABLE "calc_schema"."calc_results_p202409"'
+    assert "calc_result_items WHERE result_created_at < $1" in statements[-2]
+    assert connection.copy_from_query.await_args.args[1] == utc(2024, 10, 1)
+    archive = tmp_path / "calc_results_p202409.csv.gz"
+    assert archive.exists()
+    assert (tmp_path / "calc_results_p202409_items.csv.gz").exists()
+
+
+@pytest.mark.skipif(TEST_POSTGRES_DSN is None, reason="TEST_POSTGRES_DSN не задан")
+@pytest.mark.asyncio
+async def test_retention_with_default_partition_on_postgres(tmp_path: Path):
+    connection = await asyncpg.connect(
+        TEST_POSTGRES_DSN, server_settings={"timezone": "UTC"}
+    )
+    try:
+        await connection.execute(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE")
+        for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            await connection.execute(
+                migration.read_text().replace("calc_schema", TEST_SCHEMA)
+            )
+        result_id, created_at = await connection.fetchrow(
+            f"INSERT INTO {TEST_SCHEMA}.calc_results (total_cost_rub) "
+            "VALUES (10) RETURNING id, created_at"
+        )
+        await connection.execute(
+            f"INSERT INTO {TEST_SCHEMA}.calc_result_items "
+            "(result_id, line_no, result_created_at, qty, price_rub) "
+            "VALUES ($1, 1, $2, 1, 10)",
+            result_id,
+            created_at,
+        )
+        now = add_months(month_start(datetime.now(timezone.utc)), 28)
+
+        await maintain_partitions(
+            connection,
+            schema=TEST_SCHEMA,
+            now=now,
+            premake_months=1,
+            retention_months=12,
+            archive_dir=tmp_path,
+        )
+
+        remaining = await list_partitions(connection, TEST_SCHEMA)
+        items = await connection.fetchval(
+            f"SELECT count(*) FROM {TEST_SCHEMA}.calc_result_items"
+        )
+        default = await connection.fetchval(
+            f"SELECT to_regclass('{TEST_SCHEMA}.calc_results_default')"
+        )
+    finally:
+        await connection.execute(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE")
+        await connection.close()
+
+    assert [p.lower for p in remaining] == [now, add_months(now, 1)]
+    assert items == 0
+    assert default is not None
+    assert (tmp_path / "calc_results_legacy.csv.gz").exists()
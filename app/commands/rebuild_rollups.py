@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.repositories.calc_result import CalcResultRepository
+from app.repositories.calc_result_rollup import iter_day_windows
+from app.session_manager.session_manager import make_session_manager
+
+log = logging.getLogger(__name__)
+
+
+async def rebuild_rollups(
+    repo: CalcResultRepository,
+    *,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    chunk_days: int = 1,
+) -> int:
+    if start is None or end is None:
+        first, last = await repo.created_at_range()
+        if first is None:
+            log.info("Таблица calc_results пуста, пересчитывать нечего")
+            return 0
+        start = start or first
+        end = end or last + timedelta(microseconds=1)
+
+    total = 0
+    for window_start, window_end in iter_day_windows(start, end, chunk_days):
+        inserted = await repo.rebuild_rollups(start=window_start, end=window_end)
+        total += inserted
+        log.info(
+            "Агрегаты пересчитаны за [%s, %s): %s строк",
+            window_start.isoformat(),
+            window_end.isoformat(),
+            inserted,
+        )
+    return total
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.main import DATABASE_DSN, POSTGRES_SCHEMA, async_session_ctx
+
+    engine = create_async_engine(
+        DATABASE_DSN,
+        connect_args={"server_settings": {"search_path": POSTGRES_SCHEMA}},
+    )
+    session_manager = make_session_manager(
+        session_factory=async_sessionmaker(bind=engine, expire_on_commit=False),
+        session_ctx=async_session_ctx,
+    )
+    try:
+        total = await rebuild_rollups(
+            CalcResultRepository(session_manager=session_manager),
+            start=args.start,
+            end=args.end,
+            chunk_days=args.chunk_days,
+        )
+        log.info("Пересчет агрегатов завершен: %s строк", total)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Пересчет агрегатов calc_result_rollups по сырой таблице"
+    )
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat)
+    parser.add_argument("--chunk-days", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.commands.rebuild_rollups import rebuild_rollups
+from app.repositories.calc_result import CalcResultRepository
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_rollups_walks_whole_day_windows():
+    repo = AsyncMock(spec=CalcResultRepository)
+    repo.created_at_range.return_value = (utc(2025, 1, 1, 15), utc(2025, 1, 3, 8))
+    repo.rebuild_rollups.return_value = 10
+
+    total = await rebuild_rollups(repo, chunk_days=1)
+
+    assert total == 30
+    assert [c.kwargs for c in repo.rebuild_rollups.await_args_list] == [
+        {"start": utc(2025, 1, 1), "end": utc(2025, 1, 2)},
+        {"start": utc(2025, 1, 2), "end": utc(2025, 1, 3)},
+        {"start": utc(2025, 1, 3), "end": utc(2025, 1, 4)},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_rollups_on_empty_table_does_nothing():
+    repo = AsyncMock(spec=CalcResultRepository)
+    repo.created_at_range.return_value = (None, None)
+
+    assert await rebuild_rollups(repo) == 0
+    repo.rebuild_rollups.assert_not_awaited()
@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from multiprocessing.synchronize import Event
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import uvicorn
+from prometheus_client import multiprocess
+
+log = logging.getLogger(__name__)
+
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+ROLLING_RESTART_SPARE_WORKERS = 1
+
+
+class PoolBudget(NamedTuple):
+    pool_size: int
+    max_overflow: int
+
+
+def cgroup_cpu_limit(path: Path = CGROUP_CPU_MAX) -> int | None:
+    try:
+        quota, period = path.read_text().split()
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return max(math.ceil(int(quota) / int(period)), 1)
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return max(cpus, 1)
+
+
+def worker_count(configured: int, cpus: int) -> int:
+    return configured if configured > 0 else cpus
+
+
+def split_connection_budget(
+    budget: int,
+    workers: int,
+    pool_size: int,
+    max_overflow: int,
+    *,
+    pools: int = 1,
+    reserved: int = 0,
+) -> PoolBudget:
+    if budget <= 0:
+        return PoolBudget(pool_size, max_overflow)
+    per_worker = budget // (workers + ROLLING_RESTART_SPARE_WORKERS)
+    per_pool = (per_worker - reserved) // pools
+    if per_pool < 1:
+        raise ValueError(
+            f"Бюджет соединений {budget} недостаточен для "
+            f"{workers} + {ROLLING_RESTART_SPARE_WORKERS} воркеров: "
+            f"на воркер {pools} пулов и {reserved} отдельных соединений"
+        )
+    size = min(pool_size, per_pool)
+    return PoolBudget(size, min(max_overflow, per_pool - size))
+
+
+def connection_consumers(
+    *, replicas: int, asyncpg_pool: bool, price_listener: bool
+) -> tuple[int, int]:
+    pools = 1 + replicas + (1 if asyncpg_pool else 0)
+    reserved = 1 if price_listener else 0
+    return pools, reserved
+
+
+def prepare_metrics_dir(configured: str) -> Path:
+    if not configured:
+        return Path(tempfile.mkdtemp(prefix="calc-metrics-"))
+    path = Path(configured)
+    path.mkdir(parents=True, exist_ok=True)
+    for stale in path.glob("*.db"):
+        stale.unlink()
+    return path
+
+
+def serve_worker(sock: socket.socket, ready: Event, app: str, log_level: str) -> None:
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_level=log_level, lifespan="on", log_config=None)
+    )
+
+    async def serve() -> None:
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            ready.set()
+        await task
+
+    asyncio.run(serve())
+
+
+class Worker(NamedTuple):
+    process: multiprocessing.process.BaseProcess
+    ready: Event
+
+
+class Supervisor:
+    def __init__(
+        self,
+        *,
+        sock: socket.socket,
+        workers: int,
+        target: Callable[..., None],
+        target_args: tuple = (),
+        ready_timeout: float,
+        graceful_timeout: float,
+        metrics_dir: Path | None = None,
+    ):
+        self.sock = sock
+        self.workers = workers
+        self.target = target
+        self.target_args = target_args
+        self.ready_timeout = ready_timeout
+        self.graceful_timeout = graceful_timeout
+        self.metrics_dir = metrics_dir
+        self.running: list[Worker] = []
+        self._context = multiprocessing.get_context("spawn")
+        self._restart_requested = False
+        self._stopping = False
+
+    def spawn(self) -> Worker:
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=self.target, args=(self.sock, ready, *self.target_args)
+        )
+        process.start()
+        log.info("Запущен воркер %s", process.pid)
+        return Worker(process, ready)
+
+    def wait_ready(self, worker: Worker) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if worker.ready.wait(0.1):
+                return True
+            if not worker.process.is_alive():
+                return False
+        return False
+
+    def stop(self, worker: Worker) -> None:
+        worker.process.terminate()
+        worker.process.join(self.graceful_timeout)
+        if worker.process.is_alive():
+            log.warning(
+                "Воркер %s не завершился за %s с, принудительная остановка",
+                worker.process.pid,
+                self.graceful_timeout,
+            )
+            worker.process.kill()
+            worker.process.join()
+        self.forget_metrics(worker)
+        log.info("Воркер %s остановлен", worker.process.pid)
+
+    def forget_metrics(self, worker: Worker) -> None:
+        if self.metrics_dir is not None:
+            multiprocess.mark_process_dead(worker.process.pid, str(self.metrics_dir))
+
+    def start(self) -> None:
+        started = [self.spawn() for _ in range(self.workers)]
+        for worker in started:
+            if not self.wait_ready(worker):
+                for other in started:
+                    self.stop(other)
+                raise RuntimeError(
+                    f"Воркер {worker.process.pid} не стал готов "
+                    f"за {self.ready_timeout} с"
+                )
+        self.running = started
+        log.info("Все воркеры готовы: %s", len(self.running))
+
+    def rolling_restart(self) -> None:
+        log.info("Поочередный перезапуск %s воркеров", len(self.running))
+        for old in list(self.running):
+            new = self.spawn()
+            if not self.wait_ready(new):
+                self.stop(new)
+                log.error(
+                    "Новый воркер не стал готов, перезапуск прерван; "
+                    "старые воркеры продолжают работу"
+                )
+                return
+            self.running[self.running.index(old)] = new
+            self.stop(old)
+        log.info("Поочередный перезапуск завершен")
+
+    def replace_dead(self) -> None:
+        for i, worker in enumerate(self.running):
+            if not worker.process.is_alive():
+                log.warning(
+                    "Воркер %s завершился с кодом %s, запускается замена",
+                    worker.process.pid,
+                    worker.process.exitcode,
+                )
+                self.forget_metrics(worker)
+                self.running[i] = self.spawn()
+
+    def shutdown(self) -> None:
+        log.info("Остановка воркеров")
+        for worker in self.running:
+            worker.process.terminate()
+        for worker in self.running:
+            self.stop(worker)
+        self.running = []
+
+    def request_restart(self, *_) -> None:
+        self._restart_requested = True
+
+    def request_stop(self, *_) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGHUP, self.request_restart)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        self.start()
+        try:
+            while True:
+                time.sleep(0.5)
+                if self._stopping:
+                    break
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.rolling_restart()
+                self.replace_dead()
+        finally:
+            self.shutdown()
+
+
+def run(args: argparse.Namespace) -> None:
+    from app.main import (
+        APP_GRACEFUL_TIMEOUT,
+        APP_HOST,
+        APP_LOG_LEVEL,
+        APP_METRICS_ENABLED,
+        APP_PORT,
+        APP_WORKER_READY_TIMEOUT,
+        APP_WORKERS,
+        CALC_CATALOG_ENABLED,
+        CALC_REPOSITORY_BACKEND,
+        DATABASE_IS_SQLITE,
+        POSTGRES_CONNECTION_BUDGET,
+        POSTGRES_MAX_OVERFLOW,
+        POSTGRES_POOL_SIZE,
+        POSTGRES_REPLICA_HOSTS,
+    )
+
+    cpus = available_cpus()
+    workers = worker_count(
+        args.workers if args.workers is not None else APP_WORKERS, cpus
+    )
+    pools, reserved = connection_consumers(
+        replicas=len(POSTGRES_REPLICA_HOSTS),
+        asyncpg_pool=CALC_REPOSITORY_BACKEND == "asyncpg",
+        price_listener=CALC_CATALOG_ENABLED and not DATABASE_IS_SQLITE,
+    )
+    budget = split_connection_budget(
+        POSTGRES_CONNECTION_BUDGET,
+        workers,
+        POSTGRES_POOL_SIZE,
+        POSTGRES_MAX_OVERFLOW,
+        pools=pools,
+        reserved=reserved,
+    )
+    os.environ["POSTGRES_POOL_SIZE"] = str(budget.pool_size)
+    os.environ["POSTGRES_MAX_OVERFLOW"] = str(budget.max_overflow)
+    log.info(
+        "Воркеров: %s (доступно CPU: %s), пулов на воркер: %s по %s + %s, "
+        "отдельных соединений: %s",
+        workers,
+        cpus,
+        pools,
+        budget.pool_size,
+        budget.max_overflow,
+        reserved,
+    )
+
+    configured_metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+    metrics_dir = None
+    if APP_METRICS_ENABLED:
+        metrics_dir = prepare_metrics_dir(configured_metrics_dir)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(metrics_dir)
+        log.info("Метрики воркеров собираются в %s", metrics_dir)
+
+    config = uvicorn.Config(args.app, host=APP_HOST, port=APP_PORT)
+    sock = config.bind_socket()
+    try:
+        Supervisor(
+            sock=sock,
+            workers=workers,
+            target=serve_worker,
+            target_args=(args.app, APP_LOG_LEVEL.lower()),
+            ready_timeout=APP_WORKER_READY_TIMEOUT,
+            graceful_timeout=APP_GRACEFUL_TIMEOUT,
+            metrics_dir=metrics_dir,
+        ).run()
+    finally:
+        if metrics_dir is not None and not configured_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Запуск воркеров uvicorn с бюджетом соединений и "
+        "поочередным перезапуском по SIGHUP"
+    )
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--app", default="app.main:app")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
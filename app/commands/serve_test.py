@@ -0,0 +1,147 @@
+import socket
+import time
+
+import pytest
+
+from app.commands.serve import (
+    PoolBudget,
+    Supervisor,
+    cgroup_cpu_limit,
+    connection_consumers,
+    prepare_metrics_dir,
+    split_connection_budget,
+    worker_count,
+)
+
+
+def ready_worker(sock, ready):
+    ready.set()
+    time.sleep(60)
+
+
+def failing_worker(sock, ready):
+    raise SystemExit(3)
+
+
+@pytest.fixture
+def supervisor():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    supervisor = Supervisor(
+        sock=sock,
+        workers=2,
+        target=ready_worker,
+        ready_timeout=20,
+        graceful_timeout=5,
+    )
+    yield supervisor
+    supervisor.shutdown()
+    sock.close()
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [("max 100000", None), ("150000 100000", 2), ("50000 100000", 1), ("", None)],
+)
+def test_cgroup_cpu_limit(tmp_path, content, expected):
+    path = tmp_path / "cpu.max"
+    path.write_text(content)
+
+    assert cgroup_cpu_limit(path) == expected
+
+
+def test_cgroup_cpu_limit_without_cgroup_file(tmp_path):
+    assert cgroup_cpu_limit(tmp_path / "missing") is None
+
+
+def test_worker_count_defaults_to_available_cpus():
+    assert worker_count(0, 6) == 6
+    assert worker_count(3, 6) == 3
+
+
+def test_split_connection_budget_reserves_room_for_rolling_restart():
+    assert split_connection_budget(50, 4, 5, 10) == PoolBudget(5, 5)
+    assert split_connection_budget(12, 5, 5, 10) == PoolBudget(2, 0)
+    assert split_connection_budget(0, 4, 5, 10) == PoolBudget(5, 10)
+    with pytest.raises(ValueError):
+        split_connection_budget(3, 4, 5, 10)
+
+
+def test_split_connection_budget_counts_every_pool_and_listener():
+    pools, reserved = connection_consumers(
+        replicas=2, asyncpg_pool=True, price_listener=True
+    )
+    budget = split_connection_budget(100, 4, 5, 10, pools=pools, reserved=reserved)
+
+    assert (pools, reserved) == (4, 1)
+    assert budget == PoolBudget(4, 0)
+    per_worker = pools * (budget.pool_size + budget.max_overflow) + reserved
+    assert per_worker * (4 + 1) <= 100
+    assert connection_consumers(
+        replicas=0, asyncpg_pool=False, price_listener=False
+    ) == (1, 0)
+    with pytest.raises(ValueError):
+        split_connection_budget(20, 4, 5, 10, pools=4, reserved=1)
+
+
+def test_rolling_restart_replaces_workers_one_at_a_time(supervisor):
+    supervisor.start()
+    old_pids = [w.process.pid for w in supervisor.running]
+    alive_at_spawn = []
+    spawn = supervisor.spawn
+
+    def counting_spawn():
+        alive_at_spawn.append(sum(w.process.is_alive() for w in supervisor.running))
+        return spawn()
+
+    supervisor.spawn = counting_spawn
+    supervisor.rolling_restart()
+
+    new_pids = [w.process.pid for w in supervisor.running]
+    assert alive_at_spawn == [2, 2]
+    assert set(old_pids).isdisjoint(new_pids)
+    assert all(w.process.is_alive() for w in supervisor.running)
+
+
+def test_rolling_restart_keeps_old_workers_when_new_one_fails(supervisor):
+    supervisor.start()
+    old_pids = [w.process.pid for w in supervisor.running]
+
+    supervisor.target = failing_worker
+    supervisor.rolling_restart()
+
+    assert [w.process.pid for w in supervisor.running] == old_pids
+    assert all(w.process.is_alive() for w in supervisor.running)
+
+
+def test_prepare_metrics_dir_clears_files_of_previous_run(tmp_path):
+    (tmp_path / "counter_123.db").write_bytes(b"")
+    (tmp_path / "gauge_livesum_123.db").write_bytes(b"")
+
+    assert prepare_metrics_dir(str(tmp_path)) == tmp_path
+    assert list(tmp_path.iterdir()) == []
+
+    created = prepare_metrics_dir("")
+    assert created.is_dir()
+    created.rmdir()
+
+
+def test_replaced_worker_live_gauges_are_dropped(supervisor, tmp_path):
+    supervisor.metrics_dir = tmp_path
+    supervisor.start()
+    dead, alive = supervisor.running
+    for worker in (dead, alive):
+        (tmp_path / f"gauge_livesum_{worker.process.pid}.db").write_bytes(b"")
+        (tmp_path / f"counter_{worker.process.pid}.db").write_bytes(b"")
+
+    dead.process.kill()
+    dead.process.join()
+    supervisor.replace_dead()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [
+            f"counter_{dead.process.pid}.db",
+            f"counter_{alive.process.pid}.db",
+            f"gauge_livesum_{alive.process.pid}.db",
+        ]
+    )
@@ -0,0 +1,123 @@
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import TextIO
+
+import orjson
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, trace_id_ctx: ContextVar[str | None] | None = None):
+        super().__init__()
+        self._trace_id_ctx = trace_id_ctx
+
+    def format(self, record: logging.LogRecord) -> str:
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id is None and self._trace_id_ctx is not None:
+            trace_id = self._trace_id_ctx.get()
+        data = {
+            "trace_id": trace_id,
+            "timestamp": datetime.fromtimestamp(
+                record.created, tz=timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "source": f"{record.pathname}:{record.lineno}",
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return orjson.dumps(data).decode()
+
+
+class TraceIdQueueHandler(QueueHandler):
+    def __init__(
+        self,
+        log_queue: queue.SimpleQueue,
+        trace_id_ctx: ContextVar[str | None] | None = None,
+    ):
+        super().__init__(log_queue)
+        self._trace_id_ctx = trace_id_ctx
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if self._trace_id_ctx is not None:
+            record.trace_id = self._trace_id_ctx.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(
+        self,
+        rates: dict[str, float],
+        *,
+        max_level: int = logging.INFO,
+        rand=random.random,
+    ):
+        super().__init__()
+        self._rates = rates
+        self._max_level = max_level
+        self._rand = rand
+        self._resolved: dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self._max_level:
+            return True
+        rate = self._resolved.get(record.name)
+        if rate is None:
+            rate = self._resolved[record.name] = self._rate_for(record.name)
+        return rate >= 1 or self._rand() < rate
+
+    def _rate_for(self, name: str) -> float:
+        while name:
+            if name in self._rates:
+                return self._rates[name]
+            name = name.rpartition(".")[0]
+        return self._rates.get("", 1.0)
+
+
+def parse_sampling_rates(value: str) -> dict[str, float]:
+    rates = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.rpartition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(
+    *,
+    level: str,
+    trace_id_ctx: ContextVar[str | None] | None = None,
+    sampling_rates: dict[str, float] | None = None,
+    stream: TextIO = sys.stdout,
+) -> QueueListener:
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter(trace_id_ctx))
+    stream_handler.setLevel(level)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = TraceIdQueueHandler(log_queue, trace_id_ctx)
+    queue_handler.setLevel(level)
+    if sampling_rates:
+        queue_handler.addFilter(SamplingFilter(sampling_rates))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,96 @@
+import io
+import json
+import logging
+import queue
+from contextvars import ContextVar
+
+import pytest
+
+from app.log_pipeline.log_pipeline import (
+    JsonFormatter,
+    SamplingFilter,
+    TraceIdQueueHandler,
+    parse_sampling_rates,
+    setup_logging,
+)
+
+
+def make_record(name="app.test", level=logging.INFO, msg="Сообщение %s", args=(1,)):
+    return logging.LogRecord(name, level, "/app/test.py", 10, msg, args, None)
+
+
+def test_json_formatter_uses_trace_id_from_record():
+    record = make_record()
+    record.trace_id = "abc"
+
+    data = json.loads(JsonFormatter().format(record))
+
+    assert data["trace_id"] == "abc"
+    assert data["message"] == "Сообщение 1"
+    assert data["level"] == "INFO"
+    assert data["source"] == "/app/test.py:10"
+
+
+def test_json_formatter_without_trace_id_does_not_generate_one():
+    data = json.loads(
+        JsonFormatter(ContextVar("ctx", default=None)).format(make_record())
+    )
+
+    assert data["trace_id"] is None
+
+
+def test_queue_handler_captures_trace_id_at_enqueue_time():
+    ctx = ContextVar("ctx", default=None)
+    log_queue = queue.SimpleQueue()
+    handler = TraceIdQueueHandler(log_queue, ctx)
+
+    token = ctx.set("trace-1")
+    handler.handle(make_record())
+    ctx.reset(token)
+
+    record = log_queue.get_nowait()
+    assert record.trace_id == "trace-1"
+    assert record.msg == "Сообщение 1"
+    assert record.args is None
+
+
+def test_sampling_filter_applies_most_specific_rate_to_info_only():
+    rates = parse_sampling_rates("app=1, app.session_manager=0")
+    sampling = SamplingFilter(rates, rand=lambda: 0.5)
+
+    assert sampling.filter(make_record(name="app.routers.calc"))
+    assert not sampling.filter(make_record(name="app.session_manager.session_manager"))
+    assert sampling.filter(
+        make_record(name="app.session_manager.session_manager", level=logging.ERROR)
+    )
+    assert sampling.filter(make_record(name="uvicorn"))
+
+
+def test_parse_sampling_rates():
+    assert parse_sampling_rates("") == {}
+    assert parse_sampling_rates("0.5") == {"": 0.5}
+    assert parse_sampling_rates("a.b=0.1,c=1") == {"a.b": 0.1, "c": 1.0}
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_setup_logging_writes_json_from_listener(restore_root_logger):
+    ctx = ContextVar("ctx", default=None)
+    stream = io.StringIO()
+    listener = setup_logging(level="INFO", trace_id_ctx=ctx, stream=stream)
+
+    token = ctx.set("trace-2")
+    logging.getLogger("app.test").info("Привет %s", "мир")
+    ctx.reset(token)
+    listener.stop()
+
+    data = json.loads(stream.getvalue().splitlines()[-1])
+    assert data["trace_id"] == "trace-2"
+    assert data["message"] == "Привет мир"
@@ -1,33 +1,91 @@
-import json
+import atexit
 import logging
+import multiprocessing
 import os
-import sys
-import uuid
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
 from contextvars import ContextVar
 from datetime import datetime, timezone
-from logging import config as logging_config
 
+import asyncpg
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
+from app.cache.lru_ttl_cache import make_lru_ttl_cache
+from app.log_pipeline.log_pipeline import parse_sampling_rates, setup_logging
+from app.metrics.metrics import make_instrumented_pool_class, make_metrics
+from app.middlewares.admission import (
+    AdmissionControlMiddleware,
+    make_admission_controller,
+)
+from app.middlewares.compression import (
+    RequestDecompressionMiddleware,
+    ResponseCompressionMiddleware,
+)
+from app.middlewares.metrics import MetricsMiddleware
+from app.middlewares.profiling import ProfilingMiddleware
+from app.middlewares.trace_id import TraceIdMiddleware
+from app.profiling.profiler import make_request_profiler
+from app.repositories.calc_job import make_calc_job_repository
 from app.repositories.calc_result import make_calc_result_repository
+from app.repositories.calc_result_asyncpg import make_asyncpg_calc_result_repository
+from app.repositories.calc_result_coalescing import (
+    make_coalescing_calc_result_repository,
+)
+from app.repositories.material import make_material_repository
+from app.repositories.material_asyncpg import make_asyncpg_material_repository
+from app.repositories.material_price_listener import make_material_price_listener
 from app.routers.calc import make_calc_router
+from app.routers.calc_export import make_calc_export_router
+from app.routers.calc_jobs import make_calc_jobs_router
+from app.routers.profiles import make_profiles_router
 from app.services.calc import make_calc_service
-from app.session_manager.session_manager import make_session_manager
+from app.services.calc_engine import make_calc_engine
+from app.services.calc_export import make_calc_export_service
+from app.services.calc_jobs import make_calc_job_service
+from app.services.idempotency import make_idempotency_service
+from app.services.material_catalog import make_material_catalog_service
+from app.session_manager.asyncpg_connection_manager import (
+    make_asyncpg_connection_manager,
+)
+from app.session_manager.session_manager import make_session_manager, warm_up_engine
 
 load_dotenv()
 
 APP_TITLE = os.getenv("APP_TITLE", "Калькулятор стоимости")
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("APP_PORT", 8000))
+APP_WORKERS = int(os.getenv("APP_WORKERS", 0))
+APP_WORKER_READY_TIMEOUT = int(os.getenv("APP_WORKER_READY_TIMEOUT", 60))
+APP_GRACEFUL_TIMEOUT = int(os.getenv("APP_GRACEFUL_TIMEOUT", 30))
 APP_DEBUG = os.getenv("APP_DEBUG", "False").lower() in ("true", "1")
 APP_LOG_LEVEL = os.getenv("APP_LOG_LEVEL", "INFO").upper()
+APP_LOG_SAMPLING = os.getenv("APP_LOG_SAMPLING", "")
+APP_METRICS_ENABLED = os.getenv("APP_METRICS_ENABLED", "True").lower() in ("true", "1")
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+APP_COMPRESSION_ENABLED = os.getenv("APP_COMPRESSION_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
+APP_COMPRESSION_MIN_SIZE = int(os.getenv("APP_COMPRESSION_MIN_SIZE", 1024))
+APP_COMPRESSION_GZIP_LEVEL = int(os.getenv("APP_COMPRESSION_GZIP_LEVEL", 6))
+APP_COMPRESSION_ZSTD_LEVEL = int(os.getenv("APP_COMPRESSION_ZSTD_LEVEL", 3))
+APP_REQUEST_MAX_DECOMPRESSED_SIZE = int(
+    os.getenv("APP_REQUEST_MAX_DECOMPRESSED_SIZE", 64 * 1024 * 1024)
+)
+APP_PROFILING_ENABLED = os.getenv("APP_PROFILING_ENABLED", "False").lower() in (
+    "true",
+    "1",
+)
+APP_PROFILING_TOKEN = os.getenv("APP_PROFILING_TOKEN", "")
+APP_PROFILING_SAMPLE_RATE = float(os.getenv("APP_PROFILING_SAMPLE_RATE", 0))
+APP_PROFILING_DIR = os.getenv("APP_PROFILING_DIR", "profiles")
+APP_PROFILING_KEEP = int(os.getenv("APP_PROFILING_KEEP", 50))
 
 POSTGRES_HOST = os.getenv("DOCKER_POSTGRES_HOST") or os.getenv(
     "POSTGRES_HOST", "localhost"
@@ -38,85 +96,198 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "calc_user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "calc_password")
 POSTGRES_SCHEMA = os.getenv("POSTGRES_SCHEMA", "calc_schema")
 
-DATABASE_DSN = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+DATABASE_DSN = (
+    os.getenv("DATABASE_DSN")
+    or f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+ASYNCPG_DSN = DATABASE_DSN.replace("postgresql+asyncpg://", "postgresql://", 1)
+DATABASE_IS_SQLITE = DATABASE_DSN.startswith("sqlite")
+
+POSTGRES_REPLICA_HOSTS = [
+    host.strip()
+    for host in os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")
+    if host.strip()
+]
+POSTGRES_REPLICA_ROUTING = os.getenv("POSTGRES_REPLICA_ROUTING", "round_robin").lower()
 
 POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", 5))
 POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", 10))
 POSTGRES_POOL_TIMEOUT = int(os.getenv("POSTGRES_POOL_TIMEOUT", 30))
 POSTGRES_POOL_RECYCLE = int(os.getenv("POSTGRES_POOL_RECYCLE", 1800))
+POSTGRES_CONNECTION_BUDGET = int(os.getenv("POSTGRES_CONNECTION_BUDGET", 0))
+POSTGRES_POOL_WARMUP = os.getenv("POSTGRES_POOL_WARMUP", "True").lower() in (
+    "true",
+    "1",
+)
+POSTGRES_ECHO = os.getenv("POSTGRES_ECHO", "False").lower() in ("true", "1")
+POSTGRES_STATEMENT_CACHE_SIZE = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", 100))
+
+CALC_REPOSITORY_BACKEND = os.getenv("CALC_REPOSITORY_BACKEND", "sqlalchemy").lower()
+
+CALC_FAST_CODEC_ENABLED = os.getenv("CALC_FAST_CODEC_ENABLED", "False").lower() in (
+    "true",
+    "1",
+)
+CALC_BATCH_MAX_SIZE = int(os.getenv("CALC_BATCH_MAX_SIZE", 500))
+CALC_PAGE_SIZE = int(os.getenv("CALC_PAGE_SIZE", 50))
+CALC_PAGE_MAX_SIZE = int(os.getenv("CALC_PAGE_MAX_SIZE", 500))
+CALC_PARTITION_PREMAKE_MONTHS = int(os.getenv("CALC_PARTITION_PREMAKE_MONTHS", 3))
+CALC_RETENTION_MONTHS = int(os.getenv("CALC_RETENTION_MONTHS", 12))
+CALC_ARCHIVE_DIR = os.getenv("CALC_ARCHIVE_DIR", "archive")
+CALC_ENGINE = os.getenv("CALC_ENGINE", "decimal").lower()
+CALC_ENGINE_NUMPY_THRESHOLD = int(os.getenv("CALC_ENGINE_NUMPY_THRESHOLD", 10000))
+CALC_IDEMPOTENCY_ENABLED = os.getenv("CALC_IDEMPOTENCY_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
+CALC_IDEMPOTENCY_CACHE_SIZE = int(os.getenv("CALC_IDEMPOTENCY_CACHE_SIZE", 10000))
+CALC_IDEMPOTENCY_CACHE_TTL_SECONDS = int(
+    os.getenv("CALC_IDEMPOTENCY_CACHE_TTL_SECONDS", 600)
+)
+CALC_RESULT_CACHE_ENABLED = os.getenv("CALC_RESULT_CACHE_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
+CALC_RESULT_CACHE_SIZE = int(os.getenv("CALC_RESULT_CACHE_SIZE", 10000))
+CALC_RESULT_CACHE_TTL_SECONDS = int(os.getenv("CALC_RESULT_CACHE_TTL_SECONDS", 3600))
+CALC_EXPORT_ENABLED = os.getenv("CALC_EXPORT_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
+CALC_EXPORT_CHUNK_SIZE = int(os.getenv("CALC_EXPORT_CHUNK_SIZE", 10000))
+CALC_CATALOG_ENABLED = os.getenv("CALC_CATALOG_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
+CALC_CATALOG_CACHE_SIZE = int(os.getenv("CALC_CATALOG_CACHE_SIZE", 10000))
+CALC_CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CALC_CATALOG_CACHE_TTL_SECONDS", 300))
+CALC_WRITE_COALESCING_ENABLED = os.getenv(
+    "CALC_WRITE_COALESCING_ENABLED", "False"
+).lower() in ("true", "1")
+CALC_WRITE_COALESCING_MAX_DELAY_MS = int(
+    os.getenv("CALC_WRITE_COALESCING_MAX_DELAY_MS", 5)
+)
+CALC_WRITE_COALESCING_MAX_BATCH_SIZE = int(
+    os.getenv("CALC_WRITE_COALESCING_MAX_BATCH_SIZE", 100)
+)
+CALC_JOBS_ENABLED = os.getenv("CALC_JOBS_ENABLED", "True").lower() in ("true", "1")
+CALC_JOBS_CONCURRENCY = int(os.getenv("CALC_JOBS_CONCURRENCY", 2))
+CALC_JOBS_QUEUE_SIZE = int(os.getenv("CALC_JOBS_QUEUE_SIZE", 100))
+CALC_JOBS_PROCESSES = int(os.getenv("CALC_JOBS_PROCESSES", 2))
+CALC_JOBS_STALE_SECONDS = int(os.getenv("CALC_JOBS_STALE_SECONDS", 600))
+CALC_JOBS_RECOVERY_INTERVAL_SECONDS = int(
+    os.getenv("CALC_JOBS_RECOVERY_INTERVAL_SECONDS", 30)
+)
+CALC_ADMISSION_ENABLED = os.getenv("CALC_ADMISSION_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
+CALC_ADMISSION_MAX_IN_FLIGHT = (
+    int(os.getenv("CALC_ADMISSION_MAX_IN_FLIGHT", 0))
+    or POSTGRES_POOL_SIZE + POSTGRES_MAX_OVERFLOW
+)
+CALC_ADMISSION_QUEUE_SIZE = int(os.getenv("CALC_ADMISSION_QUEUE_SIZE", 20))
+CALC_ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("CALC_ADMISSION_QUEUE_TIMEOUT_MS", 500))
+CALC_ADMISSION_RETRY_AFTER_SECONDS = int(
+    os.getenv("CALC_ADMISSION_RETRY_AFTER_SECONDS", 1)
+)
 
 async_session_ctx: ContextVar[AsyncSession | None] = ContextVar(
     "async_session_ctx", default=None
 )
-trace_id_ctx: ContextVar[str] = ContextVar("trace_id_ctx", default=None)
-
-
-class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:
-        trace_id = trace_id_ctx.get()
-        if not trace_id:
-            trace_id = str(uuid.uuid4())
-        return json.dumps(
-            {
-                "trace_id": trace_id,
-                "timestamp": datetime.fromtimestamp(
-                    record.created, tz=timezone.utc
-                ).isoformat(),
-                "level": record.levelname,
-                "message": record.getMessage(),
-                "source": f"{record.pathname}:{record.lineno}",
-            },
-            ensure_ascii=False,
-        )
+asyncpg_connection_ctx: ContextVar[asyncpg.Connection | None] = ContextVar(
+    "asyncpg_connection_ctx", default=None
+)
+trace_id_ctx: ContextVar[str | None] = ContextVar("trace_id_ctx", default=None)
 
 
-logging_config.dictConfig(
-    {
-        "version": 1,
-        "disable_existing_loggers": False,
-        "formatters": {"json": {"()": JsonFormatter}},
-        "handlers": {
-            "stdout": {
-                "class": "logging.StreamHandler",
-                "formatter": "json",
-                "level": APP_LOG_LEVEL,
-                "stream": sys.stdout,
-            }
-        },
-        "root": {"handlers": ["stdout"], "level": APP_LOG_LEVEL},
-    }
-)
+def replica_dsn(host: str) -> str:
+    if ":" not in host:
+        host = f"{host}:{POSTGRES_PORT}"
+    return (
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{host}/{POSTGRES_DB}"
+    )
 
 
-class TraceIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        trace_id = str(uuid.uuid4())
-        token = trace_id_ctx.set(trace_id)
-        try:
-            response = await call_next(request)
-            return response
-        finally:
-            trace_id_ctx.reset(token)
+log_listener = setup_logging(
+    level=APP_LOG_LEVEL,
+    trace_id_ctx=trace_id_ctx,
+    sampling_rates=parse_sampling_rates(APP_LOG_SAMPLING),
+)
+atexit.register(log_listener.stop)
 
 
 log = logging.getLogger(__name__)
 
+metrics = (
+    make_metrics(multiprocess_dir=PROMETHEUS_MULTIPROC_DIR)
+    if APP_METRICS_ENABLED
+    else None
+)
+
+profiler = (
+    make_request_profiler(
+        directory=APP_PROFILING_DIR,
+        trace_id_ctx=trace_id_ctx,
+        token=APP_PROFILING_TOKEN,
+        sample_rate=APP_PROFILING_SAMPLE_RATE,
+        keep=APP_PROFILING_KEEP,
+    )
+    if APP_PROFILING_ENABLED
+    else None
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     log.info("Инициализация подключения к базе данных...")
-    async_engine = create_async_engine(
-        DATABASE_DSN,
-        echo=True,
-        pool_size=POSTGRES_POOL_SIZE,
-        max_overflow=POSTGRES_MAX_OVERFLOW,
-        pool_timeout=POSTGRES_POOL_TIMEOUT,
-        pool_recycle=POSTGRES_POOL_RECYCLE,
-        pool_pre_ping=True,
-        connect_args={"server_settings": {"search_path": POSTGRES_SCHEMA}},
-    )
+    engine_options = {
+        "echo": POSTGRES_ECHO,
+        "pool_size": POSTGRES_POOL_SIZE,
+        "max_overflow": POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": POSTGRES_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if DATABASE_IS_SQLITE:
+        engine_options["execution_options"] = {
+            "schema_translate_map": {"calc_schema": None}
+        }
+    else:
+        engine_options["connect_args"] = {
+            "server_settings": {"search_path": POSTGRES_SCHEMA}
+        }
+    primary_engine_options = dict(engine_options)
+    if metrics is not None:
+        primary_engine_options["poolclass"] = make_instrumented_pool_class(metrics)
+    async_engine = create_async_engine(DATABASE_DSN, **primary_engine_options)
     log.info("Подключение к базе данных создано")
 
+    replica_engines = [
+        create_async_engine(replica_dsn(host), **engine_options)
+        for host in POSTGRES_REPLICA_HOSTS
+    ]
+    if replica_engines:
+        log.info(
+            "Подключения к репликам созданы: %s, выбор реплики: %s",
+            len(replica_engines),
+            POSTGRES_REPLICA_ROUTING,
+        )
+
+    if metrics is not None:
+        metrics.instrument_engine(async_engine.sync_engine)
+        log.info("Метрики пула и запросов к базе данных подключены")
+
+    if profiler is not None:
+        for engine in (async_engine, *replica_engines):
+            profiler.instrument_engine(engine.sync_engine)
+        app.include_router(make_profiles_router(profiler=profiler))
+        log.info("Профилирование запросов включено, профили: %s", APP_PROFILING_DIR)
+
+    if POSTGRES_POOL_WARMUP:
+        for engine in (async_engine, *replica_engines):
+            await warm_up_engine(engine, POSTGRES_POOL_SIZE)
+
     async_session_factory = async_sessionmaker(
         bind=async_engine, expire_on_commit=False, class_=AsyncSession
     )
@@ -125,31 +296,223 @@ async def lifespan(app: FastAPI):
     session_manager = make_session_manager(
         session_factory=async_session_factory,
         session_ctx=async_session_ctx,
+        metrics=metrics,
+        replica_session_factories=[
+            async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+            for engine in replica_engines
+        ],
+        replica_routing=POSTGRES_REPLICA_ROUTING,
     )
     log.info("Менеджер сессий создан")
 
-    calc_repo = make_calc_result_repository(session_manager=session_manager)
-    log.info("Репозиторий CalcResultRepository создан")
+    result_cache = None
+    if CALC_RESULT_CACHE_ENABLED:
+        result_cache = make_lru_ttl_cache(
+            max_size=CALC_RESULT_CACHE_SIZE,
+            ttl_seconds=CALC_RESULT_CACHE_TTL_SECONDS,
+        )
+        log.info("Кэш результатов расчета создан")
+
+    asyncpg_pool = None
+    transaction = session_manager.transaction
+    write_coalescing = CALC_WRITE_COALESCING_ENABLED
+    material_repo = make_material_repository(session_manager)
+    if CALC_REPOSITORY_BACKEND == "asyncpg":
+        asyncpg_pool = await asyncpg.create_pool(
+            ASYNCPG_DSN,
+            min_size=POSTGRES_POOL_SIZE,
+            max_size=POSTGRES_POOL_SIZE + POSTGRES_MAX_OVERFLOW,
+            max_inactive_connection_lifetime=POSTGRES_POOL_RECYCLE,
+            statement_cache_size=POSTGRES_STATEMENT_CACHE_SIZE,
+            server_settings={"search_path": POSTGRES_SCHEMA},
+        )
+        log.info("Пул соединений asyncpg создан")
+
+        connection_manager = make_asyncpg_connection_manager(
+            pool=asyncpg_pool, connection_ctx=asyncpg_connection_ctx
+        )
+        transaction = connection_manager.transaction
+        log.info("Менеджер соединений asyncpg создан")
+
+        if write_coalescing:
+            log.warning("Групповая запись не поддерживается бэкендом asyncpg")
+            write_coalescing = False
+
+        calc_repo = make_asyncpg_calc_result_repository(
+            connection_manager=connection_manager, cache=result_cache
+        )
+        log.info("Репозиторий AsyncpgCalcResultRepository создан")
+        material_repo = make_asyncpg_material_repository(connection_manager)
+    elif write_coalescing:
+        calc_repo = make_coalescing_calc_result_repository(
+            session_manager=session_manager,
+            max_delay_ms=CALC_WRITE_COALESCING_MAX_DELAY_MS,
+            max_batch_size=CALC_WRITE_COALESCING_MAX_BATCH_SIZE,
+            cache=result_cache,
+        )
+        calc_repo.start()
+        log.info("Репозиторий CoalescingCalcResultRepository создан")
+    else:
+        calc_repo = make_calc_result_repository(
+            session_manager=session_manager, cache=result_cache
+        )
+        log.info("Репозиторий CalcResultRepository создан")
 
-    calc_service = make_calc_service(calc_repo)
+    calc_engine = make_calc_engine(
+        CALC_ENGINE, numpy_threshold=CALC_ENGINE_NUMPY_THRESHOLD
+    )
+    log.info("Движок расчета %s создан", calc_engine.name)
+
+    material_catalog = None
+    material_price_listener = None
+    if CALC_CATALOG_ENABLED:
+        material_catalog = make_material_catalog_service(
+            material_repo,
+            make_lru_ttl_cache(
+                max_size=CALC_CATALOG_CACHE_SIZE,
+                ttl_seconds=CALC_CATALOG_CACHE_TTL_SECONDS,
+            ),
+        )
+        log.info("Сервис каталога материалов создан")
+
+        if not DATABASE_IS_SQLITE:
+            material_price_listener = make_material_price_listener(
+                lambda: asyncpg.connect(
+                    ASYNCPG_DSN, server_settings={"search_path": POSTGRES_SCHEMA}
+                ),
+                material_catalog,
+            )
+            material_price_listener.start()
+
+    calc_service = make_calc_service(
+        calc_repo,
+        calc_engine=calc_engine,
+        metrics=metrics,
+        material_catalog=material_catalog,
+    )
     log.info("Сервис CalcService создан")
 
+    idempotency_service = None
+    if CALC_IDEMPOTENCY_ENABLED:
+        idempotency_service = make_idempotency_service(
+            make_lru_ttl_cache(
+                max_size=CALC_IDEMPOTENCY_CACHE_SIZE,
+                ttl_seconds=CALC_IDEMPOTENCY_CACHE_TTL_SECONDS,
+            )
+        )
+        log.info("Сервис идемпотентности создан")
+
     calc_router = make_calc_router(
         calc_service=calc_service,
-        transaction=session_manager.transaction,
+        transaction=transaction,
+        max_batch_size=CALC_BATCH_MAX_SIZE,
+        idempotency=idempotency_service,
+        page_size=CALC_PAGE_SIZE,
+        max_page_size=CALC_PAGE_MAX_SIZE,
+        metrics=metrics,
+        fast_codec=CALC_FAST_CODEC_ENABLED,
+        material_catalog=material_catalog,
+        result_cache=result_cache,
     )
     app.include_router(calc_router)
     log.info("Роутер calc зарегистрирован")
 
+    if CALC_EXPORT_ENABLED:
+        calc_export_service = make_calc_export_service(
+            make_calc_result_repository(session_manager=session_manager),
+            chunk_size=CALC_EXPORT_CHUNK_SIZE,
+        )
+        app.include_router(
+            make_calc_export_router(calc_export_service=calc_export_service)
+        )
+        log.info("Роутер calc/export зарегистрирован")
+
+    calc_job_service = None
+    calc_process_pool = None
+    if CALC_JOBS_ENABLED:
+        if CALC_JOBS_PROCESSES > 0:
+            calc_process_pool = ProcessPoolExecutor(
+                max_workers=CALC_JOBS_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            log.info("Пул процессов для расчетов создан: %s", CALC_JOBS_PROCESSES)
+
+        calc_job_service = make_calc_job_service(
+            make_calc_job_repository(session_manager),
+            calc_service,
+            transaction=transaction,
+            concurrency=CALC_JOBS_CONCURRENCY,
+            max_queue_size=CALC_JOBS_QUEUE_SIZE,
+            executor=calc_process_pool,
+            stale_after_seconds=CALC_JOBS_STALE_SECONDS,
+            recovery_interval_seconds=CALC_JOBS_RECOVERY_INTERVAL_SECONDS,
+        )
+        calc_job_service.start()
+        app.include_router(
+            make_calc_jobs_router(calc_job_service=calc_job_service, metrics=metrics)
+        )
+        log.info("Роутер calc/jobs зарегистрирован")
+
     yield
 
+    if calc_job_service is not None:
+        await calc_job_service.stop()
+    if calc_process_pool is not None:
+        calc_process_pool.shutdown(cancel_futures=True)
+        log.info("Пул процессов для расчетов остановлен")
+
+    if material_price_listener is not None:
+        await material_price_listener.stop()
+
+    if write_coalescing:
+        await calc_repo.stop()
+
+    if asyncpg_pool is not None:
+        await asyncpg_pool.close()
+        log.info("Пул соединений asyncpg закрыт")
+
     log.info("Закрытие подключения к базе данных...")
     await async_engine.dispose()
+    for engine in replica_engines:
+        await engine.dispose()
     log.info("Подключение к базе данных закрыто")
 
 
 app = FastAPI(lifespan=lifespan, title=APP_TITLE)
-app.add_middleware(TraceIdMiddleware)
+if APP_COMPRESSION_ENABLED:
+    app.add_middleware(
+        RequestDecompressionMiddleware, max_size=APP_REQUEST_MAX_DECOMPRESSED_SIZE
+    )
+    app.add_middleware(
+        ResponseCompressionMiddleware,
+        minimum_size=APP_COMPRESSION_MIN_SIZE,
+        gzip_level=APP_COMPRESSION_GZIP_LEVEL,
+        zstd_level=APP_COMPRESSION_ZSTD_LEVEL,
+    )
+if CALC_ADMISSION_ENABLED:
+    admission = make_admission_controller(
+        max_in_flight=CALC_ADMISSION_MAX_IN_FLIGHT,
+        max_queue_size=CALC_ADMISSION_QUEUE_SIZE,
+        queue_timeout_seconds=CALC_ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+        metrics=metrics,
+    )
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        admission=admission,
+        path_prefixes=("/calc",),
+        exclude_prefixes=("/calc/export", "/calc/jobs/"),
+        retry_after_seconds=CALC_ADMISSION_RETRY_AFTER_SECONDS,
+    )
+    log.info(
+        "Контроль допуска /calc: до %s запросов, очередь %s",
+        CALC_ADMISSION_MAX_IN_FLIGHT,
+        CALC_ADMISSION_QUEUE_SIZE,
+    )
+if profiler is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, path_prefixes=("/calc",))
+app.add_middleware(TraceIdMiddleware, trace_id_ctx=trace_id_ctx)
+if metrics is not None:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 
 @app.get("/health")
@@ -157,6 +520,13 @@ async def health():
     return {"status": "ok", "time": datetime.now(timezone.utc).isoformat()}
 
 
+if metrics is not None:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.exception_handler(Exception)
 async def unexpected_exception_handler(request: Request, exc: Exception):
     log.exception("Непредвиденная ошибка: %s", exc)
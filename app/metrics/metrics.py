@@ -0,0 +1,235 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from fastapi.routing import APIRoute
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Metrics:
+    def __init__(
+        self,
+        *,
+        registry: CollectorRegistry | None = None,
+        multiprocess_dir: str | None = None,
+    ):
+        self.registry = registry or CollectorRegistry()
+        self.multiprocess_dir = multiprocess_dir
+        self.handler_started_ctx: ContextVar[float | None] = ContextVar(
+            "handler_started_ctx", default=None
+        )
+
+        self._requests = Counter(
+            "calc_http_requests_total",
+            "Количество HTTP-запросов",
+            ["method", "route", "status"],
+            registry=self.registry,
+        )
+        self._errors = Counter(
+            "calc_http_request_errors_total",
+            "Количество запросов, завершившихся ошибкой сервера",
+            ["method", "route"],
+            registry=self.registry,
+        )
+        self._request_duration = Histogram(
+            "calc_http_request_duration_seconds",
+            "Длительность обработки HTTP-запроса",
+            ["method", "route"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self._stage_duration = Histogram(
+            "calc_stage_duration_seconds",
+            "Длительность этапов обработки запроса",
+            ["stage"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self._pool_size = Gauge(
+            "calc_db_pool_size",
+            "Размер пула соединений",
+            multiprocess_mode="livesum",
+            registry=self.registry,
+        )
+        self._pool_checked_out = Gauge(
+            "calc_db_pool_checked_out",
+            "Соединения, выданные из пула",
+            multiprocess_mode="livesum",
+            registry=self.registry,
+        )
+        self._pool_overflow = Gauge(
+            "calc_db_pool_overflow",
+            "Соединения сверх pool_size",
+            multiprocess_mode="livesum",
+            registry=self.registry,
+        )
+        self._pool_waiters = Gauge(
+            "calc_db_pool_waiters",
+            "Запросы, ожидающие соединение из пула",
+            multiprocess_mode="livesum",
+            registry=self.registry,
+        )
+        self._admission_in_flight = Gauge(
+            "calc_admission_in_flight",
+            "Запросы, допущенные к обработке",
+            multiprocess_mode="livesum",
+            registry=self.registry,
+        )
+        self._admission_queued = Gauge(
+            "calc_admission_queued",
+            "Запросы, ожидающие допуска",
+            multiprocess_mode="livesum",
+            registry=self.registry,
+        )
+        self._admission_shed = Counter(
+            "calc_admission_shed",
+            "Запросы, отклоненные с 503 из-за перегрузки",
+            ["reason"],
+            registry=self.registry,
+        )
+        self._stages: dict[str, Histogram] = {}
+        self._routes: dict[tuple[str, str, int], tuple] = {}
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        child = self._stages.get(stage)
+        if child is None:
+            child = self._stages[stage] = self._stage_duration.labels(stage)
+        child.observe(seconds)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def observe_since_handler_start(self, stage: str) -> None:
+        started = self.handler_started_ctx.get()
+        if started is not None:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float
+    ) -> None:
+        key = (method, route, status)
+        children = self._routes.get(key)
+        if children is None:
+            children = self._routes[key] = (
+                self._requests.labels(method, route, str(status)),
+                self._request_duration.labels(method, route),
+                self._errors.labels(method, route) if status >= 500 else None,
+            )
+        requests, duration, errors = children
+        requests.inc()
+        duration.observe(seconds)
+        if errors is not None:
+            errors.inc()
+
+    def observe_pool(self, pool: QueuePool) -> None:
+        self._pool_size.set(pool.size())
+        self._pool_checked_out.set(pool.checkedout())
+        self._pool_overflow.set(max(pool.overflow(), 0))
+
+    def observe_pool_waiters(self, delta: int) -> None:
+        self._pool_waiters.inc(delta)
+
+    def observe_admission(self, in_flight: int, queued: int) -> None:
+        self._admission_in_flight.set(in_flight)
+        self._admission_queued.set(queued)
+
+    def observe_admission_shed(self, reason: str, count: int = 1) -> None:
+        self._admission_shed.labels(reason).inc(count)
+
+    def instrument_engine(self, engine: Engine) -> None:
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, params, context, many):
+            if context is not None:
+                context.query_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, params, context, many):
+            started = getattr(context, "query_started", None)
+            if started is not None:
+                self.observe_stage("db_execute", time.perf_counter() - started)
+
+    def render(self) -> bytes:
+        if self.multiprocess_dir is None:
+            return generate_latest(self.registry)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=self.multiprocess_dir)
+        return generate_latest(registry)
+
+
+def make_instrumented_pool_class(metrics: Metrics) -> type[AsyncAdaptedQueuePool]:
+    class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            metrics.observe_pool(self)
+
+        def _do_get(self):
+            metrics.observe_pool_waiters(1)
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.observe_pool_waiters(-1)
+                metrics.observe_stage("pool_checkout", time.perf_counter() - started)
+                metrics.observe_pool(self)
+
+        def _do_return_conn(self, record):
+            try:
+                super()._do_return_conn(record)
+            finally:
+                metrics.observe_pool(self)
+
+    return InstrumentedAsyncAdaptedQueuePool
+
+
+def make_timed_route_class(metrics: Metrics) -> type[APIRoute]:
+    class TimedRoute(APIRoute):
+        def get_route_handler(self):
+            handler = super().get_route_handler()
+
+            async def timed_handler(request):
+                token = metrics.handler_started_ctx.set(time.perf_counter())
+                try:
+                    return await handler(request)
+                finally:
+                    metrics.handler_started_ctx.reset(token)
+
+            return timed_handler
+
+    return TimedRoute
+
+
+def make_metrics(multiprocess_dir: str | None = None) -> Metrics:
+    return Metrics(multiprocess_dir=multiprocess_dir)
@@ -0,0 +1,190 @@
+import multiprocessing
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import multiprocess
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.metrics.metrics import (
+    Metrics,
+    make_instrumented_pool_class,
+    make_timed_route_class,
+)
+from app.middlewares.admission import AdmissionController, AdmissionRejectedError
+
+
+def samples(metrics: Metrics) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(metrics.render().decode())
+        for sample in family.samples
+    }
+
+
+def test_stage_records_histogram():
+    metrics = Metrics()
+
+    with metrics.stage("calculation"):
+        pass
+    metrics.observe_stage("calculation", 0.2)
+
+    data = samples(metrics)
+    assert data[("calc_stage_duration_seconds_count", (("stage", "calculation"),))] == 2
+    assert (
+        data[
+            (
+                "calc_stage_duration_seconds_bucket",
+                (("le", "0.1"), ("stage", "calculation")),
+            )
+        ]
+        == 1
+    )
+
+
+def test_observe_since_handler_start_without_request_is_noop():
+    metrics = Metrics()
+
+    metrics.observe_since_handler_start("validation")
+
+    assert not any(
+        name == "calc_stage_duration_seconds_count" for name, _ in samples(metrics)
+    )
+
+
+def test_observe_request_counts_server_errors():
+    metrics = Metrics()
+
+    metrics.observe_request("POST", "/calc", 200, 0.01)
+    metrics.observe_request("POST", "/calc", 500, 0.01)
+
+    data = samples(metrics)
+    labels = (("method", "POST"), ("route", "/calc"))
+    assert data[("calc_http_requests_total", labels + (("status", "200"),))] == 1
+    assert data[("calc_http_request_errors_total", labels)] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_and_query_metrics(tmp_path):
+    metrics = Metrics()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}",
+        poolclass=make_instrumented_pool_class(metrics),
+        pool_size=2,
+    )
+    metrics.instrument_engine(engine.sync_engine)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        during = samples(metrics)
+    after = samples(metrics)
+    await engine.dispose()
+
+    assert during[("calc_db_pool_checked_out", ())] == 1
+    assert during[("calc_db_pool_size", ())] == 2
+    assert after[("calc_db_pool_checked_out", ())] == 0
+    assert after[("calc_db_pool_waiters", ())] == 0
+    assert (
+        after[("calc_stage_duration_seconds_count", (("stage", "pool_checkout"),))] == 1
+    )
+    assert after[("calc_stage_duration_seconds_count", (("stage", "db_execute"),))] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_query_does_not_skew_query_timing(tmp_path):
+    metrics = Metrics()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+    metrics.instrument_engine(engine.sync_engine)
+
+    async with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            await conn.execute(text("SELECT * FROM missing"))
+        await conn.execute(text("SELECT 1"))
+        info = dict(conn.sync_connection.info)
+    await engine.dispose()
+
+    assert "query_started" not in info
+    assert (
+        samples(metrics)[
+            ("calc_stage_duration_seconds_count", (("stage", "db_execute"),))
+        ]
+        == 1
+    )
+
+
+def test_timed_route_measures_validation_from_handler_start():
+    metrics = Metrics()
+    router = APIRouter(route_class=make_timed_route_class(metrics))
+
+    @router.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        metrics.observe_since_handler_start("validation")
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app) as client:
+        client.get("/items/1")
+        client.get("/items/x")
+
+    data = samples(metrics)
+    assert data[("calc_stage_duration_seconds_count", (("stage", "validation"),))] == 1
+    assert metrics.handler_started_ctx.get() is None
+
+
+@pytest.mark.asyncio
+async def test_admission_metrics():
+    metrics = Metrics()
+    admission = AdmissionController(
+        max_in_flight=2, max_queue_size=1, queue_timeout_seconds=0.01, metrics=metrics
+    )
+    await admission.acquire()
+    await admission.acquire()
+    with pytest.raises(AdmissionRejectedError):
+        await admission.acquire()
+
+    data = samples(metrics)
+    admission.release()
+    released = samples(metrics)
+
+    assert data[("calc_admission_in_flight", ())] == 2
+    assert data[("calc_admission_queued", ())] == 0
+    assert data[("calc_admission_shed_total", (("reason", "timeout"),))] == 1
+    assert data[("calc_admission_shed_total", (("reason", "queue_full"),))] == 0
+    assert released[("calc_admission_in_flight", ())] == 1
+
+
+def observe_in_worker(in_flight):
+    metrics = Metrics()
+    metrics.observe_request("POST", "/calc", 200, 0.01)
+    metrics.observe_admission(in_flight, 0)
+
+
+def test_multiprocess_render_sums_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=observe_in_worker, args=(in_flight,))
+        for in_flight in (1, 2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    metrics = Metrics(multiprocess_dir=str(tmp_path))
+
+    data = samples(metrics)
+    multiprocess.mark_process_dead(workers[0].pid, str(tmp_path))
+    after_exit = samples(metrics)
+
+    requests = (
+        "calc_http_requests_total",
+        (("method", "POST"), ("route", "/calc"), ("status", "200")),
+    )
+    assert data[requests] == 2
+    assert data[("calc_admission_in_flight", ())] == 3
+    assert after_exit[requests] == 2
+    assert after_exit[("calc_admission_in_flight", ())] == 2
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from collections import deque
+
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.metrics.metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+SHED_QUEUE_FULL = "queue_full"
+SHED_TIMEOUT = "timeout"
+
+
+class AdmissionRejectedError(RuntimeError):
+    def __init__(self, reason: str):
+        super().__init__(f"Сервис перегружен: {reason}")
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        *,
+        max_in_flight: int,
+        max_queue_size: int,
+        queue_timeout_seconds: float,
+        metrics: Metrics | None = None,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight должен быть больше 0")
+        self.max_in_flight = max_in_flight
+        self.max_queue_size = max_queue_size
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.in_flight = 0
+        self.shed = {SHED_QUEUE_FULL: 0, SHED_TIMEOUT: 0}
+        self.metrics = metrics
+        self._waiters: deque[asyncio.Future] = deque()
+        if metrics is not None:
+            metrics.observe_admission(0, 0)
+            for reason in self.shed:
+                metrics.observe_admission_shed(reason, 0)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue_size": self.max_queue_size,
+            "shed": dict(self.shed),
+        }
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._observe()
+            return
+        if len(self._waiters) >= self.max_queue_size:
+            self._reject(SHED_QUEUE_FULL)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._observe()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout_seconds)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._observe()
+            if isinstance(exc, asyncio.TimeoutError):
+                self._reject(SHED_TIMEOUT)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._observe()
+                return
+        self.in_flight -= 1
+        self._observe()
+
+    def _observe(self) -> None:
+        if self.metrics is not None:
+            self.metrics.observe_admission(self.in_flight, self.queued)
+
+    def _reject(self, reason: str) -> None:
+        self.shed[reason] += 1
+        if self.metrics is not None:
+            self.metrics.observe_admission_shed(reason)
+        raise AdmissionRejectedError(reason)
+
+
+class AdmissionControlMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        admission: AdmissionController,
+        path_prefixes: tuple[str, ...],
+        exclude_prefixes: tuple[str, ...] = (),
+        retry_after_seconds: int = 1,
+    ):
+        self.app = app
+        self.admission = admission
+        self.path_prefixes = path_prefixes
+        self.exclude_prefixes = exclude_prefixes
+        self.retry_after_seconds = retry_after_seconds
+
+    def _is_guarded(self, path: str) -> bool:
+        if path.startswith(self.exclude_prefixes):
+            return False
+        return any(
+            path == prefix or path.startswith(prefix + "/")
+            for prefix in self.path_prefixes
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._is_guarded(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.admission.acquire()
+        except AdmissionRejectedError as exc:
+            log.warning(
+                "Запрос %s %s отклонен: %s", scope["method"], scope["path"], exc.reason
+            )
+            response = JSONResponse(
+                status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": str(exc)},
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
+
+
+def make_admission_controller(
+    *,
+    max_in_flight: int,
+    max_queue_size: int,
+    queue_timeout_seconds: float,
+    metrics: Metrics | None = None,
+) -> AdmissionController:
+    return AdmissionController(
+        max_in_flight=max_in_flight,
+        max_queue_size=max_queue_size,
+        queue_timeout_seconds=queue_timeout_seconds,
+        metrics=metrics,
+    )
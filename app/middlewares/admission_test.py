@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.middlewares.admission import (
+    AdmissionController,
+    AdmissionControlMiddleware,
+    AdmissionRejectedError,
+)
+
+
+def make_admission(**kwargs) -> AdmissionController:
+    options = {"max_in_flight": 1, "max_queue_size": 1, "queue_timeout_seconds": 1}
+    return AdmissionController(**options | kwargs)
+
+
+@pytest.mark.asyncio
+async def test_waiter_gets_slot_released_by_finished_request():
+    admission = make_admission()
+    await admission.acquire()
+
+    waiter = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    assert admission.stats()["queued"] == 1
+
+    admission.release()
+    await waiter
+
+    assert admission.stats() == {
+        "in_flight": 1,
+        "queued": 0,
+        "max_in_flight": 1,
+        "max_queue_size": 1,
+        "shed": {"queue_full": 0, "timeout": 0},
+    }
+    admission.release()
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full_and_after_deadline():
+    admission = make_admission(queue_timeout_seconds=0.01)
+    await admission.acquire()
+    waiter = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejectedError):
+        await admission.acquire()
+    with pytest.raises(AdmissionRejectedError):
+        await waiter
+
+    assert admission.shed == {"queue_full": 1, "timeout": 1}
+    assert admission.queued == 0
+    admission.release()
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_sheds_guarded_paths_with_retry_after():
+    admission = make_admission(max_queue_size=0)
+    app = FastAPI()
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        admission=admission,
+        path_prefixes=("/calc",),
+        exclude_prefixes=("/calc/export", "/calc/jobs/"),
+        retry_after_seconds=2,
+    )
+    started = asyncio.Event()
+    finish = asyncio.Event()
+
+    @app.get("/calc")
+    async def calc():
+        started.set()
+        await finish.wait()
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/calc/export")
+    async def export():
+        return {"ok": True}
+
+    @app.get("/calc/jobs/{job_id}")
+    async def job(job_id: int):
+        return {"id": job_id}
+
+    @app.post("/calc/jobs")
+    async def submit_job():
+        return {"id": 1}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        slow = asyncio.create_task(client.get("/calc"))
+        await started.wait()
+
+        shed = await client.get("/calc")
+        health = await client.get("/health")
+        export = await client.get("/calc/export")
+        job = await client.get("/calc/jobs/1")
+        submit = await client.post("/calc/jobs")
+        finish.set()
+        ok = await slow
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "2"
+    assert health.status_code == 200
+    assert export.status_code == 200
+    assert job.status_code == 200
+    assert submit.status_code == 503
+    assert ok.status_code == 200
+    assert admission.in_flight == 0
@@ -0,0 +1,253 @@
+import zlib
+from typing import Callable
+
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_413_CONTENT_TOO_LARGE,
+    HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+GZIP = "gzip"
+ZSTD = "zstd"
+IDENTITY = "identity"
+RESPONSE_ENCODINGS = (ZSTD, GZIP)
+ZSTD_INPUT_SLICE = 256
+ZSTD_MAX_WINDOW_SIZE = 8 * 1024 * 1024
+UNCOMPRESSIBLE_MEDIA_TYPES = ("text/event-stream",)
+
+
+class _GzipDecoder:
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    @property
+    def eof(self) -> bool:
+        return self._decompressor.eof
+
+    def decode(self, data: bytes, limit: int) -> bytes:
+        parts = []
+        while data and not self._decompressor.eof:
+            part = self._decompressor.decompress(data, limit + 1)
+            limit -= len(part)
+            if limit < 0:
+                raise _too_large()
+            parts.append(part)
+            data = self._decompressor.unconsumed_tail
+        return b"".join(parts)
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor(
+            max_window_size=ZSTD_MAX_WINDOW_SIZE
+        ).decompressobj()
+
+    @property
+    def eof(self) -> bool:
+        return self._decompressor.eof
+
+    def decode(self, data: bytes, limit: int) -> bytes:
+        parts = []
+        for offset in range(0, len(data), ZSTD_INPUT_SLICE):
+            part = self._decompressor.decompress(
+                data[offset : offset + ZSTD_INPUT_SLICE]
+            )
+            limit -= len(part)
+            if limit < 0:
+                raise _too_large()
+            parts.append(part)
+        return b"".join(parts)
+
+
+REQUEST_DECODERS = {GZIP: _GzipDecoder, ZSTD: _ZstdDecoder}
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_413_CONTENT_TOO_LARGE,
+        detail="Тело запроса после распаковки превышает допустимый размер",
+    )
+
+
+def _invalid_body(encoding: str) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_400_BAD_REQUEST,
+        detail=f"Некорректное тело запроса в кодировке {encoding}",
+    )
+
+
+class RequestDecompressionMiddleware:
+    def __init__(self, app: ASGIApp, *, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = Headers(scope=scope).get("content-encoding", IDENTITY)
+        encoding = encoding.strip().lower()
+        if encoding == IDENTITY:
+            await self.app(scope, receive, send)
+            return
+        if encoding not in REQUEST_DECODERS:
+            response = JSONResponse(
+                status_code=HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                content={"detail": f"Неподдерживаемый Content-Encoding: {encoding}"},
+            )
+            await response(scope, receive, send)
+            return
+
+        decoder = REQUEST_DECODERS[encoding]()
+        remaining = self.max_size
+
+        async def receive_decompressed() -> Message:
+            nonlocal remaining
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            try:
+                body = decoder.decode(message.get("body", b""), remaining)
+            except (zlib.error, zstandard.ZstdError):
+                raise _invalid_body(encoding)
+            remaining -= len(body)
+            if not message.get("more_body", False) and not decoder.eof:
+                raise _invalid_body(encoding)
+            return {**message, "body": body}
+
+        headers = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        await self.app({**scope, "headers": headers}, receive_decompressed, send)
+
+
+def select_encoding(accept_encoding: str) -> str | None:
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in RESPONSE_ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def make_response_encoder(
+    encoding: str, *, gzip_level: int, zstd_level: int
+) -> Callable[[bytes, bool], bytes]:
+    if encoding == ZSTD:
+        zstd = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+
+        def encode_zstd(data: bytes, final: bool) -> bytes:
+            return zstd.compress(data) + zstd.flush(
+                zstandard.COMPRESSOBJ_FLUSH_FINISH
+                if final
+                else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+
+        return encode_zstd
+
+    gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode_gzip(data: bytes, final: bool) -> bytes:
+        return gzip.compress(data) + gzip.flush(
+            zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        )
+
+    return encode_gzip
+
+
+class ResponseCompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        zstd_level: int = 3,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        encode: Callable[[bytes, bool], bytes] | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, encode, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                if (
+                    "content-encoding" in headers
+                    or media_type in UNCOMPRESSIBLE_MEDIA_TYPES
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encode is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encode = make_response_encoder(
+                    encoding, gzip_level=self.gzip_level, zstd_level=self.zstd_level
+                )
+                body = encode(body, not more_body)
+                headers = MutableHeaders(scope=start)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({**message, "body": body})
+                return
+
+            await send({**message, "body": encode(body, not more_body)})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,169 @@
+import gzip
+import json
+
+import pytest
+import zstandard
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middlewares.compression import (
+    RequestDecompressionMiddleware,
+    ResponseCompressionMiddleware,
+    select_encoding,
+)
+
+MATERIALS = {
+    "materials": [{"name": "Сталь", "qty": 1.5, "price_rub": 54.5}] * 200,
+}
+
+
+def make_client(max_size: int = 1024 * 1024) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(RequestDecompressionMiddleware, max_size=max_size)
+    app.add_middleware(ResponseCompressionMiddleware, minimum_size=500)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.json()
+        return {
+            "count": len(body["materials"]),
+            "content_length": request.headers.get("content-length"),
+            "content_encoding": request.headers.get("content-encoding"),
+        }
+
+    @app.get("/large")
+    async def large():
+        return MATERIALS
+
+    @app.get("/tagged")
+    async def tagged(weak: bool = False):
+        etag = 'W/"v1"' if weak else '"v1"'
+        return JSONResponse(MATERIALS, headers={"ETag": etag})
+
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(100):
+                yield json.dumps({"line": i, "name": "Сталь"}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "encoding, compress",
+    [("gzip", gzip.compress), ("zstd", zstandard.ZstdCompressor().compress)],
+)
+def test_request_body_is_decompressed(encoding, compress):
+    payload = compress(json.dumps(MATERIALS).encode())
+
+    with make_client() as client:
+        response = client.post(
+            "/echo", content=payload, headers={"Content-Encoding": encoding}
+        )
+
+    assert response.json() == {
+        "count": 200,
+        "content_length": None,
+        "content_encoding": None,
+    }
+
+
+@pytest.mark.parametrize(
+    "encoding, compress",
+    [("gzip", gzip.compress), ("zstd", zstandard.ZstdCompressor().compress)],
+)
+def test_request_body_limits_and_errors(encoding, compress):
+    bomb = compress(b"[" + b" " * 10_000_000 + b"]")
+
+    with make_client(max_size=100_000) as client:
+        too_large = client.post(
+            "/echo", content=bomb, headers={"Content-Encoding": encoding}
+        )
+        corrupt = client.post(
+            "/echo", content=b"not compressed", headers={"Content-Encoding": encoding}
+        )
+        truncated = client.post(
+            "/echo",
+            content=compress(json.dumps(MATERIALS).encode())[:-10],
+            headers={"Content-Encoding": encoding},
+        )
+        unsupported = client.post(
+            "/echo", content=b"{}", headers={"Content-Encoding": "br"}
+        )
+
+    assert len(bomb) < 20_000
+    assert too_large.status_code == 413
+    assert corrupt.status_code == 400
+    assert truncated.status_code == 400
+    assert unsupported.status_code == 415
+
+
+def test_response_is_compressed_by_negotiated_encoding():
+    with make_client() as client:
+        zstd = client.get("/large", headers={"Accept-Encoding": "gzip, zstd"})
+        gzipped = client.get("/large", headers={"Accept-Encoding": "zstd;q=0, gzip"})
+        plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+        small = client.post(
+            "/echo",
+            json={"materials": []},
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+    assert zstd.headers["Content-Encoding"] == "zstd"
+    assert zstd.headers["Vary"] == "Accept-Encoding"
+    assert int(zstd.headers["Content-Length"]) < len(plain.content) / 10
+    assert zstd.json() == MATERIALS
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.json() == MATERIALS
+    assert "Content-Encoding" not in plain.headers
+    assert "Content-Encoding" not in small.headers
+
+
+def test_compressed_response_has_weak_etag():
+    with make_client() as client:
+        compressed = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+        weak = client.get(
+            "/tagged", params={"weak": True}, headers={"Accept-Encoding": "gzip"}
+        )
+        plain = client.get("/tagged", headers={"Accept-Encoding": "identity"})
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == 'W/"v1"'
+    assert weak.headers["ETag"] == 'W/"v1"'
+    assert plain.headers["ETag"] == '"v1"'
+
+
+def test_streaming_response_is_compressed_incrementally():
+    with (
+        make_client() as client,
+        client.stream(
+            "GET", "/stream", headers={"Accept-Encoding": "gzip"}
+        ) as response,
+    ):
+        raw = b"".join(response.iter_raw())
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert len(lines) == 100
+    assert json.loads(lines[-1]) == {"line": 99, "name": "Сталь"}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("zstd;q=0.5, gzip", "gzip"),
+        ("*", "zstd"),
+        ("*;q=0, gzip;q=0.1", "gzip"),
+        ("br", None),
+    ],
+)
+def test_select_encoding(accept_encoding, expected):
+    assert select_encoding(accept_encoding) == expected
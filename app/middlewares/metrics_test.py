@@ -0,0 +1,53 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.metrics.metrics import Metrics
+from app.middlewares.metrics import MetricsMiddleware
+
+
+def make_app(metrics: Metrics) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=503, detail="unavailable")
+        return {"id": item_id}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def counters(metrics: Metrics, name: str) -> dict:
+    return {
+        tuple(sorted(sample.labels.items())): sample.value
+        for family in text_string_to_metric_families(metrics.render().decode())
+        for sample in family.samples
+        if sample.name == name
+    }
+
+
+def test_requests_are_labeled_by_route_template():
+    metrics = Metrics()
+
+    with TestClient(make_app(metrics), raise_server_exceptions=False) as client:
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/items/0")
+        client.get("/boom")
+        client.get("/missing")
+
+    requests = counters(metrics, "calc_http_requests_total")
+    route = (("method", "GET"), ("route", "/items/{item_id}"))
+    assert requests[route + (("status", "200"),)] == 2
+    assert requests[route + (("status", "503"),)] == 1
+    assert requests[(("method", "GET"), ("route", "unmatched"), ("status", "404"))] == 1
+
+    errors = counters(metrics, "calc_http_request_errors_total")
+    assert errors[route] == 1
+    assert errors[(("method", "GET"), ("route", "/boom"))] == 1
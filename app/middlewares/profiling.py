@@ -0,0 +1,53 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.profiling.profiler import RequestProfiler
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        profiler: RequestProfiler,
+        path_prefixes: tuple[str, ...],
+    ):
+        self.app = app
+        self.profiler = profiler
+        self.path_prefixes = path_prefixes
+
+    def _is_profiled(self, path: str) -> bool:
+        return any(
+            path == prefix or path.startswith(prefix + "/")
+            for prefix in self.path_prefixes
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._is_profiled(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.profiler.select(Headers(scope=scope).get(PROFILE_TOKEN_HEADER))
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        active = self.profiler.start(reason)
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, active.id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            await self.profiler.finish(
+                active, method=scope["method"], path=scope["path"], status=status_code
+            )
@@ -0,0 +1,46 @@
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middlewares.profiling import ProfilingMiddleware
+from app.middlewares.trace_id import TraceIdMiddleware
+from app.profiling.profiler import RequestProfiler
+
+
+def test_only_authorized_requests_on_profiled_paths_are_profiled(tmp_path):
+    trace_id_ctx = ContextVar("trace_id_ctx", default=None)
+    profiler = RequestProfiler(
+        directory=str(tmp_path), trace_id_ctx=trace_id_ctx, token="secret"
+    )
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, path_prefixes=("/calc",))
+    app.add_middleware(TraceIdMiddleware, trace_id_ctx=trace_id_ctx)
+
+    @app.get("/calc")
+    async def calc():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    with TestClient(app) as client:
+        profiled = client.get(
+            "/calc", headers={"X-Profile-Token": "secret", "X-Request-ID": "req-1"}
+        )
+        plain = client.get("/calc")
+        wrong = client.get("/calc", headers={"X-Profile-Token": "nope"})
+        other = client.get("/health", headers={"X-Profile-Token": "secret"})
+
+    profile_id = profiled.headers["X-Profile-Id"]
+    assert profile_id.startswith("req-1-")
+    assert "X-Profile-Id" not in plain.headers
+    assert "X-Profile-Id" not in wrong.headers
+    assert "X-Profile-Id" not in other.headers
+
+    [summary] = profiler.list_profiles()
+    assert summary["id"] == profile_id
+    assert summary["trace_id"] == "req-1"
+    assert summary["reason"] == "header"
+    assert summary["status"] == 200
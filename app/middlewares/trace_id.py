@@ -0,0 +1,47 @@
+import re
+import uuid
+from contextvars import ContextVar
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+TRACE_ID_HEADER = "X-Request-ID"
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:\-]{1,128}$")
+INVALID_TRACE_ID = "0" * 32
+
+
+def extract_trace_id(headers: Headers) -> str | None:
+    traceparent = headers.get("traceparent")
+    if traceparent:
+        match = TRACEPARENT_RE.match(traceparent.strip().lower())
+        if match and match.group(1) != INVALID_TRACE_ID:
+            return match.group(1)
+    request_id = headers.get("x-request-id")
+    if request_id and REQUEST_ID_RE.match(request_id):
+        return request_id
+    return None
+
+
+class TraceIdMiddleware:
+    def __init__(self, app: ASGIApp, *, trace_id_ctx: ContextVar[str | None]):
+        self.app = app
+        self.trace_id_ctx = trace_id_ctx
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = extract_trace_id(Headers(scope=scope)) or str(uuid.uuid4())
+
+        async def send_with_trace_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(TRACE_ID_HEADER, trace_id)
+            await send(message)
+
+        token = self.trace_id_ctx.set(trace_id)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            self.trace_id_ctx.reset(token)
@@ -0,0 +1,80 @@
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middlewares.trace_id import TraceIdMiddleware
+
+
+def make_client():
+    ctx = ContextVar("trace_id_ctx", default=None)
+    app = FastAPI()
+    app.add_middleware(TraceIdMiddleware, trace_id_ctx=ctx)
+
+    @app.get("/trace")
+    async def trace():
+        return {"trace_id": ctx.get()}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield ctx.get().encode()
+            yield b"|done"
+
+        return StreamingResponse(chunks())
+
+    return TestClient(app), ctx
+
+
+def test_generates_trace_id_and_echoes_it():
+    client, ctx = make_client()
+
+    with client:
+        response = client.get("/trace")
+
+    trace_id = response.json()["trace_id"]
+    assert len(trace_id) == 36
+    assert response.headers["X-Request-ID"] == trace_id
+    assert ctx.get() is None
+
+
+def test_uses_w3c_traceparent():
+    client, _ = make_client()
+    traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    with client:
+        response = client.get(
+            "/trace",
+            headers={"traceparent": traceparent, "X-Request-ID": "ignored"},
+        )
+
+    assert response.json()["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert response.headers["X-Request-ID"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def test_uses_request_id_and_rejects_invalid_values():
+    client, _ = make_client()
+
+    with client:
+        valid = client.get("/trace", headers={"X-Request-ID": "req-42"})
+        invalid = client.get(
+            "/trace",
+            headers={
+                "X-Request-ID": "bad id\twith spaces",
+                "traceparent": "00-" + "0" * 32 + "-00f067aa0ba902b7-01",
+            },
+        )
+
+    assert valid.json()["trace_id"] == "req-42"
+    assert invalid.json()["trace_id"] not in ("bad id\twith spaces", "0" * 32)
+
+
+def test_trace_id_is_available_while_streaming():
+    client, _ = make_client()
+
+    with client:
+        response = client.get("/stream", headers={"X-Request-ID": "req-7"})
+
+    assert response.text == "req-7|done"
+    assert response.headers["X-Request-ID"] == "req-7"
@@ -0,0 +1,240 @@
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import pstats
+import random
+import re
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_:\-][A-Za-z0-9._:\-]{0,159}$")
+SQL_STATEMENT_MAX_LENGTH = 1000
+TOP_FUNCTIONS = 30
+SUMMARY_FIELDS = (
+    "id",
+    "trace_id",
+    "reason",
+    "method",
+    "path",
+    "status",
+    "started_at",
+    "duration_ms",
+    "sql_count",
+    "sql_total_ms",
+)
+
+
+def top_functions(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> list[dict]:
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": nc,
+            "tottime_ms": tt * 1000,
+            "cumtime_ms": ct * 1000,
+        }
+        for (filename, line, name), (_, nc, tt, ct, _) in rows[:limit]
+    ]
+
+
+class ActiveProfile:
+    def __init__(self, *, id: str, trace_id: str | None, reason: str):
+        self.id = id
+        self.trace_id = trace_id
+        self.reason = reason
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.sql: list[dict] = []
+        self.profile = cProfile.Profile()
+        self.token = None
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        *,
+        directory: str,
+        trace_id_ctx: ContextVar[str | None],
+        token: str = "",
+        sample_rate: float = 0.0,
+        keep: int = 50,
+    ):
+        self.directory = Path(directory)
+        self._trace_id_ctx = trace_id_ctx
+        self._token = token
+        self._sample_rate = sample_rate
+        self._keep = keep
+        self._active: ContextVar[ActiveProfile | None] = ContextVar(
+            "active_profile", default=None
+        )
+        self._busy = False
+
+    def is_authorized(self, token: str | None) -> bool:
+        return bool(self._token) and hmac.compare_digest(
+            (token or "").encode(), self._token.encode()
+        )
+
+    def select(self, token: str | None) -> str | None:
+        if self._busy:
+            return None
+        if token is not None and self.is_authorized(token):
+            return "header"
+        if self._sample_rate and random.random() < self._sample_rate:
+            return "sample"
+        return None
+
+    def start(self, reason: str) -> ActiveProfile:
+        trace_id = self._trace_id_ctx.get()
+        active = ActiveProfile(
+            id=f"{trace_id or 'request'}-{time.time_ns() // 1_000_000}",
+            trace_id=trace_id,
+            reason=reason,
+        )
+        self._busy = True
+        active.token = self._active.set(active)
+        active.profile.enable()
+        return active
+
+    async def finish(
+        self, active: ActiveProfile, *, method: str, path: str, status: int
+    ) -> None:
+        active.profile.disable()
+        duration = time.perf_counter() - active.started
+        self._active.reset(active.token)
+        self._busy = False
+        try:
+            await asyncio.to_thread(
+                self._save,
+                active,
+                method=method,
+                path=path,
+                status=status,
+                duration=duration,
+            )
+        except Exception:
+            log.exception("Не удалось сохранить профиль %s", active.id)
+            return
+        log.info(
+            "Профиль %s сохранен: %s %s, %.1f мс",
+            active.id,
+            method,
+            path,
+            duration * 1000,
+        )
+
+    def instrument_engine(self, engine: Engine) -> None:
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, params, context, many):
+            if self._active.get() is not None:
+                conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, params, context, many):
+            active = self._active.get()
+            if active is None:
+                return
+            started = conn.info["profile_started"].pop()
+            active.sql.append(
+                {
+                    "statement": statement[:SQL_STATEMENT_MAX_LENGTH],
+                    "executemany": many,
+                    "duration_ms": (time.perf_counter() - started) * 1000,
+                }
+            )
+
+    def list_profiles(self) -> list[dict]:
+        profiles = []
+        for path in self._summary_paths():
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            profiles.append({field: data.get(field) for field in SUMMARY_FIELDS})
+        return profiles
+
+    def get_profile(self, profile_id: str) -> dict | None:
+        path = self._path(profile_id, ".json")
+        if path is None or not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def pstats_path(self, profile_id: str) -> Path | None:
+        path = self._path(profile_id, ".prof")
+        if path is None or not path.exists():
+            return None
+        return path
+
+    def _path(self, profile_id: str, suffix: str) -> Path | None:
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        return self.directory / f"{profile_id}{suffix}"
+
+    def _summary_paths(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        paths = []
+        for path in self.directory.glob("*.json"):
+            try:
+                paths.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        return [path for _, path in sorted(paths, reverse=True)]
+
+    def _save(
+        self,
+        active: ActiveProfile,
+        *,
+        method: str,
+        path: str,
+        status: int,
+        duration: float,
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(active.profile)
+        stats.dump_stats(self.directory / f"{active.id}.prof")
+        summary = {
+            "id": active.id,
+            "trace_id": active.trace_id,
+            "reason": active.reason,
+            "method": method,
+            "path": path,
+            "status": status,
+            "started_at": active.started_at.isoformat(),
+            "duration_ms": duration * 1000,
+            "sql_count": len(active.sql),
+            "sql_total_ms": sum(query["duration_ms"] for query in active.sql),
+            "sql": active.sql,
+            "functions": top_functions(stats),
+        }
+        (self.directory / f"{active.id}.json").write_text(
+            json.dumps(summary, ensure_ascii=False)
+        )
+        for stale in self._summary_paths()[self._keep :]:
+            stale.unlink(missing_ok=True)
+            stale.with_suffix(".prof").unlink(missing_ok=True)
+
+
+def make_request_profiler(
+    *,
+    directory: str,
+    trace_id_ctx: ContextVar[str | None],
+    token: str = "",
+    sample_rate: float = 0.0,
+    keep: int = 50,
+) -> RequestProfiler:
+    return RequestProfiler(
+        directory=directory,
+        trace_id_ctx=trace_id_ctx,
+        token=token,
+        sample_rate=sample_rate,
+        keep=keep,
+    )
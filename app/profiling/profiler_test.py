@@ -0,0 +1,75 @@
+from contextvars import ContextVar
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.profiling.profiler import RequestProfiler
+
+
+def make_profiler(tmp_path, **kwargs) -> RequestProfiler:
+    trace_id_ctx = ContextVar("trace_id_ctx", default="abc123")
+    return RequestProfiler(
+        directory=str(tmp_path), trace_id_ctx=trace_id_ctx, token="secret", **kwargs
+    )
+
+
+def test_select_by_token_or_sample_rate(tmp_path):
+    profiler = make_profiler(tmp_path)
+    sampled = make_profiler(tmp_path, sample_rate=1.0)
+    without_token = RequestProfiler(
+        directory=str(tmp_path), trace_id_ctx=ContextVar("ctx", default=None)
+    )
+
+    assert profiler.select("secret") == "header"
+    assert profiler.select("wrong") is None
+    assert profiler.select(None) is None
+    assert sampled.select(None) == "sample"
+    assert without_token.select("") is None
+
+
+@pytest.mark.asyncio
+async def test_profile_records_sql_and_is_listed(tmp_path):
+    profiler = make_profiler(tmp_path / "profiles")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+    profiler.instrument_engine(engine.sync_engine)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        active = profiler.start("header")
+        assert profiler.select("secret") is None
+        await conn.execute(text("SELECT 2"))
+        await profiler.finish(active, method="POST", path="/calc", status=200)
+        await conn.execute(text("SELECT 3"))
+    await engine.dispose()
+
+    [summary] = profiler.list_profiles()
+    profile = profiler.get_profile(active.id)
+
+    assert summary["id"] == active.id
+    assert active.id.startswith("abc123-")
+    assert summary["trace_id"] == "abc123"
+    assert summary["sql_count"] == 1
+    assert [query["statement"] for query in profile["sql"]] == ["SELECT 2"]
+    assert profile["functions"]
+    assert profiler.pstats_path(active.id).exists()
+    assert profiler.select("secret") == "header"
+
+
+@pytest.mark.asyncio
+async def test_old_profiles_are_pruned_and_ids_are_validated(tmp_path):
+    profiler = make_profiler(tmp_path, keep=2)
+
+    ids = []
+    for _ in range(3):
+        active = profiler.start("sample")
+        active.id += f"-{len(ids)}"
+        await profiler.finish(active, method="GET", path="/calc", status=200)
+        ids.append(active.id)
+
+    assert len(profiler.list_profiles()) == 2
+    assert profiler.get_profile(ids[0]) is None
+    assert profiler.pstats_path(ids[0]) is None
+    assert profiler.get_profile(ids[2])["id"] == ids[2]
+    assert profiler.get_profile("../etc/passwd") is None
+    assert profiler.pstats_path("..") is None
@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import insert, select, update
+
+from app.repositories.models.calc_job import CalcJob
+from app.session_manager.session_manager import SessionManager
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+JOB_COLUMNS = (
+    CalcJob.id,
+    CalcJob.status,
+    CalcJob.result_id,
+    CalcJob.result_total_cost_rub,
+    CalcJob.result_created_at,
+    CalcJob.error,
+    CalcJob.created_at,
+    CalcJob.updated_at,
+)
+
+DECIMAL_FIELDS = ("qty", "price_rub")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def dump_materials(materials: list[dict]) -> list[dict]:
+    return [
+        {
+            key: str(value) if isinstance(value, Decimal) else value
+            for key, value in m.items()
+        }
+        for m in materials
+    ]
+
+
+def load_materials(data: list[dict]) -> list[dict]:
+    return [
+        {**m, **{key: Decimal(m[key]) for key in DECIMAL_FIELDS if key in m}}
+        for m in data
+    ]
+
+
+class CalcJobRepository:
+    def __init__(self, *, session_manager: SessionManager):
+        self.session_manager = session_manager
+
+    async def create(self, *, materials: list[dict]) -> dict:
+        now = utcnow()
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                insert(CalcJob)
+                .values(
+                    status=JOB_QUEUED,
+                    materials=dump_materials(materials),
+                    attempts=0,
+                    created_at=now,
+                    updated_at=now,
+                )
+                .returning(*JOB_COLUMNS)
+            )
+            return dict(result.mappings().one())
+
+    async def get(self, job_id: int) -> dict | None:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                select(*JOB_COLUMNS).where(CalcJob.id == job_id)
+            )
+            row = result.mappings().one_or_none()
+            return dict(row) if row is not None else None
+
+    async def claim(self, job_id: int) -> list[dict] | None:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                update(CalcJob)
+                .where(CalcJob.id == job_id, CalcJob.status == JOB_QUEUED)
+                .values(
+                    status=JOB_RUNNING,
+                    attempts=CalcJob.attempts + 1,
+                    updated_at=utcnow(),
+                )
+                .returning(CalcJob.materials)
+            )
+            materials = result.scalar_one_or_none()
+            return load_materials(materials) if materials is not None else None
+
+    async def complete(self, job_id: int, result: dict) -> None:
+        async with self.session_manager.get_session() as session:
+            await session.execute(
+                update(CalcJob)
+                .where(CalcJob.id == job_id)
+                .values(
+                    status=JOB_DONE,
+                    materials=[],
+                    result_id=result["id"],
+                    result_total_cost_rub=result["total_cost_rub"],
+                    result_created_at=result["created_at"],
+                    error=None,
+                    updated_at=utcnow(),
+                )
+            )
+
+    async def fail(self, job_id: int, error: str) -> None:
+        async with self.session_manager.get_session() as session:
+            await session.execute(
+                update(CalcJob)
+                .where(CalcJob.id == job_id)
+                .values(status=JOB_FAILED, error=error, updated_at=utcnow())
+            )
+
+    async def release(self, job_ids: list[int]) -> None:
+        async with self.session_manager.get_session() as session:
+            await session.execute(
+                update(CalcJob)
+                .where(CalcJob.id.in_(job_ids), CalcJob.status == JOB_RUNNING)
+                .values(status=JOB_QUEUED, updated_at=utcnow())
+            )
+
+    async def touch(self, job_ids: list[int]) -> None:
+        async with self.session_manager.get_session() as session:
+            await session.execute(
+                update(CalcJob)
+                .where(CalcJob.id.in_(job_ids), CalcJob.status == JOB_RUNNING)
+                .values(updated_at=utcnow())
+            )
+
+    async def requeue_stale(self, *, updated_before: datetime) -> int:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                update(CalcJob)
+                .where(
+                    CalcJob.status == JOB_RUNNING,
+                    CalcJob.updated_at < updated_before,
+                )
+                .values(status=JOB_QUEUED, updated_at=utcnow())
+            )
+            return result.rowcount
+
+    async def queued_ids(self, *, updated_before: datetime, limit: int) -> list[int]:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                select(CalcJob.id)
+                .where(
+                    CalcJob.status == JOB_QUEUED,
+                    CalcJob.updated_at < updated_before,
+                )
+                .order_by(CalcJob.id)
+                .limit(limit)
+            )
+            return list(result.scalars())
+
+
+def make_calc_job_repository(session_manager: SessionManager) -> CalcJobRepository:
+    return CalcJobRepository(session_manager=session_manager)
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.repositories.calc_job import (
+    JOB_DONE,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    CalcJobRepository,
+    dump_materials,
+    load_materials,
+    utcnow,
+)
+from app.repositories.calc_result_test import (
+    SqliteSessionManager,
+    make_sqlite_session_factory,
+)
+
+
+def test_materials_round_trip_keeps_decimal_text():
+    materials = [{"id": 3, "qty": Decimal("12.30"), "price_rub": Decimal("54.5")}]
+
+    assert dump_materials(materials) == [{"id": 3, "qty": "12.30", "price_rub": "54.5"}]
+    assert load_materials(dump_materials(materials)) == materials
+
+
+@pytest.mark.asyncio
+async def test_job_is_claimed_once_and_stores_result():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcJobRepository(session_manager=SqliteSessionManager(session_factory))
+    materials = [{"name": "Сталь", "qty": Decimal("1.5"), "price_rub": Decimal("2")}]
+
+    job = await repo.create(materials=materials)
+    claimed = await repo.claim(job["id"])
+    claimed_again = await repo.claim(job["id"])
+    created_at = utcnow()
+    await repo.complete(
+        job["id"],
+        {"id": 9, "total_cost_rub": Decimal("3.00"), "created_at": created_at},
+    )
+    stored = await repo.get(job["id"])
+    missing = await repo.get(job["id"] + 1)
+    await engine.dispose()
+
+    assert job["status"] == JOB_QUEUED
+    assert claimed == materials
+    assert claimed_again is None
+    assert stored["status"] == JOB_DONE
+    assert stored["result_id"] == 9
+    assert stored["result_total_cost_rub"] == Decimal("3.00")
+    assert missing is None
+
+
+@pytest.mark.asyncio
+async def test_stale_and_released_jobs_return_to_queue():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcJobRepository(session_manager=SqliteSessionManager(session_factory))
+    first = await repo.create(materials=[{"qty": 1, "price_rub": 1}])
+    second = await repo.create(materials=[{"qty": 1, "price_rub": 1}])
+    await repo.claim(first["id"])
+    await repo.claim(second["id"])
+
+    not_stale = await repo.requeue_stale(updated_before=utcnow() - timedelta(hours=1))
+    await repo.release([first["id"]])
+    stale = await repo.requeue_stale(updated_before=utcnow() + timedelta(seconds=1))
+    queued = await repo.queued_ids(
+        updated_before=utcnow() + timedelta(seconds=1), limit=10
+    )
+    await engine.dispose()
+
+    assert not_stale == 0
+    assert stale == 1
+    assert queued == [first["id"], second["id"]]
+
+
+@pytest.mark.asyncio
+async def test_touched_running_job_is_not_stale():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcJobRepository(session_manager=SqliteSessionManager(session_factory))
+    running = await repo.create(materials=[{"qty": 1, "price_rub": 1}])
+    queued = await repo.create(materials=[{"qty": 1, "price_rub": 1}])
+    await repo.claim(running["id"])
+
+    claimed_at = utcnow()
+    await repo.touch([running["id"], queued["id"]])
+    stale = await repo.requeue_stale(updated_before=claimed_at)
+    running_job = await repo.get(running["id"])
+    untouched = await repo.queued_ids(updated_before=claimed_at, limit=10)
+    await engine.dispose()
+
+    assert stale == 0
+    assert running_job["status"] == JOB_RUNNING
+    assert untouched == [queued["id"]]
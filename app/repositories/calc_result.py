@@ -1,32 +1,352 @@
 import logging
+from datetime import datetime
 from decimal import Decimal
+from typing import AsyncIterable, AsyncIterator, Callable
 
-from sqlalchemy import insert
+from sqlalchemy import (
+    Select,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.repositories.calc_result_items import (
+    ITEM_COLUMNS,
+    STREAM_ITEMS_BATCH_SIZE,
+    item_batches,
+    item_records,
+)
+from app.repositories.calc_result_rollup import (
+    ROLLUP_GRANULARITIES,
+    ROLLUP_SHARDS,
+    rollup_deltas,
+)
 from app.repositories.models.calc_result import CalcResult
+from app.repositories.models.calc_result_idempotency_key import (
+    CalcResultIdempotencyKey,
+)
+from app.repositories.models.calc_result_item import CalcResultItem
+from app.repositories.models.calc_result_rollup import CalcResultRollup
 from app.session_manager.session_manager import SessionManager
 
 log = logging.getLogger(__name__)
 
+RETURNING_COLUMNS = (CalcResult.id, CalcResult.total_cost_rub, CalcResult.created_at)
+
 
 class CalcResultRepository:
-    def __init__(self, *, session_manager: SessionManager):
+    def __init__(
+        self, *, session_manager: SessionManager, cache: LRUTTLCache | None = None
+    ):
         self.session_manager = session_manager
+        self.cache = cache
 
-    async def insert(self, *, total_cost_rub: Decimal) -> dict:
+    async def get_by_id(self, result_id: int) -> dict | None:
+        if self.cache is not None:
+            row = self.cache.get(result_id)
+            if row is not None:
+                return row
         async with self.session_manager.get_session() as session:
-            stmt = (
+            result = await session.execute(
+                select(*RETURNING_COLUMNS).where(CalcResult.id == result_id)
+            )
+            row = result.mappings().one_or_none()
+        if row is None:
+            return None
+        row = dict(row)
+        if self.cache is not None:
+            self.cache.put(result_id, row)
+        return row
+
+    async def insert(
+        self,
+        *,
+        total_cost_rub: Decimal,
+        idempotency_key: str | None = None,
+        items: list[dict] | None = None,
+    ) -> dict:
+        async with self.session_manager.get_session() as session:
+            if idempotency_key is not None:
+                claimed = await session.execute(
+                    pg_insert(CalcResultIdempotencyKey)
+                    .values(idempotency_key=idempotency_key)
+                    .on_conflict_do_nothing(
+                        index_elements=[CalcResultIdempotencyKey.idempotency_key]
+                    )
+                    .returning(CalcResultIdempotencyKey.idempotency_key)
+                )
+                if claimed.scalar_one_or_none() is None:
+                    log.info("Найден сохраненный результат по ключу идемпотентности")
+                    row = await self._select_by_idempotency_key(
+                        session, idempotency_key
+                    )
+                    self._cache_on_commit(session, [row])
+                    return row
+
+            result = await session.execute(
                 insert(CalcResult)
                 .values(total_cost_rub=total_cost_rub)
-                .returning(CalcResult)
+                .returning(*RETURNING_COLUMNS)
+            )
+            row = dict(result.mappings().one())
+            if idempotency_key is not None:
+                await session.execute(
+                    update(CalcResultIdempotencyKey)
+                    .where(CalcResultIdempotencyKey.idempotency_key == idempotency_key)
+                    .values(result_id=row["id"], result_created_at=row["created_at"])
+                )
+            await self._add_to_rollups(session, [row])
+            if items:
+                await self._copy_items(session, [row], [items])
+            self._cache_on_commit(session, [row])
+            return row
+
+    async def insert_streamed(
+        self,
+        *,
+        items: AsyncIterable[dict],
+        total_cost_rub: Callable[[], Decimal],
+        batch_size: int = STREAM_ITEMS_BATCH_SIZE,
+    ) -> dict:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                insert(CalcResult)
+                .values(total_cost_rub=Decimal(0))
+                .returning(*RETURNING_COLUMNS)
             )
+            row = dict(result.mappings().one())
+            line_no = 1
+            async for batch in item_batches(items, batch_size):
+                await self._copy_items(session, [row], [batch], first_line_no=line_no)
+                line_no += len(batch)
+            result = await session.execute(
+                update(CalcResult)
+                .where(CalcResult.id == row["id"])
+                .values(total_cost_rub=total_cost_rub())
+                .returning(*RETURNING_COLUMNS)
+            )
+            row = dict(result.mappings().one())
+            await self._add_to_rollups(session, [row])
+            self._cache_on_commit(session, [row])
+            return row
+
+    async def _select_by_idempotency_key(
+        self, session: AsyncSession, idempotency_key: str
+    ) -> dict:
+        result = await session.execute(
+            select(*RETURNING_COLUMNS)
+            .join(
+                CalcResultIdempotencyKey,
+                CalcResultIdempotencyKey.result_id == CalcResult.id,
+            )
+            .where(CalcResultIdempotencyKey.idempotency_key == idempotency_key)
+        )
+        return dict(result.mappings().one())
+
+    async def insert_many(
+        self,
+        *,
+        total_costs_rub: list[Decimal],
+        items: list[list[dict]] | None = None,
+    ) -> list[dict]:
+        if not total_costs_rub:
+            return []
+        async with self.session_manager.get_session() as session:
+            stmt = insert(CalcResult).returning(
+                *RETURNING_COLUMNS, sort_by_parameter_order=True
+            )
+            result = await session.execute(
+                stmt, [{"total_cost_rub": total} for total in total_costs_rub]
+            )
+            rows = [dict(row) for row in result.mappings()]
+            await self._add_to_rollups(session, rows)
+            if items:
+                await self._copy_items(session, rows, items)
+            self._cache_on_commit(session, rows)
+            return rows
+
+    async def list_page(
+        self,
+        *,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> list[dict]:
+        stmt = _select_ordered(after, created_from, created_to).limit(limit)
+        async with self.session_manager.get_session(read_only=True) as session:
+            result = await session.execute(stmt)
+            return [dict(row) for row in result.mappings()]
+
+    async def stream_rows(
+        self,
+        *,
+        chunk_size: int,
+        after: tuple[datetime, int] | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> AsyncIterator[list[dict]]:
+        stmt = _select_ordered(after, created_from, created_to).execution_options(
+            yield_per=chunk_size
+        )
+        async with self.session_manager.get_session(read_only=True) as session:
+            result = await session.stream(stmt)
+            async for partition in result.mappings().partitions():
+                yield [dict(row) for row in partition]
+
+    async def list_rollups(
+        self,
+        *,
+        granularity: str,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> list[dict]:
+        stmt = select(
+            CalcResultRollup.bucket,
+            func.sum(CalcResultRollup.count).label("count"),
+            func.sum(CalcResultRollup.total_cost_rub).label("total_cost_rub"),
+        ).where(CalcResultRollup.granularity == granularity)
+        if created_from is not None:
+            stmt = stmt.where(CalcResultRollup.bucket >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(CalcResultRollup.bucket < created_to)
+        stmt = stmt.group_by(CalcResultRollup.bucket).order_by(CalcResultRollup.bucket)
+        async with self.session_manager.get_session(read_only=True) as session:
             result = await session.execute(stmt)
-            await session.flush()
-            row: CalcResult = result.scalar_one()
-            return row.__dict__
+            return [dict(row) for row in result.mappings()]
+
+    async def created_at_range(self) -> tuple[datetime | None, datetime | None]:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                select(func.min(CalcResult.created_at), func.max(CalcResult.created_at))
+            )
+            return tuple(result.one())
+
+    async def rebuild_rollups(self, *, start: datetime, end: datetime) -> int:
+        async with self.session_manager.get_session() as session:
+            await session.execute(
+                text(
+                    f"LOCK TABLE {CalcResultRollup.__table__.fullname} "
+                    "IN SHARE ROW EXCLUSIVE MODE"
+                )
+            )
+            await session.execute(
+                delete(CalcResultRollup).where(
+                    CalcResultRollup.bucket >= start, CalcResultRollup.bucket < end
+                )
+            )
+            inserted = 0
+            for granularity in ROLLUP_GRANULARITIES:
+                bucket = func.date_trunc(
+                    literal_column(f"'{granularity}'"),
+                    CalcResult.created_at,
+                    literal_column("'UTC'"),
+                )
+                shard = CalcResult.id % literal_column(str(ROLLUP_SHARDS))
+                aggregated = (
+                    select(
+                        literal(granularity),
+                        bucket,
+                        shard,
+                        func.count(),
+                        func.sum(CalcResult.total_cost_rub),
+                    )
+                    .where(CalcResult.created_at >= start, CalcResult.created_at < end)
+                    .group_by(bucket, shard)
+                )
+                result = await session.execute(
+                    insert(CalcResultRollup).from_select(
+                        ["granularity", "bucket", "shard", "count", "total_cost_rub"],
+                        aggregated,
+                    )
+                )
+                inserted += result.rowcount
+            return inserted
+
+    def _cache_on_commit(self, session: AsyncSession, rows: list[dict]) -> None:
+        if self.cache is None:
+            return
+        cache = self.cache
+
+        def fill() -> None:
+            for row in rows:
+                cache.put(row["id"], row)
+
+        self.session_manager.after_commit(session, fill)
+
+    async def _add_to_rollups(self, session: AsyncSession, rows: list[dict]) -> None:
+        deltas = rollup_deltas(rows)
+        if not deltas:
+            return
+        stmt = pg_insert(CalcResultRollup).values(deltas)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    CalcResultRollup.granularity,
+                    CalcResultRollup.bucket,
+                    CalcResultRollup.shard,
+                ],
+                set_={
+                    "count": CalcResultRollup.count + stmt.excluded["count"],
+                    "total_cost_rub": CalcResultRollup.total_cost_rub
+                    + stmt.excluded.total_cost_rub,
+                },
+            )
+        )
+
+    async def _copy_items(
+        self,
+        session: AsyncSession,
+        rows: list[dict],
+        batch: list[list[dict]],
+        first_line_no: int = 1,
+    ) -> None:
+        connection = await session.connection()
+        records = item_records(rows, batch, first_line_no)
+        if connection.dialect.driver != "asyncpg":
+            await session.execute(
+                insert(CalcResultItem),
+                [dict(zip(ITEM_COLUMNS, record)) for record in records],
+            )
+            return
+        table = CalcResultItem.__table__
+        options = connection.sync_connection.get_execution_options()
+        schema_map = options.get("schema_translate_map") or {}
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            schema_name=schema_map.get(table.schema, table.schema),
+            columns=ITEM_COLUMNS,
+            records=records,
+        )
+
+
+def _select_ordered(
+    after: tuple[datetime, int] | None,
+    created_from: datetime | None,
+    created_to: datetime | None,
+) -> Select:
+    stmt = select(*RETURNING_COLUMNS)
+    if after is not None:
+        stmt = stmt.where(tuple_(CalcResult.created_at, CalcResult.id) > after)
+    if created_from is not None:
+        stmt = stmt.where(CalcResult.created_at >= created_from)
+    if created_to is not None:
+        stmt = stmt.where(CalcResult.created_at < created_to)
+    return stmt.order_by(CalcResult.created_at, CalcResult.id)
 
 
 def make_calc_result_repository(
     session_manager: SessionManager,
+    cache: LRUTTLCache | None = None,
 ) -> CalcResultRepository:
-    return CalcResultRepository(session_manager=session_manager)
+    return CalcResultRepository(session_manager=session_manager, cache=cache)
@@ -0,0 +1,288 @@
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterable, Callable
+
+import asyncpg
+
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.repositories.calc_result_items import (
+    ITEM_COLUMNS,
+    STREAM_ITEMS_BATCH_SIZE,
+    item_batches,
+    item_records,
+)
+from app.repositories.calc_result_rollup import rollup_deltas
+from app.session_manager.asyncpg_connection_manager import AsyncpgConnectionManager
+
+log = logging.getLogger(__name__)
+
+INSERT_SQL = """
+INSERT INTO calc_results (total_cost_rub)
+VALUES ($1)
+RETURNING id, total_cost_rub, created_at
+"""
+
+UPDATE_TOTAL_SQL = """
+UPDATE calc_results
+SET total_cost_rub = $2
+WHERE id = $1
+RETURNING id, total_cost_rub, created_at
+"""
+
+CLAIM_IDEMPOTENCY_KEY_SQL = """
+INSERT INTO calc_result_idempotency_keys (idempotency_key)
+VALUES ($1)
+ON CONFLICT (idempotency_key) DO NOTHING
+RETURNING idempotency_key
+"""
+
+BIND_IDEMPOTENCY_KEY_SQL = """
+UPDATE calc_result_idempotency_keys
+SET result_id = $2, result_created_at = $3
+WHERE idempotency_key = $1
+"""
+
+SELECT_BY_IDEMPOTENCY_KEY_SQL = """
+SELECT r.id, r.total_cost_rub, r.created_at
+FROM calc_results r
+JOIN calc_result_idempotency_keys k ON k.result_id = r.id
+WHERE k.idempotency_key = $1
+"""
+
+SELECT_BY_ID_SQL = """
+SELECT id, total_cost_rub, created_at
+FROM calc_results
+WHERE id = $1
+"""
+
+INSERT_MANY_SQL = """
+INSERT INTO calc_results (total_cost_rub)
+SELECT t.total_cost_rub
+FROM unnest($1::numeric[]) WITH ORDINALITY AS t(total_cost_rub, ord)
+ORDER BY t.ord
+RETURNING id, total_cost_rub, created_at
+"""
+
+SELECT_PAGE_SQL = """
+SELECT id, total_cost_rub, created_at
+FROM calc_results
+{where}
+ORDER BY created_at, id
+LIMIT ${limit_param}
+"""
+
+ADD_TO_ROLLUPS_SQL = """
+INSERT INTO calc_result_rollups (granularity, bucket, shard, count, total_cost_rub)
+SELECT *
+FROM unnest($1::varchar[], $2::timestamptz[], $3::smallint[], $4::bigint[], $5::numeric[])
+ON CONFLICT (granularity, bucket, shard) DO UPDATE
+SET count = calc_result_rollups.count + EXCLUDED.count,
+    total_cost_rub = calc_result_rollups.total_cost_rub + EXCLUDED.total_cost_rub
+"""
+
+ITEM_TABLE = "calc_result_items"
+
+SELECT_ROLLUPS_SQL = """
+SELECT bucket, sum(count) AS count, sum(total_cost_rub) AS total_cost_rub
+FROM calc_result_rollups
+WHERE granularity = $1
+  AND ($2::timestamptz IS NULL OR bucket >= $2)
+  AND ($3::timestamptz IS NULL OR bucket < $3)
+GROUP BY bucket
+ORDER BY bucket
+"""
+
+
+class AsyncpgCalcResultRepository:
+    def __init__(
+        self,
+        *,
+        connection_manager: AsyncpgConnectionManager,
+        cache: LRUTTLCache | None = None,
+    ):
+        self.connection_manager = connection_manager
+        self.cache = cache
+
+    async def get_by_id(self, result_id: int) -> dict | None:
+        if self.cache is not None:
+            row = self.cache.get(result_id)
+            if row is not None:
+                return row
+        async with self.connection_manager.get_connection() as connection:
+            record = await connection.fetchrow(SELECT_BY_ID_SQL, result_id)
+        if record is None:
+            return None
+        row = dict(record)
+        if self.cache is not None:
+            self.cache.put(result_id, row)
+        return row
+
+    async def insert(
+        self,
+        *,
+        total_cost_rub: Decimal,
+        idempotency_key: str | None = None,
+        items: list[dict] | None = None,
+    ) -> dict:
+        async with self.connection_manager.get_connection() as connection:
+            if idempotency_key is not None:
+                claimed = await connection.fetchval(
+                    CLAIM_IDEMPOTENCY_KEY_SQL, idempotency_key
+                )
+                if claimed is None:
+                    log.info("Найден сохраненный результат по ключу идемпотентности")
+                    record = await connection.fetchrow(
+                        SELECT_BY_IDEMPOTENCY_KEY_SQL, idempotency_key
+                    )
+                    row = dict(record)
+                    self._cache_on_commit(connection, [row])
+                    return row
+
+            row = dict(await connection.fetchrow(INSERT_SQL, total_cost_rub))
+            if idempotency_key is not None:
+                await connection.execute(
+                    BIND_IDEMPOTENCY_KEY_SQL,
+                    idempotency_key,
+                    row["id"],
+                    row["created_at"],
+                )
+            await self._add_to_rollups(connection, [row])
+            if items:
+                await self._copy_items(connection, [row], [items])
+            self._cache_on_commit(connection, [row])
+            return row
+
+    async def insert_streamed(
+        self,
+        *,
+        items: AsyncIterable[dict],
+        total_cost_rub: Callable[[], Decimal],
+        batch_size: int = STREAM_ITEMS_BATCH_SIZE,
+    ) -> dict:
+        async with self.connection_manager.get_connection() as connection:
+            row = dict(await connection.fetchrow(INSERT_SQL, Decimal(0)))
+            line_no = 1
+            async for batch in item_batches(items, batch_size):
+                await self._copy_items(
+                    connection, [row], [batch], first_line_no=line_no
+                )
+                line_no += len(batch)
+            row = dict(
+                await connection.fetchrow(UPDATE_TOTAL_SQL, row["id"], total_cost_rub())
+            )
+            await self._add_to_rollups(connection, [row])
+            self._cache_on_commit(connection, [row])
+            return row
+
+    async def insert_many(
+        self,
+        *,
+        total_costs_rub: list[Decimal],
+        items: list[list[dict]] | None = None,
+    ) -> list[dict]:
+        if not total_costs_rub:
+            return []
+        async with self.connection_manager.get_connection() as connection:
+            records = await connection.fetch(INSERT_MANY_SQL, total_costs_rub)
+            rows = sorted((dict(record) for record in records), key=lambda r: r["id"])
+            await self._add_to_rollups(connection, rows)
+            if items:
+                await self._copy_items(connection, rows, items)
+            self._cache_on_commit(connection, rows)
+            return rows
+
+    async def list_page(
+        self,
+        *,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> list[dict]:
+        conditions, args = [], []
+        if after is not None:
+            args.extend(after)
+            conditions.append(f"(created_at, id) > (${len(args) - 1}, ${len(args)})")
+        if created_from is not None:
+            args.append(created_from)
+            conditions.append(f"created_at >= ${len(args)}")
+        if created_to is not None:
+            args.append(created_to)
+            conditions.append(f"created_at < ${len(args)}")
+        args.append(limit)
+        sql = SELECT_PAGE_SQL.format(
+            where=f"WHERE {' AND '.join(conditions)}" if conditions else "",
+            limit_param=len(args),
+        )
+        async with self.connection_manager.get_connection() as connection:
+            records = await connection.fetch(sql, *args)
+            return [dict(record) for record in records]
+
+    async def list_rollups(
+        self,
+        *,
+        granularity: str,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> list[dict]:
+        async with self.connection_manager.get_connection() as connection:
+            records = await connection.fetch(
+                SELECT_ROLLUPS_SQL, granularity, created_from, created_to
+            )
+            return [dict(record) for record in records]
+
+    def _cache_on_commit(
+        self, connection: asyncpg.Connection, rows: list[dict]
+    ) -> None:
+        if self.cache is None:
+            return
+        cache = self.cache
+
+        def fill() -> None:
+            for row in rows:
+                cache.put(row["id"], row)
+
+        self.connection_manager.after_commit(connection, fill)
+
+    async def _add_to_rollups(
+        self, connection: asyncpg.Connection, rows: list[dict]
+    ) -> None:
+        deltas = rollup_deltas(rows)
+        if not deltas:
+            return
+        await connection.execute(
+            ADD_TO_ROLLUPS_SQL,
+            *(
+                [delta[column] for delta in deltas]
+                for column in (
+                    "granularity",
+                    "bucket",
+                    "shard",
+                    "count",
+                    "total_cost_rub",
+                )
+            ),
+        )
+
+    async def _copy_items(
+        self,
+        connection: asyncpg.Connection,
+        rows: list[dict],
+        batch: list[list[dict]],
+        first_line_no: int = 1,
+    ) -> None:
+        await connection.copy_records_to_table(
+            ITEM_TABLE,
+            columns=ITEM_COLUMNS,
+            records=item_records(rows, batch, first_line_no),
+        )
+
+
+def make_asyncpg_calc_result_repository(
+    connection_manager: AsyncpgConnectionManager,
+    cache: LRUTTLCache | None = None,
+) -> AsyncpgCalcResultRepository:
+    return AsyncpgCalcResultRepository(
+        connection_manager=connection_manager, cache=cache
+    )
@@ -0,0 +1,174 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.repositories.calc_result_asyncpg import (
+    ADD_TO_ROLLUPS_SQL,
+    CLAIM_IDEMPOTENCY_KEY_SQL,
+    INSERT_MANY_SQL,
+    INSERT_SQL,
+    ITEM_TABLE,
+    SELECT_BY_IDEMPOTENCY_KEY_SQL,
+    UPDATE_TOTAL_SQL,
+    AsyncpgCalcResultRepository,
+)
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def make_repo(connection):
+    class DummyConnectionManager:
+        @asynccontextmanager
+        async def get_connection(self):
+            yield connection
+
+    return AsyncpgCalcResultRepository(connection_manager=DummyConnectionManager())
+
+
+@pytest.mark.asyncio
+async def test_insert_returns_plain_dict():
+    connection = AsyncMock()
+    connection.fetchrow.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("100.50"),
+        "created_at": NOW,
+    }
+    repo = make_repo(connection)
+
+    result = await repo.insert(total_cost_rub=Decimal("100.50"))
+
+    connection.fetchrow.assert_awaited_once_with(INSERT_SQL, Decimal("100.50"))
+    assert result == {"id": 1, "total_cost_rub": Decimal("100.50"), "created_at": NOW}
+    assert type(result) is dict
+    connection.execute.assert_awaited_once_with(
+        ADD_TO_ROLLUPS_SQL,
+        ["day", "hour"],
+        [NOW, NOW],
+        [1, 1],
+        [1, 1],
+        [Decimal("100.50"), Decimal("100.50")],
+    )
+
+
+@pytest.mark.asyncio
+async def test_insert_with_idempotency_key_returns_existing_row():
+    existing = {"id": 7, "total_cost_rub": Decimal("5.00"), "created_at": NOW}
+    connection = AsyncMock()
+    connection.fetchval.return_value = None
+    connection.fetchrow.return_value = existing
+    repo = make_repo(connection)
+
+    result = await repo.insert(total_cost_rub=Decimal("5.00"), idempotency_key="k")
+
+    assert result == existing
+    connection.fetchval.assert_awaited_once_with(CLAIM_IDEMPOTENCY_KEY_SQL, "k")
+    connection.fetchrow.assert_awaited_once_with(SELECT_BY_IDEMPOTENCY_KEY_SQL, "k")
+    connection.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_insert_many_returns_rows_in_input_order():
+    connection = AsyncMock()
+    connection.fetch.return_value = [
+        {"id": 2, "total_cost_rub": Decimal(2), "created_at": NOW},
+        {"id": 1, "total_cost_rub": Decimal(1), "created_at": NOW},
+    ]
+    repo = make_repo(connection)
+
+    result = await repo.insert_many(total_costs_rub=[Decimal(1), Decimal(2)])
+
+    connection.fetch.assert_awaited_once_with(INSERT_MANY_SQL, [Decimal(1), Decimal(2)])
+    assert [r["id"] for r in result] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_insert_many_copies_items_in_result_order():
+    connection = AsyncMock()
+    connection.fetch.return_value = [
+        {"id": 2, "total_cost_rub": Decimal(6), "created_at": NOW},
+        {"id": 1, "total_cost_rub": Decimal(1), "created_at": NOW},
+    ]
+    copied = []
+
+    async def copy_records_to_table(table, *, columns, records):
+        copied.extend(records)
+
+    connection.copy_records_to_table.side_effect = copy_records_to_table
+    repo = make_repo(connection)
+
+    await repo.insert_many(
+        total_costs_rub=[Decimal(1), Decimal(6)],
+        items=[
+            [{"name": "Сталь", "qty": 1, "price_rub": 1}],
+            [{"id": 3, "qty": 2, "price_rub": 2}, {"id": 4, "qty": 1, "price_rub": 2}],
+        ],
+    )
+
+    assert connection.copy_records_to_table.await_args.args == (ITEM_TABLE,)
+    assert copied == [
+        (1, 1, NOW, None, "Сталь", 1, 1),
+        (2, 1, NOW, 3, None, 2, 2),
+        (2, 2, NOW, 4, None, 1, 2),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_insert_streamed_copies_bounded_batches_while_reading():
+    connection = AsyncMock()
+    connection.fetchrow.side_effect = [
+        {"id": 1, "total_cost_rub": Decimal(0), "created_at": NOW},
+        {"id": 1, "total_cost_rub": Decimal(7), "created_at": NOW},
+    ]
+    copied = []
+
+    async def copy_records_to_table(table, *, columns, records):
+        copied.append(list(records))
+
+    connection.copy_records_to_table.side_effect = copy_records_to_table
+    repo = make_repo(connection)
+
+    async def items():
+        for i in range(7):
+            assert i - sum(map(len, copied)) < 3
+            yield {"id": i, "qty": 1, "price_rub": 1}
+
+    result = await repo.insert_streamed(
+        items=items(), total_cost_rub=lambda: Decimal(7), batch_size=3
+    )
+
+    assert [len(records) for records in copied] == [3, 3, 1]
+    assert [record[:2] for records in copied for record in records] == [
+        (1, line_no) for line_no in range(1, 8)
+    ]
+    assert connection.fetchrow.await_args_list[0].args == (INSERT_SQL, Decimal(0))
+    connection.fetchrow.assert_awaited_with(UPDATE_TOTAL_SQL, 1, Decimal(7))
+    assert result == {"id": 1, "total_cost_rub": Decimal(7), "created_at": NOW}
+
+
+@pytest.mark.asyncio
+async def test_insert_many_empty_does_not_touch_connection():
+    connection = AsyncMock()
+    repo = make_repo(connection)
+
+    assert await repo.insert_many(total_costs_rub=[]) == []
+    connection.fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_list_page_builds_keyset_query():
+    connection = AsyncMock()
+    connection.fetch.return_value = [
+        {"id": 3, "total_cost_rub": Decimal(3), "created_at": NOW}
+    ]
+    repo = make_repo(connection)
+
+    result = await repo.list_page(limit=10, after=(NOW, 2), created_to=NOW)
+
+    sql, *args = connection.fetch.await_args.args
+    assert "(created_at, id) > ($1, $2) AND created_at < $3" in sql
+    assert "ORDER BY created_at, id" in sql and "LIMIT $4" in sql
+    assert args == [NOW, 2, NOW, 10]
+    assert result == [{"id": 3, "total_cost_rub": Decimal(3), "created_at": NOW}]
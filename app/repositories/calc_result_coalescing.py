@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from decimal import Decimal
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.repositories.calc_result import CalcResultRepository
+from app.session_manager.session_manager import SessionManager
+
+log = logging.getLogger(__name__)
+
+WRITE_ERRORS = (SQLAlchemyError, OSError)
+
+
+class CoalescingCalcResultRepository(CalcResultRepository):
+    def __init__(
+        self,
+        *,
+        session_manager: SessionManager,
+        max_delay_ms: int,
+        max_batch_size: int,
+        cache: LRUTTLCache | None = None,
+    ):
+        super().__init__(session_manager=session_manager, cache=cache)
+        self._max_delay = max_delay_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._pending: list[
+            tuple[Decimal, str | None, list[dict] | None, asyncio.Future]
+        ] = []
+        self._has_pending = asyncio.Event()
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._flusher: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._stopping = False
+        self._flusher = asyncio.create_task(self._run())
+        log.info(
+            "Групповая запись запущена: окно %s мс, до %s строк",
+            self._max_delay * 1000,
+            self._max_batch_size,
+        )
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        self._stopping = True
+        self._has_pending.set()
+        self._batch_ready.set()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        log.info("Групповая запись остановлена")
+
+    async def insert(
+        self,
+        *,
+        total_cost_rub: Decimal,
+        idempotency_key: str | None = None,
+        items: list[dict] | None = None,
+    ) -> dict:
+        if self._flusher is None or self._stopping or self._flusher.done():
+            return await super().insert(
+                total_cost_rub=total_cost_rub,
+                idempotency_key=idempotency_key,
+                items=items,
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((total_cost_rub, idempotency_key, items, future))
+        self._has_pending.set()
+        if len(self._pending) >= self._max_batch_size:
+            self._batch_ready.set()
+        result = await future
+        self.session_manager.pin_primary()
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            if self._stopping and not self._pending:
+                return
+            if not self._stopping:
+                waiter = asyncio.ensure_future(self._batch_ready.wait())
+                await asyncio.wait({waiter}, timeout=self._max_delay)
+                waiter.cancel()
+
+            batch = self._pending[: self._max_batch_size]
+            self._pending = self._pending[self._max_batch_size :]
+            if not self._stopping:
+                if not self._pending:
+                    self._has_pending.clear()
+                if len(self._pending) < self._max_batch_size:
+                    self._batch_ready.clear()
+
+            try:
+                await self._flush(batch)
+            except Exception as exc:
+                log.error("Групповая запись остановлена из-за ошибки: %s", exc)
+                for *_, future in (*batch, *self._pending):
+                    _set_exception(future, exc)
+                self._pending.clear()
+                raise
+
+    async def _flush(
+        self, batch: list[tuple[Decimal, str | None, list[dict] | None, asyncio.Future]]
+    ) -> None:
+        try:
+            rows = await self.session_manager.transaction(self._write_batch)(batch)
+        except WRITE_ERRORS as exc:
+            if len(batch) == 1:
+                _set_exception(batch[0][3], exc)
+                return
+            log.warning(
+                "Групповая вставка из %s строк не удалась, повтор по одной: %s",
+                len(batch),
+                exc,
+            )
+            for total, key, items, future in batch:
+                try:
+                    row = await super().insert(
+                        total_cost_rub=total, idempotency_key=key, items=items
+                    )
+                except WRITE_ERRORS as item_exc:
+                    _set_exception(future, item_exc)
+                else:
+                    _set_result(future, row)
+            return
+
+        for (*_, future), row in zip(batch, rows):
+            _set_result(future, row)
+
+    async def _write_batch(
+        self, batch: list[tuple[Decimal, str | None, list[dict] | None, asyncio.Future]]
+    ) -> list[dict]:
+        rows: list[dict | None] = [None] * len(batch)
+        keyless = [i for i, (_, key, _, _) in enumerate(batch) if key is None]
+        if keyless:
+            inserted = await super().insert_many(
+                total_costs_rub=[batch[i][0] for i in keyless],
+                items=[batch[i][2] or [] for i in keyless],
+            )
+            for i, row in zip(keyless, inserted):
+                rows[i] = row
+        for i, (total, key, items, _) in enumerate(batch):
+            if key is not None:
+                rows[i] = await super().insert(
+                    total_cost_rub=total, idempotency_key=key, items=items
+                )
+        return rows
+
+
+def _set_result(future: asyncio.Future, result: dict) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: Exception) -> None:
+    if not future.done():
+        future.set_exception(exc)
+
+
+def make_coalescing_calc_result_repository(
+    session_manager: SessionManager,
+    max_delay_ms: int,
+    max_batch_size: int,
+    cache: LRUTTLCache | None = None,
+) -> CoalescingCalcResultRepository:
+    return CoalescingCalcResultRepository(
+        session_manager=session_manager,
+        max_delay_ms=max_delay_ms,
+        max_batch_size=max_batch_size,
+        cache=cache,
+    )
@@ -0,0 +1,207 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.exc import DataError
+
+from app.repositories.calc_result_coalescing import CoalescingCalcResultRepository
+from app.repositories.models.calc_result import CalcResult
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+OVERFLOW = DataError("INSERT", {}, Exception("numeric field overflow"))
+
+
+def make_session(fail_on=None):
+    next_id = iter(range(1, 1000))
+
+    async def execute(stmt, params=None):
+        result = MagicMock()
+        if stmt.table.name != CalcResult.__tablename__:
+            return result
+        session.inserts.append(stmt)
+        if params is None:
+            total = stmt.compile().params["total_cost_rub"]
+            if total == fail_on:
+                raise OVERFLOW
+            row = {"id": next(next_id), "total_cost_rub": total, "created_at": NOW}
+            result.mappings.return_value.one.return_value = row
+            result.mappings.return_value.one_or_none.return_value = row
+            return result
+        if any(p["total_cost_rub"] == fail_on for p in params):
+            raise OVERFLOW
+        result.mappings.return_value = [
+            {
+                "id": next(next_id),
+                "total_cost_rub": p["total_cost_rub"],
+                "created_at": NOW,
+            }
+            for p in params
+        ]
+        return result
+
+    session = AsyncMock()
+    session.execute.side_effect = execute
+    session.inserts = []
+    return session
+
+
+def make_repo(session, *, max_delay_ms=20, max_batch_size=100):
+    class DummySessionManager:
+        @asynccontextmanager
+        async def get_session(self):
+            yield session
+
+        def transaction(self, func):
+            return func
+
+        def pin_primary(self):
+            pass
+
+    return CoalescingCalcResultRepository(
+        session_manager=DummySessionManager(),
+        max_delay_ms=max_delay_ms,
+        max_batch_size=max_batch_size,
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_are_flushed_as_one_batch():
+    session = make_session()
+    repo = make_repo(session)
+    repo.start()
+
+    results = await asyncio.gather(
+        *(repo.insert(total_cost_rub=Decimal(i)) for i in (10, 20, 30))
+    )
+    await repo.stop()
+
+    assert len(session.inserts) == 1
+    assert [r["total_cost_rub"] for r in results] == [10, 20, 30]
+    assert len({r["id"] for r in results}) == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_when_max_batch_size_reached():
+    session = make_session()
+    repo = make_repo(session, max_delay_ms=60_000, max_batch_size=2)
+    repo.start()
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            repo.insert(total_cost_rub=Decimal(1)),
+            repo.insert(total_cost_rub=Decimal(2)),
+        ),
+        timeout=1,
+    )
+    await repo.stop()
+
+    assert [r["id"] for r in results] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_reports_error_only_to_affected_caller():
+    session = make_session(fail_on=Decimal(2))
+    repo = make_repo(session)
+    repo.start()
+
+    results = await asyncio.gather(
+        *(repo.insert(total_cost_rub=Decimal(i)) for i in (1, 2, 3)),
+        return_exceptions=True,
+    )
+    await repo.stop()
+
+    assert results[0]["total_cost_rub"] == Decimal(1)
+    assert isinstance(results[1], DataError)
+    assert results[2]["total_cost_rub"] == Decimal(3)
+
+
+@pytest.mark.asyncio
+async def test_unexpected_error_fails_waiting_callers_and_disables_coalescing():
+    session = make_session()
+    repo = make_repo(session)
+    repo._write_batch = AsyncMock(side_effect=TypeError("bug"))
+    repo.start()
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(repo.insert(total_cost_rub=Decimal(i)) for i in (1, 2)),
+            return_exceptions=True,
+        ),
+        timeout=1,
+    )
+    after_failure = await repo.insert(total_cost_rub=Decimal(3))
+    await repo.stop()
+
+    assert [type(r) for r in results] == [TypeError, TypeError]
+    assert after_failure["total_cost_rub"] == Decimal(3)
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending_inserts():
+    session = make_session()
+    repo = make_repo(session, max_delay_ms=60_000)
+    repo.start()
+
+    pending = asyncio.ensure_future(repo.insert(total_cost_rub=Decimal(5)))
+    await asyncio.sleep(0)
+    await asyncio.wait_for(repo.stop(), timeout=1)
+
+    assert (await pending)["total_cost_rub"] == Decimal(5)
+
+
+@pytest.mark.asyncio
+async def test_insert_without_start_writes_directly():
+    session = make_session()
+    repo = make_repo(session)
+
+    result = await repo.insert(total_cost_rub=Decimal(7))
+
+    assert len(session.inserts) == 1
+    assert result["total_cost_rub"] == Decimal(7)
+
+
+@pytest.mark.asyncio
+async def test_keyed_and_keyless_inserts_share_one_flush():
+    session = make_session()
+    repo = make_repo(session)
+    repo.start()
+
+    keyless, keyed = await asyncio.gather(
+        repo.insert(total_cost_rub=Decimal(1)),
+        repo.insert(total_cost_rub=Decimal(2), idempotency_key="key:abc"),
+    )
+    await repo.stop()
+
+    assert keyless["total_cost_rub"] == Decimal(1)
+    assert keyed["total_cost_rub"] == Decimal(2)
+    assert len(session.inserts) == 2
+
+
+@pytest.mark.asyncio
+async def test_items_are_written_with_their_batch():
+    session = make_session()
+    repo = make_repo(session)
+    repo.start()
+
+    await asyncio.gather(
+        repo.insert(
+            total_cost_rub=Decimal(1), items=[{"name": "a", "qty": 1, "price_rub": 1}]
+        ),
+        repo.insert(
+            total_cost_rub=Decimal(2), items=[{"name": "b", "qty": 1, "price_rub": 2}]
+        ),
+    )
+    await repo.stop()
+
+    [(_, item_rows)] = [
+        call.args
+        for call in session.execute.await_args_list
+        if call.args[0].table.name == "calc_result_items"
+    ]
+    assert [(row["result_id"], row["name"]) for row in item_rows] == [
+        (1, "a"),
+        (2, "b"),
+    ]
@@ -0,0 +1,42 @@
+from typing import AsyncIterable, AsyncIterator, Iterator
+
+ITEM_COLUMNS = (
+    "result_id",
+    "line_no",
+    "result_created_at",
+    "material_id",
+    "name",
+    "qty",
+    "price_rub",
+)
+
+STREAM_ITEMS_BATCH_SIZE = 1000
+
+
+def item_records(
+    rows: list[dict], batch: list[list[dict]], first_line_no: int = 1
+) -> Iterator[tuple]:
+    for row, materials in zip(rows, batch):
+        for line_no, m in enumerate(materials, first_line_no):
+            yield (
+                row["id"],
+                line_no,
+                row["created_at"],
+                m.get("id"),
+                m.get("name"),
+                m["qty"],
+                m["price_rub"],
+            )
+
+
+async def item_batches(
+    items: AsyncIterable[dict], batch_size: int
+) -> AsyncIterator[list[dict]]:
+    batch = []
+    async for m in items:
+        batch.append(m)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
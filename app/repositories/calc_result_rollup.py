@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Iterable
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+ROLLUP_SHARDS = 8
+
+
+def bucket_start(created_at: datetime, granularity: str) -> datetime:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    created_at = created_at.astimezone(timezone.utc)
+    if granularity == "hour":
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Неизвестный размер интервала: {granularity}")
+
+
+def rollup_deltas(rows: Iterable[dict]) -> list[dict]:
+    deltas: dict[tuple[str, datetime, int], list] = {}
+    for row in rows:
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(row["created_at"], granularity),
+                row["id"] % ROLLUP_SHARDS,
+            )
+            delta = deltas.setdefault(key, [0, Decimal(0)])
+            delta[0] += 1
+            delta[1] += row["total_cost_rub"]
+    return [
+        {
+            "granularity": granularity,
+            "bucket": bucket,
+            "shard": shard,
+            "count": count,
+            "total_cost_rub": total,
+        }
+        for (granularity, bucket, shard), (count, total) in sorted(deltas.items())
+    ]
+
+
+def iter_day_windows(
+    start: datetime, end: datetime, chunk_days: int
+) -> Iterable[tuple[datetime, datetime]]:
+    window_start = bucket_start(start, "day")
+    step = timedelta(days=chunk_days)
+    while window_start < end:
+        yield window_start, window_start + step
+        window_start += step
@@ -1,18 +1,28 @@
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from app.cache.lru_ttl_cache import LRUTTLCache
 from app.repositories.calc_result import CalcResultRepository
+from app.repositories.models.base import Base
+from app.repositories.models.calc_result import CalcResult
+from app.repositories.models.calc_result_item import CalcResultItem
+from app.session_manager.session_manager import SessionManager
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
 
 
 @pytest.mark.asyncio
 async def test_insert_returns_dict():
-    mock_row = SimpleNamespace(id=1, total_cost_rub=Decimal("123.45"))
+    mock_row = {"id": 1, "total_cost_rub": Decimal("123.45"), "created_at": NOW}
     mock_execute_result = MagicMock()
-    mock_execute_result.scalar_one.return_value = mock_row
+    mock_execute_result.mappings.return_value.one.return_value = mock_row
     mock_session = AsyncMock()
     mock_session.execute.return_value = mock_execute_result
 
@@ -24,7 +34,300 @@ async def test_insert_returns_dict():
     repo = CalcResultRepository(session_manager=DummySessionManager())
     result = await repo.insert(total_cost_rub=Decimal("123.45"))
 
-    mock_session.execute.assert_awaited_once()
-    mock_execute_result.scalar_one.assert_called_once()
-    assert result["id"] == 1
-    assert result["total_cost_rub"] == Decimal("123.45")
+    assert mock_session.execute.await_count == 2
+    mock_execute_result.mappings.return_value.one.assert_called_once()
+    assert result == mock_row
+    assert "_sa_instance_state" not in result
+
+
+@pytest.mark.asyncio
+async def test_insert_many_returns_rows_in_input_order():
+    rows = [
+        {"id": 1, "total_cost_rub": Decimal("10.00"), "created_at": NOW},
+        {"id": 2, "total_cost_rub": Decimal("20.00"), "created_at": NOW},
+    ]
+    mock_execute_result = MagicMock()
+    mock_execute_result.mappings.return_value = rows
+    mock_session = AsyncMock()
+    mock_session.execute.return_value = mock_execute_result
+
+    class DummySessionManager:
+        @asynccontextmanager
+        async def get_session(self):
+            yield mock_session
+
+    repo = CalcResultRepository(session_manager=DummySessionManager())
+    result = await repo.insert_many(
+        total_costs_rub=[Decimal("10.00"), Decimal("20.00")]
+    )
+
+    assert mock_session.execute.await_count == 2
+    _, params = mock_session.execute.await_args_list[0].args
+    assert params == [
+        {"total_cost_rub": Decimal("10.00")},
+        {"total_cost_rub": Decimal("20.00")},
+    ]
+    assert result == rows
+
+
+@pytest.mark.asyncio
+async def test_insert_many_empty_skips_database():
+    class DummySessionManager:
+        def get_session(self):
+            raise AssertionError("session must not be opened")
+
+    repo = CalcResultRepository(session_manager=DummySessionManager())
+
+    assert await repo.insert_many(total_costs_rub=[]) == []
+
+
+@pytest.mark.asyncio
+async def test_insert_with_idempotency_key_returns_existing_row_on_conflict():
+    existing_row = {"id": 5, "total_cost_rub": Decimal("10.00")}
+    conflict_result = MagicMock()
+    conflict_result.scalar_one_or_none.return_value = None
+    select_result = MagicMock()
+    select_result.mappings.return_value.one.return_value = existing_row
+    mock_session = AsyncMock()
+    mock_session.execute.side_effect = [conflict_result, select_result]
+
+    class DummySessionManager:
+        @asynccontextmanager
+        async def get_session(self):
+            yield mock_session
+
+    repo = CalcResultRepository(session_manager=DummySessionManager())
+    result = await repo.insert(
+        total_cost_rub=Decimal("10.00"), idempotency_key="key:abc"
+    )
+
+    assert mock_session.execute.await_count == 2
+    assert result["id"] == 5
+
+
+async def make_sqlite_session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://").execution_options(
+        schema_translate_map={"calc_schema": None}
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+class SqliteSessionManager:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    @asynccontextmanager
+    async def get_session(self, read_only=False):
+        async with self.session_factory() as session:
+            yield session
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_list_page_walks_keyset_without_gaps_or_duplicates():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcResultRepository(session_manager=SqliteSessionManager(session_factory))
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    async with session_factory() as session:
+        await session.execute(
+            insert(CalcResult),
+            [
+                {
+                    "total_cost_rub": Decimal(i),
+                    "created_at": base + timedelta(hours=i // 3),
+                }
+                for i in range(10)
+            ],
+        )
+        await session.commit()
+
+    seen, after = [], None
+    while True:
+        page = await repo.list_page(limit=4, after=after)
+        if not page:
+            break
+        seen.extend(row["id"] for row in page)
+        after = (page[-1]["created_at"], page[-1]["id"])
+
+    in_range = await repo.list_page(
+        limit=100,
+        created_from=base + timedelta(hours=1),
+        created_to=base + timedelta(hours=2),
+    )
+    await engine.dispose()
+
+    assert seen == list(range(1, 11))
+    assert [row["total_cost_rub"] for row in in_range] == [3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_stream_rows_yields_fixed_size_chunks_after_cursor():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcResultRepository(session_manager=SqliteSessionManager(session_factory))
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    async with session_factory() as session:
+        await session.execute(
+            insert(CalcResult),
+            [
+                {
+                    "total_cost_rub": Decimal(i),
+                    "created_at": base + timedelta(hours=i // 3),
+                }
+                for i in range(10)
+            ],
+        )
+        await session.commit()
+
+    chunks = [
+        [row["id"] for row in rows]
+        async for rows in repo.stream_rows(
+            chunk_size=3,
+            after=(base + timedelta(hours=1), 4),
+            created_to=base + timedelta(hours=3),
+        )
+    ]
+    await engine.dispose()
+
+    assert chunks == [[5, 6, 7], [8, 9]]
+
+
+@pytest.mark.asyncio
+async def test_every_insert_path_updates_rollups():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcResultRepository(session_manager=SqliteSessionManager(session_factory))
+
+    await repo.insert(total_cost_rub=Decimal("10.00"))
+    first = await repo.insert(total_cost_rub=Decimal("20.00"), idempotency_key="key:a")
+    repeated = await repo.insert(
+        total_cost_rub=Decimal("20.00"), idempotency_key="key:a"
+    )
+    await repo.insert_many(total_costs_rub=[Decimal("30.00"), Decimal("40.50")])
+
+    hourly = await repo.list_rollups(granularity="hour")
+    daily = await repo.list_rollups(granularity="day")
+    await engine.dispose()
+
+    assert repeated == first
+    assert [(row["count"], row["total_cost_rub"]) for row in hourly] == [
+        (4, Decimal("100.50"))
+    ]
+    assert [(row["count"], row["total_cost_rub"]) for row in daily] == [
+        (4, Decimal("100.50"))
+    ]
+
+
+@pytest.mark.asyncio
+async def test_insert_paths_store_items_once():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcResultRepository(session_manager=SqliteSessionManager(session_factory))
+    steel = {"id": 3, "qty": Decimal("2"), "price_rub": Decimal("5")}
+    copper = {"name": "Медь", "qty": Decimal("1.5"), "price_rub": Decimal("10")}
+
+    first = await repo.insert(
+        total_cost_rub=Decimal("25.00"), idempotency_key="key:a", items=[steel, copper]
+    )
+    await repo.insert(
+        total_cost_rub=Decimal("25.00"), idempotency_key="key:a", items=[steel, copper]
+    )
+    second, third = await repo.insert_many(
+        total_costs_rub=[Decimal("10.00"), Decimal("15.00")],
+        items=[[steel], [copper]],
+    )
+    async with session_factory() as session:
+        result = await session.execute(
+            select(
+                CalcResultItem.result_id,
+                CalcResultItem.line_no,
+                CalcResultItem.material_id,
+                CalcResultItem.name,
+                CalcResultItem.qty,
+                CalcResultItem.price_rub,
+            ).order_by(CalcResultItem.result_id, CalcResultItem.line_no)
+        )
+        items = [tuple(row) for row in result]
+    await engine.dispose()
+
+    assert items == [
+        (first["id"], 1, 3, None, Decimal("2"), Decimal("5")),
+        (first["id"], 2, None, "Медь", Decimal("1.5"), Decimal("10")),
+        (second["id"], 1, 3, None, Decimal("2"), Decimal("5")),
+        (third["id"], 1, None, "Медь", Decimal("1.5"), Decimal("10")),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_insert_streamed_copies_items_in_batches_and_sets_total():
+    engine, session_factory = await make_sqlite_session_factory()
+    repo = CalcResultRepository(session_manager=SqliteSessionManager(session_factory))
+    batches = []
+    copy_items = repo._copy_items
+
+    async def spy(session, rows, batch, first_line_no=1):
+        batches.append([len(materials) for materials in batch])
+        await copy_items(session, rows, batch, first_line_no)
+
+    repo._copy_items = spy
+
+    async def items():
+        for i in range(5):
+            yield {"id": i, "qty": Decimal("1"), "price_rub": Decimal("2")}
+
+    row = await repo.insert_streamed(
+        items=items(), total_cost_rub=lambda: Decimal("10.00"), batch_size=2
+    )
+    async with session_factory() as session:
+        result = await session.execute(
+            select(CalcResultItem.line_no, CalcResultItem.material_id)
+            .where(CalcResultItem.result_id == row["id"])
+            .order_by(CalcResultItem.line_no)
+        )
+        items_rows = [tuple(r) for r in result]
+    hourly = await repo.list_rollups(granularity="hour")
+    stored = await repo.get_by_id(row["id"])
+    await engine.dispose()
+
+    assert batches == [[2], [2], [1]]
+    assert items_rows == [(1, 0), (2, 1), (3, 2), (4, 3), (5, 4)]
+    assert row["total_cost_rub"] == Decimal("10.00")
+    assert stored == row
+    assert [(r["count"], r["total_cost_rub"]) for r in hourly] == [
+        (1, Decimal("10.00"))
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_is_served_from_cache_filled_after_commit():
+    engine, session_factory = await make_sqlite_session_factory()
+    manager = SessionManager(
+        session_factory=session_factory, session_ctx=ContextVar("ctx", default=None)
+    )
+    cache = LRUTTLCache(max_size=10)
+    repo = CalcResultRepository(session_manager=manager, cache=cache)
+
+    @manager.transaction
+    async def insert_and_fail():
+        await repo.insert(total_cost_rub=Decimal("1.00"))
+        assert len(cache) == 0
+        raise ValueError("rollback")
+
+    with pytest.raises(ValueError):
+        await insert_and_fail()
+    assert len(cache) == 0
+
+    saved = await manager.transaction(repo.insert)(total_cost_rub=Decimal("10.00"))
+    [batch_row] = await repo.insert_many(total_costs_rub=[Decimal("20.00")])
+    assert len(cache) == 2
+
+    assert await repo.get_by_id(saved["id"]) == saved
+    assert await repo.get_by_id(batch_row["id"]) == batch_row
+    assert await repo.get_by_id(999) is None
+
+    cache.clear()
+    assert await repo.get_by_id(saved["id"]) == saved
+    await engine.dispose()
+
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+    assert await repo.get_by_id(saved["id"]) == saved
@@ -0,0 +1,30 @@
+from sqlalchemy import Integer, String, any_, bindparam, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.repositories.models.catalog_material import CatalogMaterial
+from app.session_manager.session_manager import SessionManager
+
+SELECT_MATERIALS = select(
+    CatalogMaterial.id, CatalogMaterial.name, CatalogMaterial.price_rub
+).where(
+    or_(
+        CatalogMaterial.id == any_(bindparam("ids", type_=ARRAY(Integer))),
+        CatalogMaterial.name == any_(bindparam("names", type_=ARRAY(String))),
+    )
+)
+
+
+class MaterialRepository:
+    def __init__(self, *, session_manager: SessionManager):
+        self.session_manager = session_manager
+
+    async def get_many(self, *, ids: list[int], names: list[str]) -> list[dict]:
+        async with self.session_manager.get_session() as session:
+            result = await session.execute(
+                SELECT_MATERIALS, {"ids": ids, "names": names}
+            )
+            return [dict(row) for row in result.mappings()]
+
+
+def make_material_repository(session_manager: SessionManager) -> MaterialRepository:
+    return MaterialRepository(session_manager=session_manager)
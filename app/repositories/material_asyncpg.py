@@ -0,0 +1,23 @@
+from app.session_manager.asyncpg_connection_manager import AsyncpgConnectionManager
+
+SELECT_MATERIALS_SQL = """
+SELECT id, name, price_rub
+FROM materials
+WHERE id = ANY($1::integer[]) OR name = ANY($2::varchar[])
+"""
+
+
+class AsyncpgMaterialRepository:
+    def __init__(self, *, connection_manager: AsyncpgConnectionManager):
+        self.connection_manager = connection_manager
+
+    async def get_many(self, *, ids: list[int], names: list[str]) -> list[dict]:
+        async with self.connection_manager.get_connection() as connection:
+            records = await connection.fetch(SELECT_MATERIALS_SQL, ids, names)
+            return [dict(record) for record in records]
+
+
+def make_asyncpg_material_repository(
+    connection_manager: AsyncpgConnectionManager,
+) -> AsyncpgMaterialRepository:
+    return AsyncpgMaterialRepository(connection_manager=connection_manager)
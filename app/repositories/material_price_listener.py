@@ -0,0 +1,78 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable
+
+import asyncpg
+
+from app.services.material_catalog import MaterialCatalogService
+
+log = logging.getLogger(__name__)
+
+MATERIAL_PRICES_CHANNEL = "calc_material_prices"
+
+
+class MaterialPriceListener:
+    def __init__(
+        self,
+        *,
+        connect: Callable[[], Awaitable[asyncpg.Connection]],
+        catalog: MaterialCatalogService,
+        channel: str = MATERIAL_PRICES_CHANNEL,
+        reconnect_delay: float = 1.0,
+    ):
+        self._connect = connect
+        self._catalog = catalog
+        self._channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        log.info("Подписка на изменения цен в канале %s запущена", self._channel)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        log.info("Подписка на изменения цен остановлена")
+
+    async def _run(self) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await self._connect()
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _, lost=lost: lost.set())
+                await connection.add_listener(self._channel, self._on_notify)
+                self._catalog.invalidate_all()
+                await lost.wait()
+                log.warning("Соединение подписки на изменения цен потеряно")
+            except (OSError, asyncpg.PostgresError) as exc:
+                log.warning("Не удалось подписаться на изменения цен: %s", exc)
+            except Exception:
+                log.exception("Непредвиденная ошибка подписки на изменения цен")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self._reconnect_delay)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            material = json.loads(payload)
+            self._catalog.invalidate(material["id"], material.get("name"))
+        except (ValueError, KeyError, TypeError):
+            log.warning("Некорректное уведомление об изменении цены: %s", payload)
+            self._catalog.invalidate_all()
+
+
+def make_material_price_listener(
+    connect: Callable[[], Awaitable[asyncpg.Connection]],
+    catalog: MaterialCatalogService,
+) -> MaterialPriceListener:
+    return MaterialPriceListener(connect=connect, catalog=catalog)
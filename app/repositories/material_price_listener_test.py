@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.repositories.material_price_listener import MaterialPriceListener
+from app.services.material_catalog import MaterialCatalogService
+
+
+class DummyConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.termination_listeners = []
+        self.closed = False
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+    def notify(self, payload):
+        for channel, callback in self.listeners.items():
+            callback(self, 1, channel, payload)
+
+    def terminate(self):
+        self.closed = True
+        for callback in self.termination_listeners:
+            callback(self)
+
+
+@pytest.mark.asyncio
+async def test_listener_invalidates_catalog_and_reconnects():
+    catalog = MagicMock(spec=MaterialCatalogService)
+    connections = []
+    connected = asyncio.Event()
+
+    async def connect():
+        connection = DummyConnection()
+        connections.append(connection)
+        connected.set()
+        return connection
+
+    listener = MaterialPriceListener(
+        connect=connect, catalog=catalog, reconnect_delay=0
+    )
+    listener.start()
+    await connected.wait()
+    await asyncio.sleep(0)
+
+    connections[0].notify('{"id": 1, "name": "Сталь"}')
+    connections[0].notify("not json")
+    connected.clear()
+    connections[0].terminate()
+    await connected.wait()
+    await asyncio.sleep(0)
+    await listener.stop()
+
+    catalog.invalidate.assert_called_once_with(1, "Сталь")
+    assert catalog.invalidate_all.call_count == 3
+    assert len(connections) == 2
+    assert connections[1].closed
+
+
+@pytest.mark.asyncio
+async def test_listener_reconnects_after_unexpected_error():
+    catalog = MagicMock(spec=MaterialCatalogService)
+    attempts = []
+    connected = asyncio.Event()
+
+    async def connect():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise RuntimeError("unexpected")
+        connected.set()
+        return DummyConnection()
+
+    listener = MaterialPriceListener(
+        connect=connect, catalog=catalog, reconnect_delay=0
+    )
+    listener.start()
+    await asyncio.wait_for(connected.wait(), timeout=1)
+    await listener.stop()
+
+    assert len(attempts) == 2
+    catalog.invalidate_all.assert_called_once()
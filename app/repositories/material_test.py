@@ -0,0 +1,34 @@
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.repositories.material import SELECT_MATERIALS, MaterialRepository
+
+
+def test_select_materials_uses_array_parameters():
+    sql = str(SELECT_MATERIALS.compile(dialect=postgresql.asyncpg.dialect()))
+
+    assert "ANY ($1::INTEGER[])" in sql
+    assert "ANY ($2::VARCHAR[])" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_many_returns_plain_dicts():
+    row = {"id": 1, "name": "Сталь", "price_rub": Decimal("100")}
+    session = AsyncMock()
+    session.execute.return_value = MagicMock(mappings=lambda: [row])
+
+    class DummySessionManager:
+        @asynccontextmanager
+        async def get_session(self):
+            yield session
+
+    repo = MaterialRepository(session_manager=DummySessionManager())
+
+    assert await repo.get_many(ids=[1], names=["Сталь"]) == [row]
+    session.execute.assert_awaited_once_with(
+        SELECT_MATERIALS, {"ids": [1], "names": ["Сталь"]}
+    )
@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.repositories.models.base import Base
+
+
+class CalcResultIdempotencyKey(Base):
+    __tablename__ = "calc_result_idempotency_keys"
+    __table_args__ = ({"schema": "calc_schema"},)
+
+    idempotency_key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    result_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    result_created_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
@@ -0,0 +1,29 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import DateTime, Index, Integer, Numeric, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.repositories.models.base import Base
+
+
+class CalcResultItem(Base):
+    __tablename__ = "calc_result_items"
+    __table_args__ = (
+        Index(
+            "calc_result_items_result_created_at_idx",
+            "result_created_at",
+            postgresql_using="brin",
+        ),
+        {"schema": "calc_schema"},
+    )
+
+    result_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    line_no: Mapped[int] = mapped_column(Integer, primary_key=True)
+    result_created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    material_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    name: Mapped[str | None] = mapped_column(Text, nullable=True)
+    qty: Mapped[Decimal] = mapped_column(Numeric, nullable=False)
+    price_rub: Mapped[Decimal] = mapped_column(Numeric, nullable=False)
@@ -0,0 +1,18 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, DateTime, Numeric, SmallInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.repositories.models.base import Base
+
+
+class CalcResultRollup(Base):
+    __tablename__ = "calc_result_rollups"
+    __table_args__ = ({"schema": "calc_schema"},)
+
+    granularity: Mapped[str] = mapped_column(String(8), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    total_cost_rub: Mapped[Decimal] = mapped_column(Numeric(20, 2), nullable=False)
@@ -1,19 +1,42 @@
+import hashlib
 from datetime import datetime
 from decimal import Decimal
-from typing import Awaitable, Callable
+from typing import Annotated, AsyncIterator, Awaitable, Callable, Literal
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field, field_validator
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import (
+    BaseModel,
+    Field,
+    ValidationError,
+    field_validator,
+    model_validator,
+)
 from starlette import status
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from app.services.calc import CalcService
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.metrics.metrics import Metrics, make_timed_route_class
+from app.routers.calc_codec import make_fast_calc_route_class
+from app.services.calc import CalcService, InvalidCursorError
+from app.services.calc_engine import TotalCostOverflowError
+from app.services.idempotency import IdempotencyService
+from app.services.material_catalog import MaterialCatalogService, UnknownMaterialError
 
 
 class Material(BaseModel):
-    name: str = Field(
-        ...,
+    id: int | None = Field(
+        None,
+        title="ID материала в каталоге",
+        description="Цена берется из каталога, если price_rub не указан",
+        gt=0,
+        json_schema_extra={"example": 1},
+    )
+    name: str | None = Field(
+        None,
         title="Название материала",
-        description="Наименование материала",
+        description="Наименование материала; без id и price_rub ищется в каталоге",
         json_schema_extra={"example": "Сталь"},
     )
     qty: Decimal = Field(
@@ -23,14 +46,21 @@ class Material(BaseModel):
         gt=0,
         json_schema_extra={"example": 12.3},
     )
-    price_rub: Decimal = Field(
-        ...,
+    price_rub: Decimal | None = Field(
+        None,
         title="Цена в рублях",
-        description="Цена за единицу материала в рублях (больше 0)",
+        description="Цена за единицу материала в рублях (больше 0); "
+        "если не указана, берется из каталога",
         gt=0,
         json_schema_extra={"example": 54.5},
     )
 
+    @model_validator(mode="after")
+    def validate_reference(self):
+        if self.id is None and self.name is None:
+            raise ValueError("Нужно указать id или name материала")
+        return self
+
 
 class CalcRequest(BaseModel):
     materials: list[Material] = Field(
@@ -71,24 +101,445 @@ class CalcResponse(BaseModel):
     )
 
 
+class CalcPage(BaseModel):
+    items: list[CalcResponse] = Field(
+        ...,
+        title="Результаты расчетов",
+        description="Страница результатов, упорядоченных по (created_at, id)",
+    )
+    next_cursor: str | None = Field(
+        ...,
+        title="Курсор следующей страницы",
+        description="Передается в параметре cursor; null на последней странице",
+        json_schema_extra={"example": "MjAyNS0xMS0xNFQxMjowMDowMCswMDowMHwx"},
+    )
+
+
+class CalcStatsBucket(BaseModel):
+    bucket: datetime = Field(
+        ...,
+        title="Начало интервала",
+        description="Начало часа или суток (UTC)",
+        json_schema_extra={"example": "2025-11-14T12:00:00Z"},
+    )
+    count: int = Field(
+        ...,
+        title="Количество расчетов",
+        json_schema_extra={"example": 42},
+    )
+    total_cost_rub: Decimal = Field(
+        ...,
+        title="Суммарная стоимость",
+        json_schema_extra={"example": 105210.0},
+    )
+    avg_cost_rub: Decimal = Field(
+        ...,
+        title="Средняя стоимость",
+        json_schema_extra={"example": 2505.0},
+    )
+
+
+DEFAULT_MAX_BATCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGE_SIZE = 500
+IDEMPOTENCY_KEY_MAX_LENGTH = 200
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_MAX_LINE_BYTES = 64 * 1024
+
+
+def result_etag(result: dict) -> str:
+    payload = (
+        f"{result['id']}|{result['total_cost_rub']}|{result['created_at'].isoformat()}"
+    )
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def iter_ndjson_materials(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int = NDJSON_MAX_LINE_BYTES,
+) -> AsyncIterator[dict]:
+    line_no = 0
+    count = 0
+    buffer = b""
+
+    def parse(line: bytes) -> dict | None:
+        if not line.strip():
+            return None
+        try:
+            material = Material.model_validate_json(line)
+        except ValidationError as exc:
+            raise RequestValidationError(
+                [
+                    {**error, "loc": ("body", line_no, *error["loc"])}
+                    for error in exc.errors(include_url=False, include_context=False)
+                ]
+            )
+        if material.price_rub is None:
+            raise RequestValidationError(
+                [
+                    {
+                        "type": "missing",
+                        "loc": ("body", line_no, "price_rub"),
+                        "msg": "Field required",
+                    }
+                ]
+            )
+        return material.model_dump(exclude_none=True)
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > max_line_bytes:
+            raise RequestValidationError(
+                [
+                    {
+                        "type": "value_error",
+                        "loc": ("body", line_no + len(lines) + 1),
+                        "msg": f"Строка длиннее {max_line_bytes} байт",
+                    }
+                ]
+            )
+        for line in lines:
+            line_no += 1
+            material = parse(line)
+            if material is not None:
+                count += 1
+                yield material
+
+    line_no += 1
+    material = parse(buffer)
+    if material is not None:
+        count += 1
+        yield material
+
+    if not count:
+        raise RequestValidationError(
+            [
+                {
+                    "type": "value_error",
+                    "loc": ("body",),
+                    "msg": "Должен быть хотя бы один материал",
+                }
+            ]
+        )
+
+
 def make_calc_router(
     *,
     calc_service: CalcService,
     transaction: Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]],
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    idempotency: IdempotencyService | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_page_size: int = DEFAULT_MAX_PAGE_SIZE,
+    metrics: Metrics | None = None,
+    fast_codec: bool = False,
+    material_catalog: MaterialCatalogService | None = None,
+    result_cache: LRUTTLCache | None = None,
 ) -> APIRouter:
-    router = APIRouter()
+    router = APIRouter(
+        route_class=make_timed_route_class(metrics) if metrics is not None else APIRoute
+    )
+
+    @transaction
+    async def save_calc(
+        materials_data: list[dict], idempotency_key: str | None
+    ) -> dict:
+        try:
+            return await calc_service.calculate_and_save(
+                materials_data, idempotency_key=idempotency_key
+            )
+        except (TotalCostOverflowError, UnknownMaterialError) as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=str(exc),
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+
+    async def calculate(
+        materials_data: list[dict], idempotency_key: str | None
+    ) -> dict:
+        if idempotency is None:
+            return await save_calc(materials_data, None)
 
-    @router.post("/calc")
+        if not idempotency_key and any(
+            m.get("price_rub") is None for m in materials_data
+        ):
+            try:
+                [materials_data] = await calc_service.resolve_prices([materials_data])
+            except UnknownMaterialError as exc:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    detail=str(exc),
+                )
+
+        key = idempotency.make_key(idempotency_key, materials_data)
+        cached = idempotency.get(key)
+        if cached is not None:
+            return cached
+
+        result = await save_calc(materials_data, key)
+        idempotency.remember(key, result)
+        return result
+
+    async def calc(
+        req: CalcRequest,
+        idempotency_key: Annotated[
+            str | None,
+            Header(
+                alias="Idempotency-Key",
+                title="Ключ идемпотентности",
+                description="Повторный запрос с тем же ключом вернет исходный результат",
+                max_length=IDEMPOTENCY_KEY_MAX_LENGTH,
+            ),
+        ] = None,
+    ) -> CalcResponse:
+        if metrics is not None:
+            metrics.observe_since_handler_start("validation")
+        materials_data = [m.model_dump(exclude_none=True) for m in req.materials]
+        return CalcResponse(**await calculate(materials_data, idempotency_key))
+
+    router.add_api_route(
+        "/calc",
+        calc,
+        methods=["POST"],
+        route_class_override=make_fast_calc_route_class(
+            calculate=calculate,
+            idempotency_key_max_length=IDEMPOTENCY_KEY_MAX_LENGTH,
+            metrics=metrics,
+        )
+        if fast_codec
+        else None,
+    )
+
+    @router.post("/calc/batch")
+    @transaction
+    async def calc_batch(
+        reqs: Annotated[
+            list[CalcRequest],
+            Body(
+                title="Пакет запросов",
+                description="Список запросов на расчет стоимости",
+                min_length=1,
+                max_length=max_batch_size,
+            ),
+        ],
+    ) -> list[CalcResponse]:
+        if metrics is not None:
+            metrics.observe_since_handler_start("validation")
+        try:
+            batch = [
+                [m.model_dump(exclude_none=True) for m in req.materials] for req in reqs
+            ]
+            results = await calc_service.calculate_many_and_save(batch)
+            return [CalcResponse(**result) for result in results]
+        except (TotalCostOverflowError, UnknownMaterialError) as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=str(exc),
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+
+    @router.post(
+        "/calc/stream",
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "description": "Материалы в формате NDJSON: один Material на строку",
+                "content": {
+                    NDJSON_MEDIA_TYPE: {
+                        "schema": {"$ref": "#/components/schemas/Material"}
+                    }
+                },
+            }
+        },
+    )
     @transaction
-    async def calc(req: CalcRequest) -> CalcResponse:
+    async def calc_stream(request: Request) -> CalcResponse:
+        content_type = request.headers.get("content-type", "")
+        if content_type.split(";")[0].strip() != NDJSON_MEDIA_TYPE:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Ожидается {NDJSON_MEDIA_TYPE}",
+            )
         try:
-            materials_data = [m.model_dump() for m in req.materials]
-            result = await calc_service.calculate_and_save(materials_data)
+            result = await calc_service.calculate_stream_and_save(
+                iter_ndjson_materials(request.stream())
+            )
             return CalcResponse(**result)
+        except (RequestValidationError, StarletteHTTPException):
+            raise
+        except TotalCostOverflowError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=str(exc),
+            )
         except Exception:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Внутренняя ошибка сервиса",
             )
 
+    @router.get("/calc")
+    async def calc_list(
+        limit: Annotated[
+            int,
+            Query(
+                title="Размер страницы",
+                ge=1,
+                le=max_page_size,
+            ),
+        ] = page_size,
+        cursor: Annotated[
+            str | None,
+            Query(
+                title="Курсор",
+                description="next_cursor из предыдущей страницы",
+                max_length=200,
+            ),
+        ] = None,
+        created_from: Annotated[
+            datetime | None,
+            Query(
+                alias="from",
+                title="Начало периода",
+                description="created_at >= from",
+            ),
+        ] = None,
+        created_to: Annotated[
+            datetime | None,
+            Query(
+                alias="to",
+                title="Конец периода",
+                description="created_at < to",
+            ),
+        ] = None,
+    ) -> CalcPage:
+        try:
+            page = await calc_service.list_results(
+                limit=limit,
+                cursor=cursor,
+                created_from=created_from,
+                created_to=created_to,
+            )
+            return CalcPage(**page)
+        except InvalidCursorError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=str(exc),
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+
+    @router.get(
+        "/calc/{result_id:int}",
+        responses={
+            status.HTTP_304_NOT_MODIFIED: {
+                "description": "ETag совпал с If-None-Match"
+            },
+            status.HTTP_404_NOT_FOUND: {"description": "Результат не найден"},
+        },
+    )
+    async def calc_get(
+        result_id: int,
+        response: Response,
+        if_none_match: Annotated[
+            str | None,
+            Header(
+                alias="If-None-Match",
+                title="ETag сохраненного ответа",
+                description="Если результат не изменился, вернется 304 без тела",
+            ),
+        ] = None,
+    ) -> CalcResponse:
+        try:
+            result = await calc_service.get_result(result_id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Результат {result_id} не найден",
+            )
+        etag = result_etag(result)
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        response.headers["ETag"] = etag
+        return CalcResponse(**result)
+
+    @router.get("/calc/stats")
+    async def calc_stats(
+        bucket: Annotated[
+            Literal["hour", "day"],
+            Query(title="Размер интервала"),
+        ],
+        created_from: Annotated[
+            datetime | None,
+            Query(
+                alias="from",
+                title="Начало периода",
+                description="Интервалы, начинающиеся не раньше from",
+            ),
+        ] = None,
+        created_to: Annotated[
+            datetime | None,
+            Query(
+                alias="to",
+                title="Конец периода",
+                description="Интервалы, начинающиеся раньше to",
+            ),
+        ] = None,
+    ) -> list[CalcStatsBucket]:
+        try:
+            rows = await calc_service.stats(
+                bucket=bucket, created_from=created_from, created_to=created_to
+            )
+            return [CalcStatsBucket(**row) for row in rows]
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+
+    if (
+        idempotency is not None
+        or material_catalog is not None
+        or result_cache is not None
+    ):
+
+        @router.get("/calc/cache/stats")
+        async def calc_cache_stats() -> dict:
+            stats = {}
+            if idempotency is not None:
+                stats["idempotency"] = idempotency.stats()
+            if material_catalog is not None:
+                stats["catalog"] = material_catalog.stats()
+            if result_cache is not None:
+                stats["results"] = result_cache.stats()
+            return stats
+
     return router
@@ -0,0 +1,176 @@
+import re
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Awaitable, Callable
+
+import msgspec
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+from app.metrics.metrics import Metrics
+
+_PATH_RE = re.compile(r"\.([^.\[]+)|\[(\d+)\]")
+_AT_RE = re.compile(r"^(.*) - at `\$(.*)`$")
+
+
+class MaterialStruct(msgspec.Struct):
+    qty: Decimal
+    id: int | None = None
+    name: str | None = None
+    price_rub: Decimal | None = None
+
+
+class CalcRequestStruct(msgspec.Struct):
+    materials: list[MaterialStruct]
+
+
+class CalcResponseStruct(msgspec.Struct):
+    id: int
+    total_cost_rub: Decimal
+    created_at: datetime
+
+
+_request_decoder = msgspec.json.Decoder(CalcRequestStruct)
+_response_encoder = msgspec.json.Encoder()
+
+
+def _validation_error(exc: msgspec.ValidationError) -> dict:
+    message, path = str(exc), ""
+    match = _AT_RE.match(message)
+    if match is not None:
+        message, path = match.groups()
+    loc = ["body"]
+    for name, index in _PATH_RE.findall(path):
+        loc.append(int(index) if index else name)
+    return {"type": "value_error", "loc": tuple(loc), "msg": message}
+
+
+def _check_positive(value: Decimal, loc: tuple) -> dict | None:
+    if not value.is_finite():
+        return {
+            "type": "finite_number",
+            "loc": loc,
+            "msg": "Input should be a finite number",
+            "input": str(value),
+        }
+    if value <= 0:
+        return {
+            "type": "greater_than",
+            "loc": loc,
+            "msg": "Input should be greater than 0",
+            "input": str(value),
+            "ctx": {"gt": 0},
+        }
+    return None
+
+
+def decode_calc_request(body: bytes) -> list[dict]:
+    try:
+        request = _request_decoder.decode(body)
+    except msgspec.ValidationError as exc:
+        raise RequestValidationError([_validation_error(exc)])
+    except msgspec.DecodeError as exc:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body", 0), "msg": str(exc)}]
+        )
+
+    if not request.materials:
+        raise RequestValidationError(
+            [
+                {
+                    "type": "value_error",
+                    "loc": ("body", "materials"),
+                    "msg": "Value error, Должен быть хотя бы один материал",
+                }
+            ]
+        )
+
+    errors = []
+    materials = []
+    for i, m in enumerate(request.materials):
+        loc = ("body", "materials", i)
+        if m.id is None and m.name is None:
+            errors.append(
+                {
+                    "type": "value_error",
+                    "loc": loc,
+                    "msg": "Value error, Нужно указать id или name материала",
+                }
+            )
+        if m.id is not None and m.id <= 0:
+            errors.append(
+                {
+                    "type": "greater_than",
+                    "loc": (*loc, "id"),
+                    "msg": "Input should be greater than 0",
+                    "input": m.id,
+                    "ctx": {"gt": 0},
+                }
+            )
+        for field, value in (("qty", m.qty), ("price_rub", m.price_rub)):
+            if value is None:
+                continue
+            error = _check_positive(value, (*loc, field))
+            if error is not None:
+                errors.append(error)
+        material = {"qty": m.qty}
+        if m.id is not None:
+            material["id"] = m.id
+        if m.name is not None:
+            material["name"] = m.name
+        if m.price_rub is not None:
+            material["price_rub"] = m.price_rub
+        materials.append(material)
+    if errors:
+        raise RequestValidationError(errors)
+    return materials
+
+
+def encode_calc_response(result: dict) -> bytes:
+    return _response_encoder.encode(
+        CalcResponseStruct(
+            id=result["id"],
+            total_cost_rub=result["total_cost_rub"],
+            created_at=result["created_at"],
+        )
+    )
+
+
+def make_fast_calc_route_class(
+    *,
+    calculate: Callable[[list[dict], str | None], Awaitable[dict]],
+    idempotency_key_max_length: int,
+    metrics: Metrics | None = None,
+) -> type[APIRoute]:
+    class FastCalcRoute(APIRoute):
+        def get_route_handler(self):
+            async def handler(request: Request) -> Response:
+                started = time.perf_counter()
+                materials = decode_calc_request(await request.body())
+                idempotency_key = request.headers.get("idempotency-key")
+                if (
+                    idempotency_key is not None
+                    and len(idempotency_key) > idempotency_key_max_length
+                ):
+                    raise RequestValidationError(
+                        [
+                            {
+                                "type": "string_too_long",
+                                "loc": ("header", "Idempotency-Key"),
+                                "msg": "String should have at most "
+                                f"{idempotency_key_max_length} characters",
+                            }
+                        ]
+                    )
+                if metrics is not None:
+                    metrics.observe_stage("validation", time.perf_counter() - started)
+                result = await calculate(materials, idempotency_key)
+                return Response(
+                    encode_calc_response(result), media_type="application/json"
+                )
+
+            return handler
+
+    return FastCalcRoute
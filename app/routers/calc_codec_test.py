@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi.exceptions import RequestValidationError
+
+from app.routers.calc import CalcResponse
+from app.routers.calc_codec import decode_calc_request, encode_calc_response
+
+
+def test_decode_calc_request_keeps_decimal_text():
+    materials = decode_calc_request(
+        '{"materials": [{"name": "Сталь", "qty": 12.3, "price_rub": "54.50"}]}'.encode()
+    )
+
+    assert materials == [
+        {"name": "Сталь", "qty": Decimal("12.3"), "price_rub": Decimal("54.50")}
+    ]
+    assert str(materials[0]["qty"]) == "12.3"
+
+
+def test_decode_calc_request_omits_missing_catalog_fields():
+    materials = decode_calc_request(b'{"materials": [{"id": 3, "qty": 2}]}')
+
+    assert materials == [{"id": 3, "qty": Decimal("2")}]
+
+
+@pytest.mark.parametrize(
+    "body, loc",
+    [
+        (b'{"materials": []}', ("body", "materials")),
+        (
+            b'{"materials": [{"name": "a", "qty": 0, "price_rub": 1}]}',
+            ("body", "materials", 0, "qty"),
+        ),
+        (
+            b'{"materials": [{"name": "a", "qty": 1, "price_rub": "NaN"}]}',
+            ("body", "materials", 0, "price_rub"),
+        ),
+        (
+            b'{"materials": [{"name": "a", "qty": 1, "price_rub": 1}, {"name": "b", "qty": true, "price_rub": 1}]}',
+            ("body", "materials", 1, "qty"),
+        ),
+        (b'{"materials": [{"qty": 1, "price_rub": 1}]}', ("body", "materials", 0)),
+        (b'{"materials": [{"id": 0, "qty": 1}]}', ("body", "materials", 0, "id")),
+        (b'{"materials": [', ("body", 0)),
+    ],
+)
+def test_decode_calc_request_rejects_invalid_body(body, loc):
+    with pytest.raises(RequestValidationError) as exc_info:
+        decode_calc_request(body)
+
+    assert exc_info.value.errors()[0]["loc"] == loc
+
+
+def test_encode_calc_response_matches_pydantic_serialization():
+    result = {
+        "id": 7,
+        "total_cost_rub": Decimal("1330.35"),
+        "created_at": datetime(2025, 11, 14, 6, 5, 12, 101512, tzinfo=timezone.utc),
+    }
+
+    assert (
+        encode_calc_response(result)
+        == CalcResponse(**result).model_dump_json().encode()
+    )
@@ -0,0 +1,102 @@
+import logging
+from contextlib import aclosing
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette import status
+
+from app.services.calc_export import CalcExportService
+
+log = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    async with aclosing(rest):
+        yield first
+        try:
+            async for chunk in rest:
+                yield chunk
+        except Exception:
+            log.exception("Выгрузка calc_results прервана")
+            raise
+
+
+def make_calc_export_router(*, calc_export_service: CalcExportService) -> APIRouter:
+    router = APIRouter()
+
+    @router.get(
+        "/calc/export",
+        response_class=StreamingResponse,
+        responses={
+            status.HTTP_200_OK: {
+                "content": {media_type: {} for media_type in MEDIA_TYPES.values()},
+                "description": "Результаты в порядке (created_at, id)",
+            }
+        },
+    )
+    async def calc_export(
+        export_format: Annotated[
+            Literal["ndjson", "csv"],
+            Query(alias="format", title="Формат выгрузки"),
+        ] = "ndjson",
+        created_from: Annotated[
+            datetime | None,
+            Query(
+                alias="from",
+                title="Начало периода",
+                description="created_at >= from",
+            ),
+        ] = None,
+        created_to: Annotated[
+            datetime | None,
+            Query(
+                alias="to",
+                title="Конец периода",
+                description="created_at < to",
+            ),
+        ] = None,
+        after_created_at: Annotated[
+            datetime | None,
+            Query(
+                title="created_at последней полученной строки",
+                description="Продолжение прерванной выгрузки вместе с after_id",
+            ),
+        ] = None,
+        after_id: Annotated[
+            int | None,
+            Query(title="id последней полученной строки"),
+        ] = None,
+    ) -> StreamingResponse:
+        if (after_created_at is None) != (after_id is None):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="after_created_at и after_id передаются вместе",
+            )
+        chunks = calc_export_service.export(
+            export_format=export_format,
+            after=(after_created_at, after_id) if after_id is not None else None,
+            created_from=created_from,
+            created_to=created_to,
+        )
+        try:
+            first = await anext(chunks, b"")
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+        return StreamingResponse(
+            _prepend(first, chunks),
+            media_type=MEDIA_TYPES[export_format],
+            headers={
+                "Content-Disposition": (
+                    f'attachment; filename="calc_results.{export_format}"'
+                )
+            },
+        )
+
+    return router
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from app.routers.calc_export import make_calc_export_router
+from app.services.calc_export import CalcExportService
+
+NOW = datetime(2025, 11, 14, 12, tzinfo=timezone.utc)
+
+
+def make_client(service):
+    app = FastAPI()
+    app.include_router(make_calc_export_router(calc_export_service=service))
+    return TestClient(app)
+
+
+def test_export_streams_chunks_and_passes_resume_cursor():
+    service = MagicMock(spec=CalcExportService)
+    calls = []
+
+    async def export(**kwargs):
+        calls.append(kwargs)
+        yield b"id,total_cost_rub,created_at\n"
+        yield b"5,1.00,2025-11-14T12:00:00+00:00\n"
+
+    service.export.side_effect = export
+
+    with make_client(service) as client:
+        response = client.get(
+            "/calc/export",
+            params={
+                "format": "csv",
+                "from": "2025-11-01T00:00:00Z",
+                "after_created_at": NOW.isoformat(),
+                "after_id": 4,
+            },
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert "calc_results.csv" in response.headers["content-disposition"]
+    assert response.text.splitlines()[1] == "5,1.00,2025-11-14T12:00:00+00:00"
+    assert calls == [
+        {
+            "export_format": "csv",
+            "after": (NOW, 4),
+            "created_from": datetime(2025, 11, 1, tzinfo=timezone.utc),
+            "created_to": None,
+        }
+    ]
+
+
+def test_export_validates_cursor_and_reports_early_failure():
+    service = MagicMock(spec=CalcExportService)
+
+    async def failing_export(**kwargs):
+        raise RuntimeError("db is down")
+        yield b""
+
+    service.export.side_effect = failing_export
+
+    with make_client(service) as client:
+        half_cursor = client.get("/calc/export", params={"after_id": 4})
+        unknown_format = client.get("/calc/export", params={"format": "xml"})
+        failed = client.get("/calc/export")
+
+    assert half_cursor.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert unknown_format.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert failed.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field
+from starlette import status
+
+from app.metrics.metrics import Metrics, make_timed_route_class
+from app.routers.calc import CalcRequest, CalcResponse
+from app.services.calc_jobs import CalcJobService, JobQueueFullError
+
+QUEUE_FULL_RETRY_AFTER_SECONDS = 1
+
+
+class CalcJobResponse(BaseModel):
+    id: int = Field(
+        ...,
+        title="ID задания",
+        json_schema_extra={"example": 1},
+    )
+    status: Literal["queued", "running", "done", "failed"] = Field(
+        ...,
+        title="Статус задания",
+        json_schema_extra={"example": "queued"},
+    )
+    created_at: datetime = Field(
+        ...,
+        title="Время постановки в очередь",
+        json_schema_extra={"example": "2025-11-14T12:00:00Z"},
+    )
+    updated_at: datetime = Field(
+        ...,
+        title="Время последнего изменения статуса",
+        json_schema_extra={"example": "2025-11-14T12:00:00Z"},
+    )
+    result: CalcResponse | None = Field(
+        None,
+        title="Результат расчета",
+        description="Заполняется при статусе done",
+    )
+    error: str | None = Field(
+        None,
+        title="Ошибка",
+        description="Заполняется при статусе failed",
+    )
+
+
+def job_response(job: dict) -> CalcJobResponse:
+    result = None
+    if job["result_id"] is not None:
+        result = CalcResponse(
+            id=job["result_id"],
+            total_cost_rub=job["result_total_cost_rub"],
+            created_at=job["result_created_at"],
+        )
+    return CalcJobResponse(
+        id=job["id"],
+        status=job["status"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        result=result,
+        error=job["error"],
+    )
+
+
+def make_calc_jobs_router(
+    *,
+    calc_job_service: CalcJobService,
+    metrics: Metrics | None = None,
+) -> APIRouter:
+    router = APIRouter(
+        route_class=make_timed_route_class(metrics) if metrics is not None else APIRoute
+    )
+
+    @router.post("/calc/jobs", status_code=status.HTTP_202_ACCEPTED)
+    async def submit_job(req: CalcRequest, response: Response) -> CalcJobResponse:
+        if metrics is not None:
+            metrics.observe_since_handler_start("validation")
+        try:
+            job = await calc_job_service.submit(
+                [m.model_dump(exclude_none=True) for m in req.materials]
+            )
+        except JobQueueFullError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(exc),
+                headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER_SECONDS)},
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+        response.headers["Location"] = f"/calc/jobs/{job['id']}"
+        return job_response(job)
+
+    @router.get("/calc/jobs/{job_id}")
+    async def get_job(job_id: int) -> CalcJobResponse:
+        try:
+            job = await calc_job_service.get(job_id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Внутренняя ошибка сервиса",
+            )
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Задание {job_id} не найдено",
+            )
+        return job_response(job)
+
+    return router
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from app.routers.calc_jobs import make_calc_jobs_router
+from app.services.calc_jobs import CalcJobService, JobQueueFullError
+
+NOW = datetime(2025, 11, 14, 12, tzinfo=timezone.utc)
+QUEUED_JOB = {
+    "id": 5,
+    "status": "queued",
+    "result_id": None,
+    "result_total_cost_rub": None,
+    "result_created_at": None,
+    "error": None,
+    "created_at": NOW,
+    "updated_at": NOW,
+}
+
+
+def make_client(service):
+    app = FastAPI()
+    app.include_router(make_calc_jobs_router(calc_job_service=service))
+    return TestClient(app)
+
+
+def test_submit_job_returns_202_with_location():
+    service = AsyncMock(spec=CalcJobService)
+    service.submit.return_value = QUEUED_JOB
+
+    with make_client(service) as client:
+        response = client.post("/calc/jobs", json={"materials": [{"id": 3, "qty": 2}]})
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.headers["location"] == "/calc/jobs/5"
+    assert response.json()["status"] == "queued"
+    service.submit.assert_awaited_once_with([{"id": 3, "qty": Decimal("2")}])
+
+
+def test_submit_job_returns_429_when_queue_is_full():
+    service = AsyncMock(spec=CalcJobService)
+    service.submit.side_effect = JobQueueFullError("full")
+
+    with make_client(service) as client:
+        response = client.post(
+            "/calc/jobs",
+            json={"materials": [{"name": "Сталь", "qty": 1, "price_rub": 1}]},
+        )
+
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["retry-after"] == "1"
+
+
+def test_get_job_returns_result_or_404():
+    service = AsyncMock(spec=CalcJobService)
+    done = QUEUED_JOB | {
+        "status": "done",
+        "result_id": 11,
+        "result_total_cost_rub": Decimal("100.00"),
+        "result_created_at": NOW,
+    }
+    service.get.side_effect = lambda job_id: done if job_id == 5 else None
+
+    with make_client(service) as client:
+        found = client.get("/calc/jobs/5")
+        missing = client.get("/calc/jobs/6")
+
+    assert found.json()["result"] == {
+        "id": 11,
+        "total_cost_rub": "100.00",
+        "created_at": "2025-11-14T12:00:00Z",
+    }
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
@@ -1,11 +1,21 @@
+import gzip
+import tracemalloc
+from datetime import datetime, timezone
 from decimal import Decimal
 from unittest.mock import AsyncMock
 
+import pytest
 from fastapi import FastAPI, status
 from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
 
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.middlewares.compression import RequestDecompressionMiddleware
 from app.routers.calc import make_calc_router
-from app.services.calc import CalcService
+from app.services.calc import CalcService, InvalidCursorError
+from app.services.calc_engine import TotalCostOverflowError
+from app.services.idempotency import IdempotencyService
+from app.services.material_catalog import UnknownMaterialError
 
 
 def test_calc_endpoint_success():
@@ -43,7 +53,8 @@ def test_calc_endpoint_success():
         [
             {"name": "Сталь", "qty": 10, "price_rub": 100},
             {"name": "Медь", "qty": 5, "price_rub": 101},
-        ]
+        ],
+        idempotency_key=None,
     )
 
 
@@ -66,3 +77,604 @@ def test_calc_endpoint_empty_materials():
     assert (
         response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
     )  # Pydantic validation
+
+
+def test_calc_batch_endpoint_preserves_order():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_many_and_save.return_value = [
+        {
+            "id": 7,
+            "total_cost_rub": Decimal("1000.0"),
+            "created_at": "2025-11-14T12:00:00Z",
+        },
+        {
+            "id": 8,
+            "total_cost_rub": Decimal("505.0"),
+            "created_at": "2025-11-14T12:00:00Z",
+        },
+    ]
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+
+    app = FastAPI()
+    app.include_router(router)
+
+    payload = [
+        {"materials": [{"name": "Сталь", "qty": 10, "price_rub": 100}]},
+        {"materials": [{"name": "Медь", "qty": 5, "price_rub": 101}]},
+    ]
+
+    with TestClient(app) as client:
+        response = client.post("/calc/batch", json=payload)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.json()] == [7, 8]
+    mock_service.calculate_many_and_save.assert_awaited_once_with(
+        [
+            [{"name": "Сталь", "qty": 10, "price_rub": 100}],
+            [{"name": "Медь", "qty": 5, "price_rub": 101}],
+        ]
+    )
+
+
+def test_calc_batch_endpoint_rejects_oversized_batch():
+    mock_service = AsyncMock(spec=CalcService)
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(
+        calc_service=mock_service, transaction=dummy_transaction, max_batch_size=2
+    )
+
+    app = FastAPI()
+    app.include_router(router)
+
+    payload = [{"materials": [{"name": "Сталь", "qty": 1, "price_rub": 1}]}] * 3
+
+    with TestClient(app) as client:
+        response = client.post("/calc/batch", json=payload)
+        empty_response = client.post("/calc/batch", json=[])
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert empty_response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    mock_service.calculate_many_and_save.assert_not_awaited()
+
+
+def make_stream_client(mock_service):
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_calc_stream_endpoint_sums_ndjson_lines():
+    mock_service = AsyncMock(spec=CalcService)
+    received = []
+
+    async def calculate_stream_and_save(materials):
+        async for m in materials:
+            received.append(m)
+        return {
+            "id": 1,
+            "total_cost_rub": Decimal("1505"),
+            "created_at": "2025-11-14T12:00:00Z",
+        }
+
+    mock_service.calculate_stream_and_save.side_effect = calculate_stream_and_save
+
+    body = (
+        b'{"name": "\xd0\xa1\xd1\x82\xd0\xb0\xd0\xbb\xd1\x8c", "qty": 10, "price_rub": 100}\n'
+        b"\n"
+        b'{"name": "Cu", "qty": 5, "price_rub": 101}'
+    )
+
+    with make_stream_client(mock_service) as client:
+        response = client.post(
+            "/calc/stream",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["id"] == 1
+    assert received == [
+        {"name": "Сталь", "qty": Decimal("10"), "price_rub": Decimal("100")},
+        {"name": "Cu", "qty": Decimal("5"), "price_rub": Decimal("101")},
+    ]
+
+
+@pytest.mark.parametrize(
+    "line, loc",
+    [
+        (b'{"name": "Cu", "qty": 0, "price_rub": 101}', ["body", 2, "qty"]),
+        (b'{"id": 3, "qty": 1}', ["body", 2, "price_rub"]),
+    ],
+)
+def test_calc_stream_endpoint_reports_invalid_line(line, loc):
+    mock_service = AsyncMock(spec=CalcService)
+
+    async def calculate_stream_and_save(materials):
+        async for _ in materials:
+            pass
+
+    mock_service.calculate_stream_and_save.side_effect = calculate_stream_and_save
+
+    body = b'{"name": "Cu", "qty": 5, "price_rub": 101}\n' + line + b"\n"
+
+    with make_stream_client(mock_service) as client:
+        response = client.post(
+            "/calc/stream",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["detail"][0]["loc"] == loc
+
+
+def test_calc_stream_endpoint_rejects_empty_body_and_wrong_media_type():
+    mock_service = AsyncMock(spec=CalcService)
+
+    async def calculate_stream_and_save(materials):
+        async for _ in materials:
+            pass
+
+    mock_service.calculate_stream_and_save.side_effect = calculate_stream_and_save
+
+    with make_stream_client(mock_service) as client:
+        empty_response = client.post(
+            "/calc/stream",
+            content=b"\n",
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        json_response = client.post("/calc/stream", json={"materials": []})
+
+    assert empty_response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert json_response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+def test_calc_stream_endpoint_rejects_oversized_and_corrupt_gzip_body():
+    mock_service = AsyncMock(spec=CalcService)
+
+    async def calculate_stream_and_save(materials):
+        async for _ in materials:
+            pass
+
+    mock_service.calculate_stream_and_save.side_effect = calculate_stream_and_save
+
+    def dummy_transaction(func):
+        return func
+
+    app = FastAPI()
+    app.include_router(
+        make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+    )
+    app.add_middleware(RequestDecompressionMiddleware, max_size=1024)
+    line = b'{"name": "Cu", "qty": 1.5, "price_rub": 2.25}\n'
+    headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+
+    with TestClient(app) as client:
+        too_large = client.post(
+            "/calc/stream", content=gzip.compress(line * 100), headers=headers
+        )
+        corrupt = client.post(
+            "/calc/stream",
+            content=gzip.compress(line)[:-8] + b"garbage!",
+            headers=headers,
+        )
+
+    assert too_large.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+    assert corrupt.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_calc_stream_endpoint_memory_does_not_grow_with_input():
+    mock_service = AsyncMock(spec=CalcService)
+    peaks = []
+
+    async def calculate_stream_and_save(materials):
+        tracemalloc.reset_peak()
+        async for _ in materials:
+            pass
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        return {
+            "id": 1,
+            "total_cost_rub": Decimal("1"),
+            "created_at": "2025-11-14T12:00:00Z",
+        }
+
+    mock_service.calculate_stream_and_save.side_effect = calculate_stream_and_save
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+    app = FastAPI()
+    app.include_router(router)
+
+    async def body(lines):
+        chunk = b'{"name": "Cu", "qty": 1.5, "price_rub": 2.25}\n' * 1000
+        for _ in range(lines // 1000):
+            yield chunk
+
+    tracemalloc.start()
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            for lines in (2_000, 40_000):
+                response = await client.post(
+                    "/calc/stream",
+                    content=body(lines),
+                    headers={"Content-Type": "application/x-ndjson"},
+                )
+                assert response.status_code == status.HTTP_200_OK
+    finally:
+        tracemalloc.stop()
+
+    small, large = peaks
+    assert large < small * 2
+
+
+def test_calc_endpoint_total_overflow():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.side_effect = TotalCostOverflowError("overflow")
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+
+    app = FastAPI()
+    app.include_router(router)
+
+    payload = {"materials": [{"name": "Сталь", "qty": 10**6, "price_rub": 10**6}]}
+
+    with TestClient(app) as client:
+        response = client.post("/calc", json=payload)
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["detail"] == "overflow"
+
+
+def make_idempotent_client(mock_service):
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(
+        calc_service=mock_service,
+        transaction=dummy_transaction,
+        idempotency=IdempotencyService(cache=LRUTTLCache(max_size=10)),
+    )
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_calc_endpoint_repeated_request_is_served_from_cache():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("1000"),
+        "created_at": "2025-11-14T12:00:00Z",
+    }
+
+    with make_idempotent_client(mock_service) as client:
+        first = client.post(
+            "/calc",
+            json={"materials": [{"name": "Сталь", "qty": 10, "price_rub": 100}]},
+        )
+        second = client.post(
+            "/calc",
+            json={"materials": [{"name": "Сталь", "qty": 10.0, "price_rub": 100}]},
+        )
+        stats = client.get("/calc/cache/stats")
+
+    assert first.json() == second.json()
+    mock_service.calculate_and_save.assert_awaited_once()
+    key = mock_service.calculate_and_save.await_args.kwargs["idempotency_key"]
+    assert key.startswith("sha256:")
+    assert stats.json()["idempotency"]["hits"] == 1
+    assert stats.json()["idempotency"]["misses"] == 1
+
+
+def test_calc_endpoint_uses_idempotency_key_header():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("1000"),
+        "created_at": "2025-11-14T12:00:00Z",
+    }
+
+    with make_idempotent_client(mock_service) as client:
+        for qty in (10, 20):
+            response = client.post(
+                "/calc",
+                json={"materials": [{"name": "Сталь", "qty": qty, "price_rub": 100}]},
+                headers={"Idempotency-Key": "order-42"},
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+    mock_service.calculate_and_save.assert_awaited_once()
+    assert (
+        mock_service.calculate_and_save.await_args.kwargs["idempotency_key"]
+        == "key:order-42"
+    )
+
+
+def test_calc_endpoint_failure_is_not_cached():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.side_effect = [
+        RuntimeError("db is down"),
+        {
+            "id": 2,
+            "total_cost_rub": Decimal("1000"),
+            "created_at": "2025-11-14T12:00:00Z",
+        },
+    ]
+    payload = {"materials": [{"name": "Сталь", "qty": 10, "price_rub": 100}]}
+
+    with make_idempotent_client(mock_service) as client:
+        failed = client.post("/calc", json=payload)
+        retried = client.post("/calc", json=payload)
+
+    assert failed.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert retried.json()["id"] == 2
+
+
+@pytest.mark.parametrize("fast_codec", [False, True])
+def test_calc_endpoint_accepts_catalog_materials(fast_codec):
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("1000"),
+        "created_at": "2025-11-14T12:00:00Z",
+    }
+    router = make_calc_router(
+        calc_service=mock_service, transaction=lambda func: func, fast_codec=fast_codec
+    )
+    app = FastAPI()
+    app.include_router(router)
+    payload = {
+        "materials": [
+            {"id": 3, "qty": 2},
+            {"name": "Сталь", "qty": 1},
+            {"name": "Медь", "qty": 1, "price_rub": 5},
+        ]
+    }
+
+    with TestClient(app) as client:
+        response = client.post("/calc", json=payload)
+        missing_reference = client.post("/calc", json={"materials": [{"qty": 1}]})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert mock_service.calculate_and_save.await_args.args[0] == [
+        {"id": 3, "qty": Decimal("2")},
+        {"name": "Сталь", "qty": Decimal("1")},
+        {"name": "Медь", "qty": Decimal("1"), "price_rub": Decimal("5")},
+    ]
+    assert missing_reference.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert missing_reference.json()["detail"][0]["loc"] == ["body", "materials", 0]
+
+
+def test_calc_endpoint_unknown_material():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.side_effect = UnknownMaterialError("нет")
+
+    router = make_calc_router(calc_service=mock_service, transaction=lambda func: func)
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        response = client.post("/calc", json={"materials": [{"id": 9, "qty": 1}]})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["detail"] == "нет"
+
+
+def test_calc_endpoint_fingerprints_resolved_catalog_prices():
+    mock_service = AsyncMock(spec=CalcService)
+    prices = iter([Decimal("100"), Decimal("120")])
+
+    async def resolve_prices(batch):
+        price = next(prices)
+        return [[{**m, "price_rub": price} for m in materials] for materials in batch]
+
+    mock_service.resolve_prices.side_effect = resolve_prices
+    mock_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("1000"),
+        "created_at": "2025-11-14T12:00:00Z",
+    }
+    payload = {"materials": [{"id": 3, "qty": 10}]}
+
+    with make_idempotent_client(mock_service) as client:
+        client.post("/calc", json=payload)
+        client.post("/calc", json=payload)
+
+    assert mock_service.calculate_and_save.await_count == 2
+    first, second = [
+        call.kwargs["idempotency_key"]
+        for call in mock_service.calculate_and_save.await_args_list
+    ]
+    assert first != second
+
+
+def test_calc_list_endpoint_passes_filters_and_returns_page():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.list_results.return_value = {
+        "items": [
+            {
+                "id": 1,
+                "total_cost_rub": Decimal("10"),
+                "created_at": "2025-11-14T12:00:00Z",
+            }
+        ],
+        "next_cursor": "abc",
+    }
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(
+        calc_service=mock_service, transaction=dummy_transaction, max_page_size=100
+    )
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        response = client.get(
+            "/calc",
+            params={"limit": 10, "cursor": "xyz", "from": "2025-11-14T00:00:00Z"},
+        )
+        too_large = client.get("/calc", params={"limit": 101})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["next_cursor"] == "abc"
+    assert response.json()["items"][0]["id"] == 1
+    kwargs = mock_service.list_results.await_args.kwargs
+    assert kwargs["limit"] == 10
+    assert kwargs["cursor"] == "xyz"
+    assert kwargs["created_from"].isoformat() == "2025-11-14T00:00:00+00:00"
+    assert kwargs["created_to"] is None
+    assert too_large.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_calc_list_endpoint_rejects_invalid_cursor():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.list_results.side_effect = InvalidCursorError("bad")
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        response = client.get("/calc", params={"cursor": "bad"})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_calc_get_endpoint_returns_etag_and_not_modified():
+    mock_service = AsyncMock(spec=CalcService)
+    saved = {
+        "id": 7,
+        "total_cost_rub": Decimal("670.35"),
+        "created_at": datetime(2025, 11, 14, 12, tzinfo=timezone.utc),
+    }
+    mock_service.get_result.side_effect = lambda result_id: (
+        saved if result_id == 7 else None
+    )
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        first = client.get("/calc/7")
+        etag = first.headers["ETag"]
+        repeated = client.get("/calc/7", headers={"If-None-Match": etag})
+        other = client.get("/calc/7", headers={"If-None-Match": '"other", W/' + etag})
+        stale = client.get("/calc/7", headers={"If-None-Match": '"other"'})
+        missing = client.get("/calc/8")
+
+    assert first.status_code == status.HTTP_200_OK
+    assert first.json()["total_cost_rub"] == "670.35"
+    assert etag.startswith('"') and etag.endswith('"')
+    assert repeated.status_code == status.HTTP_304_NOT_MODIFIED
+    assert repeated.headers["ETag"] == etag
+    assert repeated.content == b""
+    assert other.status_code == status.HTTP_304_NOT_MODIFIED
+    assert stale.status_code == status.HTTP_200_OK
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_calc_stats_endpoint_validates_bucket():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.stats.return_value = [
+        {
+            "bucket": "2025-11-14T12:00:00Z",
+            "count": 2,
+            "total_cost_rub": Decimal("30"),
+            "avg_cost_rub": Decimal("15"),
+        }
+    ]
+
+    def dummy_transaction(func):
+        return func
+
+    router = make_calc_router(calc_service=mock_service, transaction=dummy_transaction)
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        response = client.get(
+            "/calc/stats", params={"bucket": "hour", "to": "2025-11-15T00:00:00Z"}
+        )
+        invalid = client.get("/calc/stats", params={"bucket": "week"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["count"] == 2
+    kwargs = mock_service.stats.await_args.kwargs
+    assert kwargs["bucket"] == "hour"
+    assert kwargs["created_to"].isoformat() == "2025-11-15T00:00:00+00:00"
+    assert invalid.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_calc_endpoint_fast_codec_matches_default_path():
+    mock_service = AsyncMock(spec=CalcService)
+    mock_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("2505.0"),
+        "created_at": datetime(2025, 11, 14, 12, 0, tzinfo=timezone.utc),
+    }
+    payload = {
+        "materials": [
+            {"name": "Сталь", "qty": 10, "price_rub": 100},
+            {"name": "Медь", "qty": 5, "price_rub": 101},
+        ]
+    }
+
+    responses, schemas = [], []
+    for fast_codec in (False, True):
+        app = FastAPI()
+        app.include_router(
+            make_calc_router(
+                calc_service=mock_service,
+                transaction=lambda func: func,
+                fast_codec=fast_codec,
+            )
+        )
+        with TestClient(app) as client:
+            responses.append(client.post("/calc", json=payload))
+            invalid = client.post(
+                "/calc",
+                json={"materials": [{"name": "Сталь", "qty": -1, "price_rub": 1}]},
+            )
+            too_long_key = client.post(
+                "/calc", json=payload, headers={"Idempotency-Key": "k" * 201}
+            )
+        assert invalid.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+        assert invalid.json()["detail"][0]["loc"] == ["body", "materials", 0, "qty"]
+        assert too_long_key.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+        schemas.append(app.openapi())
+
+    assert responses[0].content == responses[1].content
+    assert schemas[0] == schemas[1]
+    assert mock_service.calculate_and_save.await_count == 2
+    assert (
+        mock_service.calculate_and_save.await_args_list[0]
+        == mock_service.calculate_and_save.await_args_list[1]
+    )
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from starlette import status
+
+from app.profiling.profiler import RequestProfiler
+
+
+def make_profiles_router(*, profiler: RequestProfiler) -> APIRouter:
+    router = APIRouter()
+
+    def authorize(token: str | None) -> None:
+        if not profiler.is_authorized(token):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Нужен корректный заголовок X-Profile-Token",
+            )
+
+    ProfileToken = Annotated[
+        str | None,
+        Header(
+            alias="X-Profile-Token",
+            title="Токен профилирования",
+            description="Значение APP_PROFILING_TOKEN",
+        ),
+    ]
+
+    @router.get("/profiles")
+    async def list_profiles(token: ProfileToken = None) -> list[dict]:
+        authorize(token)
+        return await asyncio.to_thread(profiler.list_profiles)
+
+    @router.get("/profiles/{profile_id}")
+    async def get_profile(profile_id: str, token: ProfileToken = None) -> dict:
+        authorize(token)
+        profile = await asyncio.to_thread(profiler.get_profile, profile_id)
+        if profile is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Профиль {profile_id} не найден",
+            )
+        return profile
+
+    @router.get("/profiles/{profile_id}/pstats", response_class=FileResponse)
+    async def get_profile_pstats(profile_id: str, token: ProfileToken = None):
+        authorize(token)
+        path = profiler.pstats_path(profile_id)
+        if path is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Профиль {profile_id} не найден",
+            )
+        return FileResponse(
+            path, media_type="application/octet-stream", filename=path.name
+        )
+
+    return router
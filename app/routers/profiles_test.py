@@ -0,0 +1,37 @@
+from contextvars import ContextVar
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from app.profiling.profiler import RequestProfiler
+from app.routers.profiles import make_profiles_router
+
+
+@pytest.mark.asyncio
+async def test_profiles_endpoints_require_token_and_serve_artifacts(tmp_path):
+    profiler = RequestProfiler(
+        directory=str(tmp_path),
+        trace_id_ctx=ContextVar("trace_id_ctx", default="abc"),
+        token="secret",
+    )
+    active = profiler.start("header")
+    await profiler.finish(active, method="POST", path="/calc", status=200)
+
+    app = FastAPI()
+    app.include_router(make_profiles_router(profiler=profiler))
+    auth = {"X-Profile-Token": "secret"}
+
+    with TestClient(app) as client:
+        forbidden = client.get("/profiles")
+        listed = client.get("/profiles", headers=auth)
+        profile = client.get(f"/profiles/{active.id}", headers=auth)
+        pstats = client.get(f"/profiles/{active.id}/pstats", headers=auth)
+        missing = client.get("/profiles/unknown", headers=auth)
+
+    assert forbidden.status_code == status.HTTP_403_FORBIDDEN
+    assert [p["id"] for p in listed.json()] == [active.id]
+    assert profile.json()["trace_id"] == "abc"
+    assert pstats.status_code == status.HTTP_200_OK
+    assert pstats.content
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
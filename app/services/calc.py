@@ -1,15 +1,174 @@
+import asyncio
+import base64
+import binascii
+from concurrent.futures import Executor
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import AsyncIterable, AsyncIterator
+
+from app.metrics.metrics import Metrics
 from app.repositories.calc_result import CalcResultRepository
+from app.services.calc_engine import (
+    TOTAL_COST_QUANTUM,
+    CalcEngine,
+    DecimalCalcEngine,
+    check_total_cost,
+)
+from app.services.material_catalog import MaterialCatalogService, UnknownMaterialError
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError(f"Некорректный курсор: {cursor}")
 
 
 class CalcService:
-    def __init__(self, *, calc_result_repository: CalcResultRepository):
+    def __init__(
+        self,
+        *,
+        calc_result_repository: CalcResultRepository,
+        calc_engine: CalcEngine | None = None,
+        metrics: Metrics | None = None,
+        material_catalog: MaterialCatalogService | None = None,
+    ):
         self._calc_result_repository = calc_result_repository
+        self._calc_engine = calc_engine or DecimalCalcEngine()
+        self._metrics = metrics
+        self._material_catalog = material_catalog
+
+    async def resolve_prices(self, batch: list[list[dict]]) -> list[list[dict]]:
+        if self._material_catalog is not None:
+            return await self._material_catalog.resolve_prices(batch)
+        if any(m.get("price_rub") is None for materials in batch for m in materials):
+            raise UnknownMaterialError(
+                "Каталог материалов отключен, укажите price_rub для каждого материала"
+            )
+        return batch
 
-    async def calculate_and_save(self, materials: list[dict]) -> dict:
+    async def calculate_and_save(
+        self,
+        materials: list[dict],
+        idempotency_key: str | None = None,
+        executor: Executor | None = None,
+    ) -> dict:
+        [materials] = await self.resolve_prices([materials])
+        if executor is None:
+            total_cost_rub = self._calculate_total(materials)
+        else:
+            total_cost_rub = await self._calculate_total_in(executor, materials)
         return await self._calc_result_repository.insert(
-            total_cost_rub=sum(m["qty"] * m["price_rub"] for m in materials),
+            total_cost_rub=total_cost_rub,
+            idempotency_key=idempotency_key,
+            items=materials,
         )
 
+    async def calculate_many_and_save(self, batch: list[list[dict]]) -> list[dict]:
+        batch = await self.resolve_prices(batch)
+        return await self._calc_result_repository.insert_many(
+            total_costs_rub=[self._calculate_total(materials) for materials in batch],
+            items=batch,
+        )
+
+    async def calculate_stream_and_save(self, materials: AsyncIterable[dict]) -> dict:
+        total = Decimal(0)
+
+        async def summed() -> AsyncIterator[dict]:
+            nonlocal total
+            async for m in materials:
+                total += m["qty"] * m["price_rub"]
+                yield m
+
+        return await self._calc_result_repository.insert_streamed(
+            items=summed(), total_cost_rub=lambda: check_total_cost(total)
+        )
+
+    async def get_result(self, result_id: int) -> dict | None:
+        return await self._calc_result_repository.get_by_id(result_id)
+
+    async def list_results(
+        self,
+        *,
+        limit: int,
+        cursor: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> dict:
+        rows = await self._calc_result_repository.list_page(
+            limit=limit + 1,
+            after=decode_cursor(cursor) if cursor is not None else None,
+            created_from=created_from,
+            created_to=created_to,
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return {"items": rows, "next_cursor": next_cursor}
+
+    async def stats(
+        self,
+        *,
+        bucket: str,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> list[dict]:
+        rows = await self._calc_result_repository.list_rollups(
+            granularity=bucket, created_from=created_from, created_to=created_to
+        )
+        return [
+            {
+                "bucket": row["bucket"],
+                "count": int(row["count"]),
+                "total_cost_rub": row["total_cost_rub"],
+                "avg_cost_rub": (row["total_cost_rub"] / row["count"]).quantize(
+                    TOTAL_COST_QUANTUM, rounding=ROUND_HALF_UP
+                ),
+            }
+            for row in rows
+        ]
+
+    def _calculate_total(self, materials: list[dict]) -> Decimal:
+        if self._metrics is None:
+            return check_total_cost(self._calc_engine.total(materials))
+        with self._metrics.stage("calculation"):
+            return check_total_cost(self._calc_engine.total(materials))
+
+    async def _calculate_total_in(
+        self, executor: Executor, materials: list[dict]
+    ) -> Decimal:
+        loop = asyncio.get_running_loop()
+        if self._metrics is None:
+            return check_total_cost(
+                await loop.run_in_executor(executor, self._calc_engine.total, materials)
+            )
+        with self._metrics.stage("calculation"):
+            return check_total_cost(
+                await loop.run_in_executor(executor, self._calc_engine.total, materials)
+            )
+
 
-def make_calc_service(calc_result_repository: CalcResultRepository) -> CalcService:
-    return CalcService(calc_result_repository=calc_result_repository)
+def make_calc_service(
+    calc_result_repository: CalcResultRepository,
+    calc_engine: CalcEngine | None = None,
+    metrics: Metrics | None = None,
+    material_catalog: MaterialCatalogService | None = None,
+) -> CalcService:
+    return CalcService(
+        calc_result_repository=calc_result_repository,
+        calc_engine=calc_engine,
+        metrics=metrics,
+        material_catalog=material_catalog,
+    )
@@ -0,0 +1,135 @@
+import logging
+from decimal import (
+    ROUND_HALF_UP,
+    Context,
+    Decimal,
+    DecimalException,
+    Inexact,
+    InvalidOperation,
+    Overflow,
+    localcontext,
+)
+from typing import Protocol
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+TOTAL_COST_PRECISION = 12
+TOTAL_COST_SCALE = 2
+TOTAL_COST_LIMIT = Decimal(10) ** (TOTAL_COST_PRECISION - TOTAL_COST_SCALE)
+TOTAL_COST_QUANTUM = Decimal(10) ** -TOTAL_COST_SCALE
+
+NUMPY_ENGINE_SCALE = 4
+NUMPY_ENGINE_THRESHOLD = 10_000
+INT64_SAFE_LIMIT = 2**62
+
+_exact_context = Context(traps=[Inexact, InvalidOperation, Overflow])
+
+
+class TotalCostOverflowError(ValueError):
+    pass
+
+
+class CalcEngine(Protocol):
+    name: str
+
+    def total(self, materials: list[dict]) -> Decimal: ...
+
+
+class DecimalCalcEngine:
+    name = "decimal"
+
+    def total(self, materials: list[dict]) -> Decimal:
+        return sum((m["qty"] * m["price_rub"] for m in materials), Decimal(0))
+
+
+class NumpyCalcEngine:
+    name = "numpy"
+
+    def __init__(
+        self,
+        *,
+        scale: int = NUMPY_ENGINE_SCALE,
+        fallback: CalcEngine | None = None,
+    ):
+        self._scale = scale
+        self._factor = Decimal(10) ** scale
+        self._fallback = fallback or DecimalCalcEngine()
+
+    def total(self, materials: list[dict]) -> Decimal:
+        qty = self._to_fixed_point([m["qty"] for m in materials])
+        price = self._to_fixed_point([m["price_rub"] for m in materials])
+        if qty is None or price is None:
+            return self._fallback.total(materials)
+
+        bound = float(np.abs(qty).astype(np.float64) @ np.abs(price).astype(np.float64))
+        if bound >= INT64_SAFE_LIMIT:
+            return self._fallback.total(materials)
+
+        total = int(qty @ price)
+        return Decimal(total).scaleb(-2 * self._scale)
+
+    def _to_fixed_point(self, values: list) -> np.ndarray | None:
+        try:
+            with localcontext(_exact_context):
+                scaled = list(map(self._factor.__mul__, values))
+        except DecimalException:
+            return None
+        ints = list(map(int, scaled))
+        if ints != scaled:
+            return None
+        try:
+            return np.array(ints, dtype=np.int64)
+        except OverflowError:
+            return None
+
+
+class AutoCalcEngine:
+    name = "auto"
+
+    def __init__(
+        self,
+        *,
+        small: CalcEngine,
+        large: CalcEngine,
+        threshold: int = NUMPY_ENGINE_THRESHOLD,
+    ):
+        self._small = small
+        self._large = large
+        self._threshold = threshold
+
+    def total(self, materials: list[dict]) -> Decimal:
+        if len(materials) >= self._threshold:
+            return self._large.total(materials)
+        return self._small.total(materials)
+
+
+def check_total_cost(total: Decimal) -> Decimal:
+    magnitude = abs(Decimal(total))
+    if (
+        magnitude >= TOTAL_COST_LIMIT
+        or magnitude.quantize(TOTAL_COST_QUANTUM, rounding=ROUND_HALF_UP)
+        >= TOTAL_COST_LIMIT
+    ):
+        raise TotalCostOverflowError(
+            f"Общая стоимость {total} не помещается в NUMERIC"
+            f"({TOTAL_COST_PRECISION},{TOTAL_COST_SCALE})"
+        )
+    return total
+
+
+def make_calc_engine(
+    name: str, numpy_threshold: int = NUMPY_ENGINE_THRESHOLD
+) -> CalcEngine:
+    if name == DecimalCalcEngine.name:
+        return DecimalCalcEngine()
+    if name == NumpyCalcEngine.name:
+        return NumpyCalcEngine()
+    if name == AutoCalcEngine.name:
+        return AutoCalcEngine(
+            small=DecimalCalcEngine(),
+            large=NumpyCalcEngine(),
+            threshold=numpy_threshold,
+        )
+    raise ValueError(f"Неизвестный движок расчета: {name}")
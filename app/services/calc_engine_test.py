@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from app.services.calc_engine import (
+    AutoCalcEngine,
+    DecimalCalcEngine,
+    NumpyCalcEngine,
+    TotalCostOverflowError,
+    check_total_cost,
+    make_calc_engine,
+)
+
+positive_decimals = st.decimals(
+    min_value=Decimal("0.000001"),
+    max_value=Decimal("1000000"),
+    places=6,
+    allow_nan=False,
+    allow_infinity=False,
+)
+materials_lists = st.lists(
+    st.fixed_dictionaries({"qty": positive_decimals, "price_rub": positive_decimals}),
+    max_size=200,
+)
+
+
+class ForbiddenFallback:
+    name = "forbidden"
+
+    def total(self, materials):
+        raise AssertionError("Ожидался расчет без отката на Decimal")
+
+
+@settings(max_examples=300, deadline=None)
+@given(materials_lists)
+def test_numpy_engine_matches_decimal_engine(materials):
+    assert NumpyCalcEngine().total(materials) == DecimalCalcEngine().total(materials)
+
+
+@settings(max_examples=100, deadline=None)
+@given(
+    st.lists(
+        st.fixed_dictionaries(
+            {
+                "qty": st.decimals(min_value=1, max_value=10**4, places=4),
+                "price_rub": st.decimals(min_value=1, max_value=10**4, places=2),
+            }
+        ),
+        min_size=1,
+        max_size=200,
+    )
+)
+def test_numpy_engine_matches_decimal_engine_on_fixed_point_path(materials):
+    engine = NumpyCalcEngine(fallback=ForbiddenFallback())
+
+    assert engine.total(materials) == DecimalCalcEngine().total(materials)
+
+
+def test_numpy_engine_falls_back_on_int64_overflow():
+    materials = [{"qty": Decimal(10**9), "price_rub": Decimal(10**9)}] * 3
+
+    assert NumpyCalcEngine().total(materials) == Decimal(3 * 10**18)
+
+
+def test_numpy_engine_falls_back_on_excess_precision():
+    materials = [{"qty": Decimal("1.000000000000000000000000000001"), "price_rub": 2}]
+
+    assert NumpyCalcEngine().total(materials) == DecimalCalcEngine().total(materials)
+
+
+def test_auto_engine_switches_by_list_size():
+    small, large = DecimalCalcEngine(), NumpyCalcEngine()
+    engine = AutoCalcEngine(small=small, large=large, threshold=3)
+    materials = [{"qty": Decimal("1.5"), "price_rub": Decimal("2")}]
+
+    small.total = lambda m: "small"
+    large.total = lambda m: "large"
+
+    assert engine.total(materials * 2) == "small"
+    assert engine.total(materials * 3) == "large"
+
+
+def test_check_total_cost_detects_numeric_overflow():
+    assert check_total_cost(Decimal("9999999999.994")) == Decimal("9999999999.994")
+    with pytest.raises(TotalCostOverflowError):
+        check_total_cost(Decimal("9999999999.995"))
+
+
+@pytest.mark.parametrize("engine", [DecimalCalcEngine(), NumpyCalcEngine()])
+def test_huge_total_is_reported_as_overflow(engine):
+    materials = [{"qty": Decimal("1e20"), "price_rub": Decimal("1e10")}]
+
+    with pytest.raises(TotalCostOverflowError):
+        check_total_cost(engine.total(materials))
+    with pytest.raises(TotalCostOverflowError):
+        check_total_cost(Decimal(10) ** 30)
+
+
+def test_make_calc_engine():
+    assert make_calc_engine("decimal").name == "decimal"
+    assert make_calc_engine("numpy").name == "numpy"
+    assert make_calc_engine("auto", numpy_threshold=10).name == "auto"
+    with pytest.raises(ValueError):
+        make_calc_engine("gpu")
@@ -0,0 +1,96 @@
+import csv
+import io
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncIterator
+
+import orjson
+
+from app.repositories.calc_result import CalcResultRepository
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_COLUMNS = ("id", "total_cost_rub", "created_at")
+
+
+def encode_ndjson(rows: list[dict]) -> bytes:
+    return b"".join(
+        orjson.dumps(
+            {
+                "id": row["id"],
+                "total_cost_rub": str(row["total_cost_rub"]),
+                "created_at": row["created_at"].isoformat(),
+            }
+        )
+        + b"\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows: list[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(
+        (row["id"], row["total_cost_rub"], row["created_at"].isoformat())
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def csv_header() -> bytes:
+    return (",".join(EXPORT_COLUMNS) + "\n").encode()
+
+
+def row_cursor(line: bytes, export_format: str) -> tuple[datetime, int] | None:
+    if export_format == "ndjson":
+        row = orjson.loads(line)
+        return datetime.fromisoformat(row["created_at"]), int(row["id"])
+    id, _, created_at = next(csv.reader([line.decode()]))
+    if id == EXPORT_COLUMNS[0]:
+        return None
+    return datetime.fromisoformat(created_at), int(id)
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+class CalcExportService:
+    def __init__(
+        self,
+        *,
+        calc_result_repository: CalcResultRepository,
+        chunk_size: int = 10_000,
+    ):
+        self._calc_result_repository = calc_result_repository
+        self._chunk_size = chunk_size
+
+    async def export(
+        self,
+        *,
+        export_format: str,
+        after: tuple[datetime, int] | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> AsyncIterator[bytes]:
+        if export_format not in ENCODERS:
+            raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+        encode = ENCODERS[export_format]
+        if export_format == "csv" and after is None:
+            yield csv_header()
+        partitions = self._calc_result_repository.stream_rows(
+            chunk_size=self._chunk_size,
+            after=after,
+            created_from=created_from,
+            created_to=created_to,
+        )
+        async with aclosing(partitions):
+            async for rows in partitions:
+                yield encode(rows)
+
+
+def make_calc_export_service(
+    calc_result_repository: CalcResultRepository,
+    chunk_size: int = 10_000,
+) -> CalcExportService:
+    return CalcExportService(
+        calc_result_repository=calc_result_repository, chunk_size=chunk_size
+    )
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+import pytest
+
+from app.services.calc_export import CalcExportService, row_cursor
+
+NOW = datetime(2025, 11, 14, 12, 30, tzinfo=timezone.utc)
+ROWS = [
+    {"id": 1, "total_cost_rub": Decimal("670.35"), "created_at": NOW},
+    {"id": 2, "total_cost_rub": Decimal("10.00"), "created_at": NOW},
+    {"id": 3, "total_cost_rub": Decimal("0.50"), "created_at": NOW},
+]
+
+
+class InMemoryCalcResultRepository:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def stream_rows(self, *, chunk_size, after=None, **filters):
+        self.calls.append({"chunk_size": chunk_size, "after": after, **filters})
+        rows = [r for r in self.rows if after is None or r["id"] > after[1]]
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start : start + chunk_size]
+
+
+async def collect(service, **kwargs):
+    return [chunk async for chunk in service.export(**kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_yields_one_chunk_per_partition():
+    repo = InMemoryCalcResultRepository(ROWS)
+    service = CalcExportService(calc_result_repository=repo, chunk_size=2)
+
+    chunks = await collect(service, export_format="ndjson", created_from=NOW)
+
+    assert len(chunks) == 2
+    lines = b"".join(chunks).splitlines()
+    assert orjson.loads(lines[0]) == {
+        "id": 1,
+        "total_cost_rub": "670.35",
+        "created_at": "2025-11-14T12:30:00+00:00",
+    }
+    assert row_cursor(lines[-1], "ndjson") == (NOW, 3)
+    assert repo.calls == [
+        {"chunk_size": 2, "after": None, "created_from": NOW, "created_to": None}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_csv_writes_header_only_on_fresh_export():
+    service = CalcExportService(
+        calc_result_repository=InMemoryCalcResultRepository(ROWS), chunk_size=10
+    )
+
+    fresh = b"".join(await collect(service, export_format="csv"))
+    resumed = b"".join(await collect(service, export_format="csv", after=(NOW, 2)))
+
+    assert fresh.splitlines() == [
+        b"id,total_cost_rub,created_at",
+        b"1,670.35,2025-11-14T12:30:00+00:00",
+        b"2,10.00,2025-11-14T12:30:00+00:00",
+        b"3,0.50,2025-11-14T12:30:00+00:00",
+    ]
+    assert resumed == b"3,0.50,2025-11-14T12:30:00+00:00\n"
+    assert row_cursor(b"id,total_cost_rub,created_at", "csv") is None
+    assert row_cursor(resumed.strip(), "csv") == (NOW, 3)
+
+
+@pytest.mark.asyncio
+async def test_export_rejects_unknown_format():
+    service = CalcExportService(
+        calc_result_repository=InMemoryCalcResultRepository(ROWS)
+    )
+
+    with pytest.raises(ValueError):
+        await collect(service, export_format="xml")
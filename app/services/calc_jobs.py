@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from app.repositories.calc_job import CalcJobRepository, utcnow
+from app.services.calc import CalcService
+from app.services.calc_engine import TotalCostOverflowError
+from app.services.material_catalog import UnknownMaterialError
+
+log = logging.getLogger(__name__)
+
+JOB_IDEMPOTENCY_KEY_PREFIX = "job:"
+
+
+class JobQueueFullError(RuntimeError):
+    pass
+
+
+class CalcJobService:
+    def __init__(
+        self,
+        *,
+        calc_job_repository: CalcJobRepository,
+        calc_service: CalcService,
+        transaction: Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]],
+        concurrency: int,
+        max_queue_size: int,
+        executor: Executor | None = None,
+        stale_after_seconds: float = 600,
+        recovery_interval_seconds: float = 30,
+    ):
+        self._calc_job_repository = calc_job_repository
+        self._calc_service = calc_service
+        self._save = transaction(calc_service.calculate_and_save)
+        self._concurrency = concurrency
+        self._max_queue_size = max_queue_size
+        self._executor = executor
+        self._stale_after = timedelta(seconds=stale_after_seconds)
+        self._recovery_interval = recovery_interval_seconds
+        self._heartbeat_interval = stale_after_seconds / 3
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._queued: set[int] = set()
+        self._reserved = 0
+        self._running: set[int] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(self._concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._recover_periodically()))
+        self._tasks.append(asyncio.create_task(self._heartbeat_periodically()))
+        log.info(
+            "Очередь расчетов запущена: обработчиков %s, до %s заданий",
+            self._concurrency,
+            self._max_queue_size,
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running:
+            await self._calc_job_repository.release(sorted(self._running))
+            log.info("Прерванные задания возвращены в очередь: %s", len(self._running))
+            self._running.clear()
+        log.info("Очередь расчетов остановлена")
+
+    async def submit(self, materials: list[dict]) -> dict:
+        if len(self._queued) + self._reserved >= self._max_queue_size:
+            raise JobQueueFullError(
+                f"Очередь расчетов заполнена: {self._max_queue_size} заданий"
+            )
+        self._reserved += 1
+        try:
+            job = await self._calc_job_repository.create(materials=materials)
+        finally:
+            self._reserved -= 1
+        self._enqueue(job["id"])
+        return job
+
+    async def get(self, job_id: int) -> dict | None:
+        return await self._calc_job_repository.get(job_id)
+
+    async def recover(self) -> int:
+        now = utcnow()
+        stale = await self._calc_job_repository.requeue_stale(
+            updated_before=now - self._stale_after
+        )
+        if stale:
+            log.warning("Зависшие задания возвращены в очередь: %s", stale)
+        free = self._max_queue_size - len(self._queued) - self._reserved
+        if free <= 0:
+            return 0
+        job_ids = await self._calc_job_repository.queued_ids(
+            updated_before=now - timedelta(seconds=self._recovery_interval),
+            limit=free,
+        )
+        recovered = [job_id for job_id in job_ids if job_id not in self._queued]
+        for job_id in recovered:
+            self._enqueue(job_id)
+        if recovered:
+            log.info("Задания из базы поставлены в очередь: %s", len(recovered))
+        return len(recovered)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queued),
+            "running": len(self._running),
+            "max_queue_size": self._max_queue_size,
+        }
+
+    def _enqueue(self, job_id: int) -> None:
+        self._queued.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _recover_periodically(self) -> None:
+        while True:
+            try:
+                await self.recover()
+            except Exception:
+                log.exception("Не удалось восстановить задания из базы")
+            await asyncio.sleep(self._recovery_interval)
+
+    async def _heartbeat_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            if not self._running:
+                continue
+            try:
+                await self._calc_job_repository.touch(sorted(self._running))
+            except Exception:
+                log.exception("Не удалось продлить выполняемые задания")
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            self._running.add(job_id)
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Не удалось обработать задание %s", job_id)
+            self._running.discard(job_id)
+
+    async def _process(self, job_id: int) -> None:
+        materials = await self._calc_job_repository.claim(job_id)
+        if materials is None:
+            return
+        log.info("Задание %s: начат расчет %s материалов", job_id, len(materials))
+        try:
+            [materials] = await self._calc_service.resolve_prices([materials])
+            result = await self._save(
+                materials,
+                idempotency_key=f"{JOB_IDEMPOTENCY_KEY_PREFIX}{job_id}",
+                executor=self._executor,
+            )
+        except (TotalCostOverflowError, UnknownMaterialError) as exc:
+            await self._calc_job_repository.fail(job_id, str(exc))
+            log.info("Задание %s отклонено: %s", job_id, exc)
+            return
+        except Exception:
+            log.exception("Задание %s завершилось ошибкой", job_id)
+            await self._calc_job_repository.fail(job_id, "Внутренняя ошибка сервиса")
+            return
+        await self._calc_job_repository.complete(job_id, result)
+        log.info("Задание %s выполнено, результат %s", job_id, result["id"])
+
+
+def make_calc_job_service(
+    calc_job_repository: CalcJobRepository,
+    calc_service: CalcService,
+    *,
+    transaction: Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]],
+    concurrency: int,
+    max_queue_size: int,
+    executor: Executor | None = None,
+    stale_after_seconds: float = 600,
+    recovery_interval_seconds: float = 30,
+) -> CalcJobService:
+    return CalcJobService(
+        calc_job_repository=calc_job_repository,
+        calc_service=calc_service,
+        transaction=transaction,
+        concurrency=concurrency,
+        max_queue_size=max_queue_size,
+        executor=executor,
+        stale_after_seconds=stale_after_seconds,
+        recovery_interval_seconds=recovery_interval_seconds,
+    )
@@ -0,0 +1,193 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.repositories.calc_job import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from app.services.calc import CalcService
+from app.services.calc_engine import TotalCostOverflowError
+from app.services.calc_jobs import CalcJobService, JobQueueFullError
+
+
+class InMemoryCalcJobRepository:
+    def __init__(self):
+        self.jobs = {}
+
+    async def create(self, *, materials):
+        job_id = len(self.jobs) + 1
+        self.jobs[job_id] = {
+            "id": job_id,
+            "status": JOB_QUEUED,
+            "materials": materials,
+            "result": None,
+            "error": None,
+        }
+        return {"id": job_id, "status": JOB_QUEUED}
+
+    async def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def claim(self, job_id):
+        job = self.jobs[job_id]
+        if job["status"] != JOB_QUEUED:
+            return None
+        job["status"] = JOB_RUNNING
+        return job["materials"]
+
+    async def complete(self, job_id, result):
+        self.jobs[job_id].update(status=JOB_DONE, result=result)
+
+    async def fail(self, job_id, error):
+        self.jobs[job_id].update(status=JOB_FAILED, error=error)
+
+    async def release(self, job_ids):
+        for job_id in job_ids:
+            self.jobs[job_id]["status"] = JOB_QUEUED
+
+    async def touch(self, job_ids):
+        for job_id in job_ids:
+            self.jobs[job_id]["touched"] = self.jobs[job_id].get("touched", 0) + 1
+
+    async def requeue_stale(self, *, updated_before):
+        return 0
+
+    async def queued_ids(self, *, updated_before, limit):
+        return [i for i, j in self.jobs.items() if j["status"] == JOB_QUEUED][:limit]
+
+
+def dummy_transaction(func):
+    return func
+
+
+def make_service(calc_service, repo=None, **kwargs):
+    options = {"concurrency": 1, "max_queue_size": 10} | kwargs
+    return CalcJobService(
+        calc_job_repository=repo or InMemoryCalcJobRepository(),
+        calc_service=calc_service,
+        transaction=dummy_transaction,
+        **options,
+    )
+
+
+def make_calc_service():
+    calc_service = AsyncMock(spec=CalcService)
+    calc_service.resolve_prices.side_effect = lambda batch: batch
+    return calc_service
+
+
+async def wait_for_status(repo, job_id, status):
+    for _ in range(200):
+        if repo.jobs[job_id]["status"] == status:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(repo.jobs[job_id])
+
+
+@pytest.mark.asyncio
+async def test_submitted_job_is_calculated_with_job_idempotency_key():
+    repo = InMemoryCalcJobRepository()
+    calc_service = make_calc_service()
+    calc_service.calculate_and_save.return_value = {"id": 7}
+    service = make_service(calc_service, repo)
+    service.start()
+
+    job = await service.submit([{"qty": 1, "price_rub": 2}])
+    await wait_for_status(repo, job["id"], JOB_DONE)
+    await service.stop()
+
+    calc_service.calculate_and_save.assert_awaited_once_with(
+        [{"qty": 1, "price_rub": 2}], idempotency_key="job:1", executor=None
+    )
+    assert repo.jobs[1]["result"] == {"id": 7}
+
+
+@pytest.mark.asyncio
+async def test_submit_rejects_when_queue_is_full():
+    service = make_service(make_calc_service(), max_queue_size=2)
+
+    await service.submit([{"qty": 1, "price_rub": 1}])
+    await service.submit([{"qty": 1, "price_rub": 1}])
+    with pytest.raises(JobQueueFullError):
+        await service.submit([{"qty": 1, "price_rub": 1}])
+
+    assert service.stats() == {"queued": 2, "running": 0, "max_queue_size": 2}
+
+
+@pytest.mark.asyncio
+async def test_calculation_error_marks_job_failed():
+    repo = InMemoryCalcJobRepository()
+    calc_service = make_calc_service()
+    calc_service.calculate_and_save.side_effect = TotalCostOverflowError("overflow")
+    service = make_service(calc_service, repo)
+    service.start()
+
+    job = await service.submit([{"qty": 1, "price_rub": 1}])
+    await wait_for_status(repo, job["id"], JOB_FAILED)
+    await service.stop()
+
+    assert repo.jobs[1]["error"] == "overflow"
+
+
+@pytest.mark.asyncio
+async def test_stop_returns_running_job_to_queue_and_recover_resumes_it():
+    repo = InMemoryCalcJobRepository()
+    calc_service = make_calc_service()
+    started = asyncio.Event()
+
+    async def slow_save(materials, idempotency_key, executor):
+        started.set()
+        await asyncio.sleep(60)
+
+    calc_service.calculate_and_save.side_effect = slow_save
+    service = make_service(calc_service, repo)
+    service.start()
+    job = await service.submit([{"qty": 1, "price_rub": 1}])
+    await started.wait()
+    await service.stop()
+
+    assert repo.jobs[job["id"]]["status"] == JOB_QUEUED
+
+    calc_service.calculate_and_save.side_effect = None
+    calc_service.calculate_and_save.return_value = {"id": 3}
+    restarted = make_service(calc_service, repo)
+    restarted.start()
+    await wait_for_status(repo, job["id"], JOB_DONE)
+    await restarted.stop()
+
+
+@pytest.mark.asyncio
+async def test_recover_skips_jobs_already_in_local_queue():
+    repo = InMemoryCalcJobRepository()
+    service = make_service(make_calc_service(), repo)
+
+    await service.submit([{"qty": 1, "price_rub": 1}])
+    await repo.create(materials=[{"qty": 1, "price_rub": 1}])
+
+    assert await service.recover() == 1
+    assert service.stats()["queued"] == 2
+
+
+@pytest.mark.asyncio
+async def test_running_job_is_touched_until_it_finishes():
+    repo = InMemoryCalcJobRepository()
+    calc_service = make_calc_service()
+    release = asyncio.Event()
+
+    async def slow_save(materials, idempotency_key, executor):
+        await release.wait()
+        return {"id": 5}
+
+    calc_service.calculate_and_save.side_effect = slow_save
+    service = make_service(calc_service, repo, stale_after_seconds=0.03)
+    service.start()
+    job = await service.submit([{"qty": 1, "price_rub": 1}])
+    await wait_for_status(repo, job["id"], JOB_RUNNING)
+    await asyncio.sleep(0.1)
+    touched = repo.jobs[job["id"]].get("touched", 0)
+    release.set()
+    await wait_for_status(repo, job["id"], JOB_DONE)
+    await asyncio.sleep(0.05)
+    await service.stop()
+
+    assert touched >= 2
+    assert repo.jobs[job["id"]]["touched"] <= touched + 1
@@ -1,10 +1,14 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from decimal import Decimal
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
 from app.repositories.calc_result import CalcResultRepository
-from app.services.calc import CalcService
+from app.services.calc import CalcService, InvalidCursorError, decode_cursor
+from app.services.calc_engine import TotalCostOverflowError
+from app.services.material_catalog import MaterialCatalogService, UnknownMaterialError
 
 
 @pytest.mark.asyncio
@@ -21,7 +25,9 @@ async def test_calculate_and_save():
 
     result = await service.calculate_and_save(materials)
 
-    mock_repo.insert.assert_awaited_once_with(total_cost_rub=200)
+    mock_repo.insert.assert_awaited_once_with(
+        total_cost_rub=200, idempotency_key=None, items=materials
+    )
     assert result == {"id": 1, "total_cost_rub": Decimal("200.0")}
 
 
@@ -34,5 +40,226 @@ async def test_calculate_and_save_empty_materials():
 
     result = await service.calculate_and_save([])
 
-    mock_repo.insert.assert_awaited_once_with(total_cost_rub=0)
+    mock_repo.insert.assert_awaited_once_with(
+        total_cost_rub=0, idempotency_key=None, items=[]
+    )
     assert result == {"id": 1, "total_cost_rub": Decimal("0.0")}
+
+
+@pytest.mark.asyncio
+async def test_calculate_and_save_resolves_catalog_prices():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    mock_repo.insert.return_value = {"id": 1, "total_cost_rub": Decimal("250")}
+    catalog = AsyncMock(spec=MaterialCatalogService)
+    catalog.resolve_prices.return_value = [
+        [{"id": 3, "qty": 2, "price_rub": Decimal("100")}, {"qty": 1, "price_rub": 50}]
+    ]
+
+    service = CalcService(calc_result_repository=mock_repo, material_catalog=catalog)
+
+    await service.calculate_and_save([{"id": 3, "qty": 2}, {"qty": 1, "price_rub": 50}])
+
+    mock_repo.insert.assert_awaited_once_with(
+        total_cost_rub=250,
+        idempotency_key=None,
+        items=catalog.resolve_prices.return_value[0],
+    )
+
+
+@pytest.mark.asyncio
+async def test_calculate_and_save_requires_prices_without_catalog():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    with pytest.raises(UnknownMaterialError):
+        await service.calculate_and_save([{"id": 3, "qty": 2}])
+    mock_repo.insert.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_calculate_and_save_sums_in_process_pool():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    mock_repo.insert.return_value = {"id": 1}
+    service = CalcService(calc_result_repository=mock_repo)
+    materials = [{"qty": Decimal("2.5"), "price_rub": Decimal("10")}]
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        await service.calculate_and_save(materials, executor=executor)
+
+    mock_repo.insert.assert_awaited_once_with(
+        total_cost_rub=Decimal("25.00"), idempotency_key=None, items=materials
+    )
+
+
+@pytest.mark.asyncio
+async def test_calculate_many_and_save():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    mock_repo.insert_many.return_value = [
+        {"id": 1, "total_cost_rub": Decimal("200.0")},
+        {"id": 2, "total_cost_rub": Decimal("15.0")},
+    ]
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    batch = [
+        [{"qty": 2, "price_rub": 50}, {"qty": 1, "price_rub": 100}],
+        [{"qty": 3, "price_rub": 5}],
+    ]
+
+    result = await service.calculate_many_and_save(batch)
+
+    mock_repo.insert_many.assert_awaited_once_with(
+        total_costs_rub=[200, 15], items=batch
+    )
+    assert [r["id"] for r in result] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_calculate_stream_and_save():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    stored = []
+
+    async def insert_streamed(*, items, total_cost_rub):
+        async for m in items:
+            stored.append(m)
+        return {"id": 1, "total_cost_rub": total_cost_rub()}
+
+    mock_repo.insert_streamed.side_effect = insert_streamed
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    lines = [
+        {"name": "Сталь", "qty": Decimal("2"), "price_rub": Decimal("50")},
+        {"id": 7, "qty": Decimal("0.5"), "price_rub": Decimal("201")},
+    ]
+
+    async def materials():
+        for line in lines:
+            yield line
+
+    result = await service.calculate_stream_and_save(materials())
+
+    mock_repo.insert.assert_not_awaited()
+    assert stored == lines
+    assert result == {"id": 1, "total_cost_rub": Decimal("200.50")}
+
+
+@pytest.mark.asyncio
+async def test_calculate_stream_and_save_rejects_total_overflow():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+
+    async def insert_streamed(*, items, total_cost_rub):
+        async for _ in items:
+            pass
+        return {"id": 1, "total_cost_rub": total_cost_rub()}
+
+    mock_repo.insert_streamed.side_effect = insert_streamed
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    async def materials():
+        yield {"qty": Decimal("100000"), "price_rub": Decimal("100000")}
+
+    with pytest.raises(TotalCostOverflowError):
+        await service.calculate_stream_and_save(materials())
+
+
+@pytest.mark.asyncio
+async def test_calculate_and_save_rejects_total_overflow():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    with pytest.raises(TotalCostOverflowError):
+        await service.calculate_and_save(
+            [{"qty": Decimal("100000"), "price_rub": Decimal("100000")}]
+        )
+
+    mock_repo.insert.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_calculate_and_save_uses_configured_engine():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    engine = MagicMock()
+    engine.total.return_value = Decimal("42")
+
+    service = CalcService(calc_result_repository=mock_repo, calc_engine=engine)
+    await service.calculate_and_save([{"qty": 1, "price_rub": 1}])
+
+    engine.total.assert_called_once_with([{"qty": 1, "price_rub": 1}])
+    mock_repo.insert.assert_awaited_once_with(
+        total_cost_rub=Decimal("42"),
+        idempotency_key=None,
+        items=[{"qty": 1, "price_rub": 1}],
+    )
+
+
+@pytest.mark.asyncio
+async def test_calculate_and_save_passes_idempotency_key():
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    mock_repo.insert.return_value = {"id": 1, "total_cost_rub": Decimal("2")}
+
+    service = CalcService(calc_result_repository=mock_repo)
+    await service.calculate_and_save(
+        [{"qty": 1, "price_rub": 2}], idempotency_key="key:abc"
+    )
+
+    mock_repo.insert.assert_awaited_once_with(
+        total_cost_rub=2, idempotency_key="key:abc", items=[{"qty": 1, "price_rub": 2}]
+    )
+
+
+@pytest.mark.asyncio
+async def test_list_results_returns_cursor_only_when_more_rows_exist():
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = [{"id": i, "created_at": created_at} for i in (1, 2, 3)]
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    mock_repo.list_page.return_value = rows
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    page = await service.list_results(limit=2)
+
+    mock_repo.list_page.assert_awaited_once_with(
+        limit=3, after=None, created_from=None, created_to=None
+    )
+    assert page["items"] == rows[:2]
+    assert decode_cursor(page["next_cursor"]) == (created_at, 2)
+
+    mock_repo.list_page.return_value = rows[2:]
+    page = await service.list_results(limit=2, cursor=page["next_cursor"])
+
+    assert mock_repo.list_page.await_args.kwargs["after"] == (created_at, 2)
+    assert page == {"items": rows[2:], "next_cursor": None}
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_stats_computes_average_from_rollups():
+    bucket = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    mock_repo = AsyncMock(spec=CalcResultRepository)
+    mock_repo.list_rollups.return_value = [
+        {"bucket": bucket, "count": Decimal(3), "total_cost_rub": Decimal("100.00")}
+    ]
+
+    service = CalcService(calc_result_repository=mock_repo)
+
+    result = await service.stats(bucket="day", created_from=bucket)
+
+    mock_repo.list_rollups.assert_awaited_once_with(
+        granularity="day", created_from=bucket, created_to=None
+    )
+    assert result == [
+        {
+            "bucket": bucket,
+            "count": 3,
+            "total_cost_rub": Decimal("100.00"),
+            "avg_cost_rub": Decimal("33.33"),
+        }
+    ]
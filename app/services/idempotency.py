@@ -0,0 +1,48 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from app.cache.lru_ttl_cache import LRUTTLCache
+
+HEADER_KEY_PREFIX = "key:"
+FINGERPRINT_PREFIX = "sha256:"
+
+
+def _material_key(m: dict) -> tuple:
+    key = (
+        m.get("name", ""),
+        f"{Decimal(m['qty']).normalize():f}",
+        f"{Decimal(m['price_rub']).normalize():f}",
+    )
+    if m.get("id") is not None:
+        key += (f"#{m['id']}",)
+    return key
+
+
+def materials_fingerprint(materials: list[dict]) -> str:
+    canonical = sorted(_material_key(m) for m in materials)
+    payload = json.dumps(canonical, ensure_ascii=False, separators=(",", ":"))
+    return FINGERPRINT_PREFIX + hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyService:
+    def __init__(self, *, cache: LRUTTLCache):
+        self._cache = cache
+
+    def make_key(self, idempotency_key: str | None, materials: list[dict]) -> str:
+        if idempotency_key:
+            return HEADER_KEY_PREFIX + idempotency_key
+        return materials_fingerprint(materials)
+
+    def get(self, key: str) -> dict | None:
+        return self._cache.get(key)
+
+    def remember(self, key: str, result: dict) -> None:
+        self._cache.put(key, result)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def make_idempotency_service(cache: LRUTTLCache) -> IdempotencyService:
+    return IdempotencyService(cache=cache)
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.services.idempotency import IdempotencyService, materials_fingerprint
+
+
+def test_fingerprint_ignores_order_and_decimal_representation():
+    first = [
+        {"name": "Сталь", "qty": Decimal("10"), "price_rub": Decimal("100.50")},
+        {"name": "Медь", "qty": Decimal("5"), "price_rub": Decimal("101")},
+    ]
+    second = [
+        {"name": "Медь", "qty": Decimal("5.0"), "price_rub": Decimal("101")},
+        {"name": "Сталь", "qty": Decimal("10.000"), "price_rub": Decimal("100.5")},
+    ]
+
+    assert materials_fingerprint(first) == materials_fingerprint(second)
+    assert materials_fingerprint(first).startswith("sha256:")
+
+
+def test_fingerprint_depends_on_content():
+    first = [{"name": "Сталь", "qty": Decimal("10"), "price_rub": Decimal("100")}]
+    second = [{"name": "Сталь", "qty": Decimal("11"), "price_rub": Decimal("100")}]
+
+    assert materials_fingerprint(first) != materials_fingerprint(second)
+
+
+def test_fingerprint_distinguishes_catalog_ids():
+    first = [{"id": 1, "qty": Decimal("1"), "price_rub": Decimal("100")}]
+    second = [{"id": 2, "qty": Decimal("1"), "price_rub": Decimal("100")}]
+
+    assert materials_fingerprint(first) != materials_fingerprint(second)
+
+
+def test_make_key_prefers_header():
+    service = IdempotencyService(cache=LRUTTLCache(max_size=10))
+    materials = [{"name": "Сталь", "qty": 1, "price_rub": 1}]
+
+    assert service.make_key("abc", materials) == "key:abc"
+    assert service.make_key(None, materials) == materials_fingerprint(materials)
+
+
+def test_remember_and_get_update_stats():
+    service = IdempotencyService(cache=LRUTTLCache(max_size=10))
+
+    assert service.get("key:abc") is None
+    service.remember("key:abc", {"id": 1})
+    assert service.get("key:abc") == {"id": 1}
+
+    stats = service.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,86 @@
+import logging
+
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.repositories.material import MaterialRepository
+
+log = logging.getLogger(__name__)
+
+
+class UnknownMaterialError(LookupError):
+    pass
+
+
+def _cache_key(material: dict) -> tuple[str, int | str]:
+    if material.get("id") is not None:
+        return ("id", material["id"])
+    return ("name", material["name"])
+
+
+class MaterialCatalogService:
+    def __init__(self, *, material_repository: MaterialRepository, cache: LRUTTLCache):
+        self._material_repository = material_repository
+        self._cache = cache
+        self._generation = 0
+
+    async def resolve_prices(self, batch: list[list[dict]]) -> list[list[dict]]:
+        if all(m.get("price_rub") is not None for ms in batch for m in ms):
+            return batch
+
+        resolved = [list(materials) for materials in batch]
+        pending: list[tuple[int, int, tuple]] = []
+        for i, materials in enumerate(batch):
+            for j, material in enumerate(materials):
+                if material.get("price_rub") is not None:
+                    continue
+                key = _cache_key(material)
+                entry = self._cache.get(key)
+                if entry is None:
+                    pending.append((i, j, key))
+                else:
+                    resolved[i][j] = {**material, "price_rub": entry["price_rub"]}
+        if not pending:
+            return resolved
+
+        generation = self._generation
+        keys = {key for _, _, key in pending}
+        rows = await self._material_repository.get_many(
+            ids=sorted(value for kind, value in keys if kind == "id"),
+            names=sorted(value for kind, value in keys if kind == "name"),
+        )
+        found = {}
+        for row in rows:
+            found[("id", row["id"])] = row
+            found[("name", row["name"])] = row
+        if generation == self._generation:
+            for key, row in found.items():
+                self._cache.put(key, row)
+
+        missing = sorted({str(key[1]) for key in keys if key not in found})
+        if missing:
+            raise UnknownMaterialError(
+                f"Материалы не найдены в каталоге: {', '.join(missing)}"
+            )
+        for i, j, key in pending:
+            resolved[i][j] = {**batch[i][j], "price_rub": found[key]["price_rub"]}
+        return resolved
+
+    def invalidate(self, material_id: int, name: str | None = None) -> None:
+        self._generation += 1
+        self._cache.invalidate(("id", material_id))
+        if name is not None:
+            self._cache.invalidate(("name", name))
+        log.info("Цена материала %s сброшена из кэша", material_id)
+
+    def invalidate_all(self) -> None:
+        self._generation += 1
+        self._cache.clear()
+        log.info("Кэш каталога материалов очищен")
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def make_material_catalog_service(
+    material_repository: MaterialRepository, cache: LRUTTLCache
+) -> MaterialCatalogService:
+    return MaterialCatalogService(material_repository=material_repository, cache=cache)
@@ -0,0 +1,99 @@
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.cache.lru_ttl_cache import LRUTTLCache
+from app.repositories.material import MaterialRepository
+from app.services.material_catalog import MaterialCatalogService, UnknownMaterialError
+
+STEEL = {"id": 1, "name": "Сталь", "price_rub": Decimal("100")}
+COPPER = {"id": 2, "name": "Медь", "price_rub": Decimal("500")}
+
+
+def make_service(rows):
+    repo = AsyncMock(spec=MaterialRepository)
+    repo.get_many.return_value = rows
+    return repo, MaterialCatalogService(
+        material_repository=repo, cache=LRUTTLCache(max_size=100)
+    )
+
+
+@pytest.mark.asyncio
+async def test_resolve_prices_uses_one_lookup_per_batch_and_caches():
+    repo, service = make_service([STEEL, COPPER])
+    batch = [
+        [{"id": 1, "qty": 2}, {"name": "Медь", "qty": 1}],
+        [{"name": "Бетон", "qty": 1, "price_rub": Decimal("7")}, {"id": 1, "qty": 3}],
+    ]
+
+    first = await service.resolve_prices(batch)
+    second = await service.resolve_prices([[{"name": "Сталь", "qty": 1}]])
+
+    repo.get_many.assert_awaited_once_with(ids=[1], names=["Медь"])
+    assert first == [
+        [
+            {"id": 1, "qty": 2, "price_rub": Decimal("100")},
+            {"name": "Медь", "qty": 1, "price_rub": Decimal("500")},
+        ],
+        [
+            {"name": "Бетон", "qty": 1, "price_rub": Decimal("7")},
+            {"id": 1, "qty": 3, "price_rub": Decimal("100")},
+        ],
+    ]
+    assert second == [[{"name": "Сталь", "qty": 1, "price_rub": Decimal("100")}]]
+    assert batch[0][0] == {"id": 1, "qty": 2}
+
+
+@pytest.mark.asyncio
+async def test_resolve_prices_skips_lookup_when_prices_given():
+    repo, service = make_service([])
+    batch = [[{"name": "Сталь", "qty": 1, "price_rub": Decimal("1")}]]
+
+    assert await service.resolve_prices(batch) is batch
+    repo.get_many.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_resolve_prices_reports_unknown_materials():
+    _, service = make_service([STEEL])
+
+    with pytest.raises(UnknownMaterialError, match="42, Дерево"):
+        await service.resolve_prices(
+            [[{"id": 1, "qty": 1}, {"id": 42, "qty": 1}, {"name": "Дерево", "qty": 1}]]
+        )
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_new_lookup():
+    repo, service = make_service([STEEL])
+    await service.resolve_prices([[{"id": 1, "qty": 1}]])
+
+    repo.get_many.return_value = [{**STEEL, "price_rub": Decimal("120")}]
+    service.invalidate(1, "Сталь")
+    [[material]] = await service.resolve_prices([[{"name": "Сталь", "qty": 1}]])
+
+    assert material["price_rub"] == Decimal("120")
+    assert repo.get_many.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_lookup_is_not_overwritten():
+    repo, service = make_service([])
+    lookup_started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def get_many(*, ids, names):
+        lookup_started.set()
+        await release.wait()
+        return [STEEL]
+
+    repo.get_many.side_effect = get_many
+    task = asyncio.create_task(service.resolve_prices([[{"id": 1, "qty": 1}]]))
+    await lookup_started.wait()
+    service.invalidate(1, "Сталь")
+    release.set()
+    await task
+
+    assert service.stats()["size"] == 0
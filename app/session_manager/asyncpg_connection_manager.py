@@ -0,0 +1,99 @@
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable
+
+import asyncpg
+from asyncpg.transaction import Transaction
+
+log = logging.getLogger(__name__)
+
+
+class _TransactionState:
+    def __init__(self):
+        self.connection: asyncpg.Connection | None = None
+        self.transaction: Transaction | None = None
+
+
+class AsyncpgConnectionManager:
+    def __init__(
+        self,
+        *,
+        pool: asyncpg.Pool,
+        connection_ctx: ContextVar[asyncpg.Connection | None],
+    ):
+        self.pool = pool
+        self.connection_ctx = connection_ctx
+        self._after_commit: dict[asyncpg.Connection, list[Callable[[], None]]] = {}
+
+    def after_commit(
+        self, connection: asyncpg.Connection, callback: Callable[[], None]
+    ) -> None:
+        self._after_commit.setdefault(connection, []).append(callback)
+
+    def _run_after_commit(self, connection: asyncpg.Connection) -> None:
+        for callback in self._after_commit.pop(connection, ()):
+            callback()
+
+    @asynccontextmanager
+    async def get_connection(self):
+        parent = self.connection_ctx.get()
+        if parent is None:
+            connection = await self.pool.acquire()
+            log.info("Получено локальное соединение asyncpg")
+            try:
+                async with connection.transaction():
+                    yield connection
+                log.info("Локальное соединение asyncpg: commit")
+                self._run_after_commit(connection)
+            finally:
+                self._after_commit.pop(connection, None)
+                await self.pool.release(connection)
+            return
+
+        if isinstance(parent, _TransactionState):
+            if parent.connection is None:
+                parent.connection = await self.pool.acquire()
+                transaction = parent.connection.transaction()
+                await transaction.start()
+                parent.transaction = transaction
+                log.info("Соединение asyncpg получено при первом обращении")
+            parent = parent.connection
+
+        log.info("Используется существующее соединение asyncpg из контекста")
+        yield parent
+
+    def transaction(self, func: Any):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            log.info("Начало транзакции asyncpg для функции %s", func.__name__)
+            state = _TransactionState()
+            token = self.connection_ctx.set(state)
+            try:
+                result = await func(*args, **kwargs)
+                if state.transaction is not None:
+                    await state.transaction.commit()
+                    log.info("Транзакция asyncpg: commit")
+                    self._run_after_commit(state.connection)
+                return result
+            except Exception as exc:
+                if state.transaction is not None:
+                    await state.transaction.rollback()
+                    log.info("Транзакция asyncpg: rollback из-за ошибки: %s", exc)
+                raise
+            finally:
+                if state.connection is not None:
+                    self._after_commit.pop(state.connection, None)
+                    await self.pool.release(state.connection)
+                    log.info("Соединение asyncpg возвращено в пул")
+                self.connection_ctx.reset(token)
+
+        return wrapper
+
+
+def make_asyncpg_connection_manager(
+    pool: asyncpg.Pool,
+    connection_ctx: ContextVar[asyncpg.Connection | None],
+) -> AsyncpgConnectionManager:
+    return AsyncpgConnectionManager(pool=pool, connection_ctx=connection_ctx)
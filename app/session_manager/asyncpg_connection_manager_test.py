@@ -0,0 +1,164 @@
+from contextvars import ContextVar
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.session_manager.asyncpg_connection_manager import AsyncpgConnectionManager
+
+
+class FakeTransaction:
+    def __init__(self, events):
+        self.events = events
+
+    async def start(self):
+        self.events.append("begin")
+
+    async def commit(self):
+        self.events.append("commit")
+
+    async def rollback(self):
+        self.events.append("rollback")
+
+    async def __aenter__(self):
+        await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await (self.rollback() if exc_type else self.commit())
+
+
+class FakeConnection:
+    def __init__(self):
+        self.events = []
+
+    def transaction(self):
+        return FakeTransaction(self.events)
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        return self.connection
+
+    async def release(self, connection):
+        self.acquired -= 1
+
+
+def make_manager(connection):
+    pool = FakePool(connection)
+    ctx = ContextVar("ctx", default=None)
+    return AsyncpgConnectionManager(pool=pool, connection_ctx=ctx), pool, ctx
+
+
+@pytest.mark.asyncio
+async def test_get_connection_acquires_and_commits():
+    connection = FakeConnection()
+    manager, pool, _ = make_manager(connection)
+
+    async with manager.get_connection() as conn:
+        assert conn is connection
+        assert connection.events == ["begin"]
+        assert pool.acquired == 1
+
+    assert connection.events == ["begin", "commit"]
+    assert pool.acquired == 0
+
+
+@pytest.mark.asyncio
+async def test_get_connection_uses_existing_connection():
+    connection = FakeConnection()
+    pool = MagicMock()
+    ctx = ContextVar("ctx", default=None)
+    token = ctx.set(connection)
+
+    manager = AsyncpgConnectionManager(pool=pool, connection_ctx=ctx)
+
+    async with manager.get_connection() as conn:
+        assert conn is connection
+
+    pool.acquire.assert_not_called()
+    assert connection.events == []
+    ctx.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_transaction_acquires_connection_lazily_and_commits():
+    connection = FakeConnection()
+    manager, pool, ctx = make_manager(connection)
+    observed = {}
+
+    @manager.transaction
+    async def func():
+        observed["before"] = pool.acquired
+        async with manager.get_connection() as first:
+            pass
+        async with manager.get_connection() as second:
+            pass
+        return first, second
+
+    first, second = await func()
+
+    assert first is second is connection
+    assert observed["before"] == 0
+    assert connection.events == ["begin", "commit"]
+    assert pool.acquired == 0
+    assert ctx.get() is None
+
+
+@pytest.mark.asyncio
+async def test_transaction_rolls_back_on_exception():
+    connection = FakeConnection()
+    manager, pool, ctx = make_manager(connection)
+
+    @manager.transaction
+    async def func():
+        async with manager.get_connection():
+            raise ValueError("fail")
+
+    with pytest.raises(ValueError):
+        await func()
+
+    assert connection.events == ["begin", "rollback"]
+    assert pool.acquired == 0
+    assert ctx.get() is None
+
+
+@pytest.mark.asyncio
+async def test_transaction_without_database_work_does_not_acquire_connection():
+    connection = FakeConnection()
+    manager, pool, _ = make_manager(connection)
+
+    @manager.transaction
+    async def func():
+        raise ValueError("invalid input")
+
+    with pytest.raises(ValueError):
+        await func()
+
+    assert connection.events == []
+    assert pool.acquired == 0
+
+
+@pytest.mark.asyncio
+async def test_after_commit_callbacks_run_only_on_commit():
+    connection = FakeConnection()
+    manager, _, _ = make_manager(connection)
+    committed = []
+
+    @manager.transaction
+    async def func(fail):
+        async with manager.get_connection() as conn:
+            manager.after_commit(conn, lambda: committed.append(fail))
+        if fail:
+            raise ValueError("fail")
+
+    with pytest.raises(ValueError):
+        await func(True)
+    await func(False)
+    async with manager.get_connection() as conn:
+        manager.after_commit(conn, lambda: committed.append("local"))
+
+    assert committed == [False, "local"]
@@ -1,13 +1,30 @@
+import itertools
 import logging
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 from contextvars import ContextVar
 from functools import wraps
-from typing import Any
+from typing import Any, Callable
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.metrics.metrics import Metrics
 
 log = logging.getLogger(__name__)
 
+REPLICA_ROUTING_STRATEGIES = ("round_robin", "least_busy")
+AFTER_COMMIT_KEY = "after_commit"
+
+
+class ReadOnlyTransactionError(RuntimeError):
+    pass
+
+
+class _TransactionState:
+    def __init__(self, read_only: bool = False):
+        self.read_only = read_only
+        self.session: AsyncSession | None = None
+        self.replica: int | None = None
+
 
 class SessionManager:
     def __init__(
@@ -15,64 +32,155 @@ class SessionManager:
         *,
         session_factory: async_sessionmaker[AsyncSession],
         session_ctx: ContextVar[AsyncSession | None],
+        metrics: Metrics | None = None,
+        replica_session_factories: list[async_sessionmaker[AsyncSession]] = (),
+        replica_routing: str = "round_robin",
     ):
+        if replica_routing not in REPLICA_ROUTING_STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия выбора реплики: {replica_routing}")
         self.session_factory = session_factory
         self.session_ctx = session_ctx
+        self.metrics = metrics
+        self.replica_session_factories = list(replica_session_factories)
+        self.replica_routing = replica_routing
+        self.replica_sessions = [0] * len(self.replica_session_factories)
+        self._round_robin = itertools.count()
+        self._primary_pinned: ContextVar[bool] = ContextVar(
+            "primary_pinned", default=False
+        )
+
+    def pin_primary(self) -> None:
+        self._primary_pinned.set(True)
+
+    def _open_session(self, read_only: bool) -> tuple[AsyncSession, int | None]:
+        if (
+            not read_only
+            or not self.replica_session_factories
+            or self._primary_pinned.get()
+        ):
+            return self.session_factory(), None
+        replicas = len(self.replica_session_factories)
+        offset = next(self._round_robin)
+        replica = offset % replicas
+        if self.replica_routing == "least_busy":
+            replica = min(
+                ((offset + i) % replicas for i in range(replicas)),
+                key=self.replica_sessions.__getitem__,
+            )
+        self.replica_sessions[replica] += 1
+        log.info("Сессия только для чтения направлена на реплику %s", replica)
+        return self.replica_session_factories[replica](), replica
+
+    async def _close_session(self, session: AsyncSession, replica: int | None) -> None:
+        try:
+            await session.close()
+        finally:
+            if replica is not None:
+                self.replica_sessions[replica] -= 1
 
     @asynccontextmanager
-    async def get_session(self):
+    async def get_session(self, read_only: bool = False):
         parent = self.session_ctx.get()
         if parent is None:
-            session = self.session_factory()
+            session, replica = self._open_session(read_only)
             log.info("Создана локальная сессия")
             try:
                 yield session
-                await session.commit()
+                await self._commit(session)
                 log.info("Локальная сессия: commit")
+                if not read_only:
+                    self.pin_primary()
             except Exception as exc:
                 await session.rollback()
                 log.info("Локальная сессия: rollback из-за ошибки: %s", exc)
                 raise
             finally:
-                await session.close()
+                await self._close_session(session, replica)
                 log.info("Локальная сессия закрыта")
             return
 
+        if isinstance(parent, _TransactionState):
+            if parent.read_only and not read_only:
+                raise ReadOnlyTransactionError(
+                    "Сессия для записи запрошена внутри транзакции только для чтения"
+                )
+            if parent.session is None:
+                parent.session, parent.replica = self._open_session(parent.read_only)
+                log.info("Транзакционная сессия создана при первом обращении")
+            parent = parent.session
+
         log.info("Используется существующая сессия из контекста")
         try:
             yield parent
         except Exception:
             raise
 
+    def after_commit(self, session: AsyncSession, callback: Callable[[], None]) -> None:
+        session.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+
     def transaction(self, func: Any):
+        return self._transaction(func, read_only=False)
+
+    def read_only_transaction(self, func: Any):
+        return self._transaction(func, read_only=True)
+
+    def _transaction(self, func: Any, *, read_only: bool):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             log.info("Начало транзакции для функции %s", func.__name__)
-            session = self.session_factory()
-            token = self.session_ctx.set(session)
+            state = _TransactionState(read_only=read_only)
+            token = self.session_ctx.set(state)
 
             try:
                 result = await func(*args, **kwargs)
-                await session.commit()
-                log.info("Транзакционная сессия: commit")
+                if state.session is not None:
+                    await self._commit(state.session)
+                    log.info("Транзакционная сессия: commit")
+                    if not read_only:
+                        self.pin_primary()
                 return result
             except Exception as exc:
-                await session.rollback()
-                log.info("Транзакционная сессия: rollback из-за ошибки: %s", exc)
+                if state.session is not None:
+                    await state.session.rollback()
+                    log.info("Транзакционная сессия: rollback из-за ошибки: %s", exc)
                 raise
             finally:
-                await session.close()
+                if state.session is not None:
+                    await self._close_session(state.session, state.replica)
+                    log.info("Транзакционная сессия закрыта")
                 self.session_ctx.reset(token)
-                log.info("Транзакционная сессия: закрыта, контекст сброшен")
+                log.info("Контекст транзакции сброшен")
 
         return wrapper
 
+    async def _commit(self, session: AsyncSession) -> None:
+        if self.metrics is None:
+            await session.commit()
+        else:
+            with self.metrics.stage("commit"):
+                await session.commit()
+        for callback in session.info.pop(AFTER_COMMIT_KEY, ()):
+            callback()
+
 
 def make_session_manager(
     session_factory: async_sessionmaker[AsyncSession],
     session_ctx: ContextVar[AsyncSession | None],
+    metrics: Metrics | None = None,
+    replica_session_factories: list[async_sessionmaker[AsyncSession]] = (),
+    replica_routing: str = "round_robin",
 ) -> SessionManager:
     return SessionManager(
         session_factory=session_factory,
         session_ctx=session_ctx,
+        metrics=metrics,
+        replica_session_factories=replica_session_factories,
+        replica_routing=replica_routing,
     )
+
+
+async def warm_up_engine(engine: AsyncEngine, connections: int) -> None:
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            await stack.enter_async_context(engine.connect())
+    log.info("Пул соединений прогрет: %s", connections)
@@ -1,10 +1,19 @@
+import asyncio
 from contextvars import ContextVar
+from decimal import Decimal
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.session_manager.session_manager import SessionManager
+from app.repositories.calc_result import CalcResultRepository
+from app.repositories.models.base import Base
+from app.session_manager.session_manager import (
+    ReadOnlyTransactionError,
+    SessionManager,
+    warm_up_engine,
+)
 
 
 @pytest.mark.asyncio
@@ -55,15 +64,42 @@ async def test_transaction_method_commits():
     @transaction_decorator
     async def func(x):
         called["x"] = x
+        async with manager.get_session() as first:
+            pass
+        async with manager.get_session() as second:
+            pass
+        assert first is second is session_mock
         return x * 2
 
     result = await func(5)
     assert result == 10
     assert called["x"] == 5
+    session_factory.assert_called_once()
     session_mock.commit.assert_awaited_once()
     session_mock.close.assert_awaited_once()
 
 
+@pytest.mark.asyncio
+async def test_transaction_commit_is_observed_as_stage():
+    session_mock = AsyncMock(spec=AsyncSession)
+    metrics = MagicMock()
+    manager = SessionManager(
+        session_factory=MagicMock(return_value=session_mock),
+        session_ctx=ContextVar("session_ctx", default=None),
+        metrics=metrics,
+    )
+
+    @manager.transaction
+    async def func():
+        async with manager.get_session():
+            pass
+
+    await func()
+
+    metrics.stage.assert_called_once_with("commit")
+    session_mock.commit.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_transaction_method_rollbacks_on_exception():
     session_mock = AsyncMock(spec=AsyncSession)
@@ -75,10 +111,179 @@ async def test_transaction_method_rollbacks_on_exception():
 
     @transaction_decorator
     async def func():
-        raise ValueError("fail")
+        async with manager.get_session():
+            raise ValueError("fail")
 
     with pytest.raises(ValueError):
         await func()
 
     session_mock.rollback.assert_awaited_once()
     session_mock.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_transaction_without_database_work_does_not_create_session():
+    session_factory = MagicMock()
+    ctx = ContextVar("session_ctx", default=None)
+
+    manager = SessionManager(session_factory=session_factory, session_ctx=ctx)
+
+    @manager.transaction
+    async def func():
+        raise ValueError("invalid input")
+
+    with pytest.raises(ValueError):
+        await func()
+
+    session_factory.assert_not_called()
+    assert ctx.get() is None
+
+
+@pytest.mark.asyncio
+async def test_transaction_holds_connection_only_during_database_work():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    checked_out = []
+    event.listen(engine.sync_engine, "checkout", lambda *a: checked_out.append(1))
+    event.listen(engine.sync_engine, "checkin", lambda *a: checked_out.pop())
+
+    manager = SessionManager(
+        session_factory=async_sessionmaker(bind=engine, expire_on_commit=False),
+        session_ctx=ContextVar("session_ctx", default=None),
+    )
+    observed = {}
+
+    @manager.transaction
+    async def func():
+        await asyncio.sleep(0)
+        observed["before"] = len(checked_out)
+        async with manager.get_session() as session:
+            observed["on_open"] = len(checked_out)
+            await session.execute(text("SELECT 1"))
+            observed["during"] = len(checked_out)
+
+    await func()
+    observed["after"] = len(checked_out)
+    await engine.dispose()
+
+    assert observed == {"before": 0, "on_open": 0, "during": 1, "after": 0}
+
+
+@pytest.mark.asyncio
+async def test_warm_up_engine_leaves_connections_in_pool(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'warmup.sqlite'}")
+    connects = []
+    event.listen(engine.sync_engine, "connect", lambda *a: connects.append(1))
+
+    await warm_up_engine(engine, 3)
+    checked_in = engine.pool.checkedin()
+    async with engine.connect():
+        pass
+    await engine.dispose()
+
+    assert checked_in == 3
+    assert len(connects) == 3
+
+
+def make_replicated_manager(replicas, replica_routing="round_robin"):
+    return SessionManager(
+        session_factory=MagicMock(side_effect=lambda: AsyncMock(spec=AsyncSession)),
+        session_ctx=ContextVar("session_ctx", default=None),
+        replica_session_factories=[
+            MagicMock(side_effect=lambda: AsyncMock(spec=AsyncSession))
+            for _ in range(replicas)
+        ],
+        replica_routing=replica_routing,
+    )
+
+
+@pytest.mark.asyncio
+async def test_read_only_sessions_are_routed_round_robin():
+    manager = make_replicated_manager(2)
+
+    for _ in range(4):
+        async with manager.get_session(read_only=True):
+            pass
+
+    assert [f.call_count for f in manager.replica_session_factories] == [2, 2]
+    manager.session_factory.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_least_busy_routing_skips_replica_with_open_sessions():
+    manager = make_replicated_manager(2, replica_routing="least_busy")
+
+    async with manager.get_session(read_only=True):
+        busy = manager.replica_sessions.index(1)
+        for _ in range(3):
+            async with manager.get_session(read_only=True):
+                assert manager.replica_sessions[busy] == 1
+
+    assert manager.replica_session_factories[busy].call_count == 1
+    assert manager.replica_session_factories[1 - busy].call_count == 3
+    assert manager.replica_sessions == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_read_only_transaction_uses_one_replica_session():
+    manager = make_replicated_manager(2)
+
+    @manager.read_only_transaction
+    async def read():
+        async with manager.get_session(read_only=True) as first:
+            pass
+        async with manager.get_session(read_only=True) as second:
+            pass
+        return first, second
+
+    first, second = await read()
+
+    assert first is second
+    first.commit.assert_awaited_once()
+    manager.session_factory.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_read_only_transaction_rejects_write_session():
+    manager = make_replicated_manager(2)
+
+    @manager.read_only_transaction
+    async def write():
+        async with manager.get_session():
+            pass
+
+    with pytest.raises(ReadOnlyTransactionError):
+        await write()
+
+    manager.session_factory.assert_not_called()
+    assert [f.call_count for f in manager.replica_session_factories] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_reads_after_write_in_same_context_go_to_primary(tmp_path):
+    engines, factories = [], []
+    for name in ("primary", "replica"):
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / name}.sqlite"
+        ).execution_options(schema_translate_map={"calc_schema": None})
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        engines.append(engine)
+        factories.append(async_sessionmaker(bind=engine, expire_on_commit=False))
+    manager = SessionManager(
+        session_factory=factories[0],
+        session_ctx=ContextVar("session_ctx", default=None),
+        replica_session_factories=factories[1:],
+    )
+    repo = CalcResultRepository(session_manager=manager)
+
+    async def write_then_read():
+        await manager.transaction(repo.insert)(total_cost_rub=Decimal("10.00"))
+        return await repo.list_page(limit=10)
+
+    own_writes = await asyncio.create_task(write_then_read())
+    other_request = await asyncio.create_task(repo.list_page(limit=10))
+    for engine in engines:
+        await engine.dispose()
+
+    assert [row["total_cost_rub"] for row in own_writes] == [Decimal("10.00")]
+    assert other_request == []
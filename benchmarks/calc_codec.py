@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.routers.calc import make_calc_router
+from app.services.calc import CalcService
+
+
+def make_payload(size: int) -> bytes:
+    return json.dumps(
+        {
+            "materials": [
+                {"name": f"Материал {i}", "qty": 12.3 + i, "price_rub": 54.5}
+                for i in range(size)
+            ]
+        }
+    ).encode()
+
+
+def make_app(fast_codec: bool) -> FastAPI:
+    calc_service = AsyncMock(spec=CalcService)
+    calc_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("1330.35"),
+        "created_at": datetime.now(timezone.utc),
+    }
+    app = FastAPI()
+    app.include_router(
+        make_calc_router(
+            calc_service=calc_service,
+            transaction=lambda func: func,
+            fast_codec=fast_codec,
+        )
+    )
+    return app
+
+
+async def measure(app: FastAPI, payload: bytes, repeat: int) -> float:
+    timings = []
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await client.post(
+                "/calc",
+                content=payload,
+                headers={"content-type": "application/json"},
+            )
+            timings.append(time.perf_counter() - started)
+            response.raise_for_status()
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Задержка POST /calc: Pydantic против msgspec"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 10, 100, 1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        payload = make_payload(size)
+        repeat = max(3, args.repeat * 100 // max(size, 100))
+        for codec, fast_codec in (("pydantic", False), ("msgspec", True)):
+            ms_p50 = asyncio.run(measure(make_app(fast_codec), payload, repeat))
+            print(
+                json.dumps(
+                    {
+                        "size": size,
+                        "codec": codec,
+                        "bytes": len(payload),
+                        "ms_p50": ms_p50,
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
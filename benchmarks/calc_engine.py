@@ -0,0 +1,64 @@
+import argparse
+import json
+import random
+import timeit
+from decimal import Decimal
+from functools import partial
+
+from app.services.calc_engine import DecimalCalcEngine, NumpyCalcEngine
+
+
+def make_materials(size: int, seed: int) -> list[dict]:
+    rnd = random.Random(seed)
+    return [
+        {
+            "qty": Decimal(rnd.randint(1, 100_000)) / 1000,
+            "price_rub": Decimal(rnd.randint(1, 100_000)) / 100,
+        }
+        for _ in range(size)
+    ]
+
+
+def run(sizes: list[int], repeat: int, seed: int) -> list[dict]:
+    engines = [DecimalCalcEngine(), NumpyCalcEngine()]
+    results = []
+    for size in sizes:
+        materials = make_materials(size, seed)
+        totals = {engine.name: engine.total(materials) for engine in engines}
+        if len(set(totals.values())) != 1:
+            raise AssertionError(f"Результаты движков расходятся: {totals}")
+        number = max(1, 100_000 // size)
+        for engine in engines:
+            best = min(
+                timeit.repeat(
+                    partial(engine.total, materials), number=number, repeat=repeat
+                )
+            )
+            results.append(
+                {
+                    "engine": engine.name,
+                    "size": size,
+                    "seconds": best / number,
+                    "ns_per_item": best / number / size * 1e9,
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Сравнение движков расчета CalcService"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for row in run(args.sizes, args.repeat, args.seed):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import statistics
+import time
+import zlib
+from functools import partial
+from typing import Callable
+
+import zstandard
+
+from app.middlewares.compression import GZIP, ZSTD, make_response_encoder
+
+
+def make_payload(size: int) -> bytes:
+    return json.dumps(
+        {
+            "materials": [
+                {"name": f"Материал {i % 50}", "qty": 12.3 + i % 7, "price_rub": 54.5}
+                for i in range(size)
+            ]
+        }
+    ).encode()
+
+
+def make_decoder(encoding: str) -> Callable[[bytes], bytes]:
+    if encoding == ZSTD:
+        return lambda data: (
+            zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        )
+    return lambda data: zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def compress(encoding: str, payload: bytes, gzip_level: int, zstd_level: int) -> bytes:
+    encode = make_response_encoder(
+        encoding, gzip_level=gzip_level, zstd_level=zstd_level
+    )
+    return encode(payload, True)
+
+
+def measure(func: Callable[[], bytes], repeat: int) -> tuple[bytes, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Размер тела и время сжатия gzip/zstd по размеру ответа"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 10, 100, 1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--zstd-level", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        payload = make_payload(size)
+        repeat = max(3, args.repeat * 100 // max(size, 100))
+        for encoding in (GZIP, ZSTD):
+            compressed, compress_ms = measure(
+                partial(compress, encoding, payload, args.gzip_level, args.zstd_level),
+                repeat,
+            )
+            decompressed, decompress_ms = measure(
+                partial(make_decoder(encoding), compressed), repeat
+            )
+            assert decompressed == payload
+            print(
+                json.dumps(
+                    {
+                        "size": size,
+                        "encoding": encoding,
+                        "bytes": len(payload),
+                        "compressed_bytes": len(compressed),
+                        "ratio": round(len(payload) / len(compressed), 2),
+                        "compress_ms_p50": compress_ms,
+                        "decompress_ms_p50": decompress_ms,
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterator
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient, HTTPError, Limits
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.repositories.models.base import Base
+
+DEFAULT_SIZES = "2:0.7,20:0.2,200:0.08,2000:0.02"
+DEFAULT_MIX = "calc:0.85,batch:0.05,list:0.07,stats:0.03"
+MATERIAL_NAMES = ("Сталь", "Алюминий", "Медь", "Бетон", "Кирпич", "Дерево", "Стекло")
+PERCENTILES = (50, 95, 99)
+COMPARED_LATENCIES = ("p50", "p95", "p99")
+
+
+def parse_weights(value: str) -> list[tuple[str, float]]:
+    weights = []
+    for item in value.split(","):
+        key, _, weight = item.partition(":")
+        weights.append((key.strip(), float(weight)))
+    return weights
+
+
+def make_materials(rng: random.Random, count: int) -> list[dict]:
+    return [
+        {
+            "name": f"{rng.choice(MATERIAL_NAMES)}-{i}",
+            "qty": round(rng.uniform(0.1, 100), 3),
+            "price_rub": round(rng.uniform(1, 5000), 2),
+        }
+        for i in range(count)
+    ]
+
+
+def generate_corpus(
+    count: int, sizes: list[tuple[str, float]], mix: list[tuple[str, float]], seed: int
+) -> list[dict]:
+    rng = random.Random(seed)
+    size_values = [int(size) for size, _ in sizes]
+    size_weights = [weight for _, weight in sizes]
+    kinds = [kind for kind, _ in mix]
+    kind_weights = [weight for _, weight in mix]
+
+    corpus = []
+    for _ in range(count):
+        kind = rng.choices(kinds, kind_weights)[0]
+        size = rng.choices(size_values, size_weights)[0]
+        if kind == "calc":
+            entry = {
+                "method": "POST",
+                "path": "/calc",
+                "json": {"materials": make_materials(rng, size)},
+            }
+        elif kind == "batch":
+            entry = {
+                "method": "POST",
+                "path": "/calc/batch",
+                "json": [
+                    {"materials": make_materials(rng, size)}
+                    for _ in range(rng.randint(2, 10))
+                ],
+            }
+        elif kind == "list":
+            entry = {"method": "GET", "path": f"/calc?limit={rng.choice((10, 50))}"}
+        elif kind == "stats":
+            entry = {"method": "GET", "path": "/calc/stats?bucket=hour"}
+        else:
+            raise ValueError(f"Неизвестный тип запроса: {kind}")
+        corpus.append(entry)
+    return corpus
+
+
+def load_corpus(path: Path) -> list[dict]:
+    with path.open(encoding="utf-8") as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+async def create_sqlite_schema(dsn: str) -> None:
+    engine = create_async_engine(dsn).execution_options(
+        schema_translate_map={"calc_schema": None}
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+def load_app(dsn: str) -> FastAPI:
+    os.environ["DATABASE_DSN"] = dsn
+    from app.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return app
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    summary = {f"p{q}": percentile(latencies, q) * 1000 for q in PERCENTILES}
+    summary["max"] = latencies[-1] * 1000 if latencies else 0.0
+    return summary
+
+
+def route_of(entry: dict) -> str:
+    return f"{entry['method']} {entry['path'].split('?', 1)[0]}"
+
+
+async def replay(
+    client: AsyncClient,
+    entries: Iterator[dict],
+    *,
+    concurrency: int,
+    duration: float | None,
+    requests: int | None,
+) -> dict:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    sent = 0
+
+    def next_entry() -> dict | None:
+        nonlocal sent
+        if requests is not None and sent >= requests:
+            return None
+        if duration is not None and time.perf_counter() >= deadline:
+            return None
+        sent += 1
+        return next(entries)
+
+    async def worker():
+        while (entry := next_entry()) is not None:
+            route = route_of(entry)
+            started = time.perf_counter()
+            try:
+                response = await client.request(
+                    entry["method"],
+                    entry["path"],
+                    json=entry.get("json"),
+                    content=entry.get("content"),
+                    headers=entry.get("headers"),
+                )
+            except HTTPError:
+                errors[route] += 1
+                continue
+            latencies[route].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[route] += 1
+
+    started = time.perf_counter()
+    deadline = started + (duration or 0)
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = [value for values in latencies.values() for value in values]
+    return {
+        "requests": len(total),
+        "errors": sum(errors.values()),
+        "elapsed_s": elapsed,
+        "rps": len(total) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize_latencies(total),
+        "routes": {
+            route: {
+                "requests": len(values),
+                "errors": errors[route],
+                "latency_ms": summarize_latencies(values),
+            }
+            for route, values in sorted(latencies.items())
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    if args.corpus:
+        corpus = load_corpus(Path(args.corpus))
+    else:
+        corpus = generate_corpus(
+            args.count, parse_weights(args.sizes), parse_weights(args.mix), args.seed
+        )
+    requests = None if args.duration else args.requests
+    config = {
+        "target": args.url or args.dsn or "sqlite",
+        "corpus": args.corpus or f"generated:seed={args.seed}",
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+    }
+
+    async def measure(client: AsyncClient) -> dict:
+        entries = itertools.cycle(corpus)
+        if args.warmup:
+            await replay(
+                client,
+                entries,
+                concurrency=args.concurrency,
+                duration=args.warmup,
+                requests=None,
+            )
+        return await replay(
+            client,
+            entries,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            requests=requests,
+        )
+
+    if args.url:
+        async with AsyncClient(
+            base_url=args.url,
+            limits=Limits(max_connections=args.concurrency),
+            timeout=args.timeout,
+        ) as client:
+            return {**config, **await measure(client)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dsn = args.dsn or f"sqlite+aiosqlite:///{Path(tmp) / 'load_test.sqlite'}"
+        app = load_app(dsn)
+        if dsn.startswith("sqlite"):
+            await create_sqlite_schema(dsn)
+        async with (
+            app.router.lifespan_context(app),
+            AsyncClient(
+                transport=ASGITransport(app=app, raise_app_exceptions=False),
+                base_url="http://load-test",
+                timeout=args.timeout,
+            ) as client,
+        ):
+            return {**config, **await measure(client)}
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    *,
+    threshold: float,
+    max_error_rate_increase: float,
+    min_requests: int,
+) -> list[dict]:
+    rows = []
+
+    def add(route: str, metric: str, before: float, after: float, regression: bool):
+        rows.append(
+            {
+                "route": route,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change": (after - before) / before if before else None,
+                "regression": regression,
+            }
+        )
+
+    add(
+        "*",
+        "rps",
+        baseline["rps"],
+        current["rps"],
+        current["rps"] < baseline["rps"] * (1 - threshold),
+    )
+    for route, before in [("*", baseline)] + sorted(baseline["routes"].items()):
+        after = current if route == "*" else current["routes"].get(route)
+        if after is None:
+            continue
+        if min(before["requests"], after["requests"]) >= min_requests:
+            for metric in COMPARED_LATENCIES:
+                add(
+                    route,
+                    f"latency_ms.{metric}",
+                    before["latency_ms"][metric],
+                    after["latency_ms"][metric],
+                    after["latency_ms"][metric]
+                    > before["latency_ms"][metric] * (1 + threshold),
+                )
+        before_error_rate = before["errors"] / max(before["requests"], 1)
+        after_error_rate = after["errors"] / max(after["requests"], 1)
+        add(
+            route,
+            "error_rate",
+            before_error_rate,
+            after_error_rate,
+            after_error_rate > before_error_rate + max_error_rate_increase,
+        )
+    return rows
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--count", type=int, default=5_000)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест: воспроизведение JSONL-корпуса запросов"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate")
+    add_corpus_arguments(generate_parser)
+    generate_parser.add_argument("--out", required=True)
+
+    run_parser = commands.add_parser("run")
+    add_corpus_arguments(run_parser)
+    run_parser.add_argument("--corpus")
+    run_parser.add_argument("--url")
+    run_parser.add_argument("--dsn")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float)
+    run_parser.add_argument("--requests", type=int, default=2_000)
+    run_parser.add_argument("--warmup", type=float, default=1.0)
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--out")
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument("--max-error-rate-increase", type=float, default=0.01)
+    compare_parser.add_argument("--min-requests", type=int, default=100)
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        corpus = generate_corpus(
+            args.count, parse_weights(args.sizes), parse_weights(args.mix), args.seed
+        )
+        with open(args.out, "w", encoding="utf-8") as corpus_file:
+            corpus_file.writelines(
+                json.dumps(entry, ensure_ascii=False) + "\n" for entry in corpus
+            )
+    elif args.command == "run":
+        result = asyncio.run(run(args))
+        print(json.dumps(result))
+        if args.out:
+            Path(args.out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    else:
+        rows = compare(
+            json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+            json.loads(Path(args.current).read_text(encoding="utf-8")),
+            threshold=args.threshold,
+            max_error_rate_increase=args.max_error_rate_increase,
+            min_requests=args.min_requests,
+        )
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
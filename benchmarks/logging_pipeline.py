@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import tempfile
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from app.log_pipeline.log_pipeline import setup_logging
+
+LOG_LINES_PER_REQUEST = 6
+
+trace_id_ctx: ContextVar[str | None] = ContextVar("trace_id_ctx", default=None)
+log = logging.getLogger("benchmarks.logging_pipeline.hot_path")
+
+
+class LegacyJsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        trace_id = trace_id_ctx.get()
+        if not trace_id:
+            trace_id = str(uuid.uuid4())
+        return json.dumps(
+            {
+                "trace_id": trace_id,
+                "timestamp": datetime.fromtimestamp(
+                    record.created, tz=timezone.utc
+                ).isoformat(),
+                "level": record.levelname,
+                "message": record.getMessage(),
+                "source": f"{record.pathname}:{record.lineno}",
+            },
+            ensure_ascii=False,
+        )
+
+
+def setup_legacy(stream) -> None:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(LegacyJsonFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+
+
+async def fake_request(latencies: list[float], with_trace_id: bool) -> None:
+    started = time.perf_counter()
+    if with_trace_id:
+        trace_id_ctx.set(str(uuid.uuid4()))
+    for i in range(LOG_LINES_PER_REQUEST):
+        log.info("Шаг обработки запроса %s", i)
+        await asyncio.sleep(0)
+    latencies.append(time.perf_counter() - started)
+
+
+async def run_load(requests: int, concurrency: int, with_trace_id: bool) -> list[float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker():
+        async with semaphore:
+            await fake_request(latencies, with_trace_id)
+
+    await asyncio.gather(*(worker() for _ in range(requests)))
+    return latencies
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=1000)[int(q * 10) - 1]
+
+
+def run_case(name: str, setup, requests: int, concurrency: int) -> dict:
+    with tempfile.NamedTemporaryFile("w", buffering=1, suffix=".log") as stream:
+        stop = setup(stream)
+        started = time.perf_counter()
+        latencies = asyncio.run(run_load(requests, concurrency, with_trace_id=True))
+        elapsed = time.perf_counter() - started
+        if stop is not None:
+            stop()
+    return {
+        "case": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": requests / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Задержка запросов при синхронном и очередном логировании"
+    )
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sampling-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    cases = [
+        ("sync_stream_handler", setup_legacy),
+        (
+            "queue_listener",
+            lambda stream: setup_logging(level="INFO", stream=stream).stop,
+        ),
+        (
+            f"queue_listener_sampled_{args.sampling_rate}",
+            lambda stream: (
+                setup_logging(
+                    level="INFO",
+                    stream=stream,
+                    sampling_rates={log.name: args.sampling_rate},
+                ).stop
+            ),
+        ),
+    ]
+    for name, setup in cases:
+        print(json.dumps(run_case(name, setup, args.requests, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
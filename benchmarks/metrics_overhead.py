@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import timeit
+from contextvars import ContextVar
+from pathlib import Path
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.metrics.metrics import Metrics, make_instrumented_pool_class
+from app.middlewares.metrics import MetricsMiddleware
+from app.repositories.calc_result import CalcResultRepository
+from app.repositories.models.base import Base
+from app.routers.calc import make_calc_router
+from app.services.calc import CalcService
+from app.session_manager.session_manager import SessionManager
+
+CALC_PAYLOAD = {
+    "materials": [
+        {"name": "Сталь", "qty": 12.3, "price_rub": 54.5},
+        {"name": "Алюминий", "qty": 5.5, "price_rub": 120.0},
+    ]
+}
+
+
+async def make_app(db_path: Path, metrics: Metrics | None):
+    engine_options = {}
+    if metrics is not None:
+        engine_options["poolclass"] = make_instrumented_pool_class(metrics)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}", **engine_options
+    ).execution_options(schema_translate_map={"calc_schema": None})
+    if metrics is not None:
+        metrics.instrument_engine(engine.sync_engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_manager = SessionManager(
+        session_factory=async_sessionmaker(bind=engine, expire_on_commit=False),
+        session_ctx=ContextVar("session_ctx", default=None),
+        metrics=metrics,
+    )
+    calc_service = CalcService(
+        calc_result_repository=CalcResultRepository(session_manager=session_manager),
+        metrics=metrics,
+    )
+
+    app = FastAPI()
+    app.include_router(
+        make_calc_router(
+            calc_service=calc_service,
+            transaction=session_manager.transaction,
+            metrics=metrics,
+        )
+    )
+    if metrics is not None:
+        app.add_middleware(MetricsMiddleware, metrics=metrics)
+    return app, engine
+
+
+async def measure(variant: str, requests: int, concurrency: int) -> float:
+    metrics = Metrics() if variant == "metrics" else None
+    with tempfile.TemporaryDirectory() as tmp:
+        app, engine = await make_app(Path(tmp) / "bench.sqlite", metrics)
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            remaining = requests
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    response = await client.post("/calc", json=CALC_PAYLOAD)
+                    response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+        await engine.dispose()
+    return requests / elapsed
+
+
+def measure_primitives(number: int) -> list[dict]:
+    metrics = Metrics()
+    operations = {
+        "observe_stage": lambda: metrics.observe_stage("calculation", 0.001),
+        "observe_request": lambda: metrics.observe_request("POST", "/calc", 200, 0.001),
+    }
+    return [
+        {
+            "op": name,
+            "ns": min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9,
+        }
+        for name, func in operations.items()
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Накладные расходы метрик Prometheus на POST /calc"
+    )
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    for row in measure_primitives(100_000):
+        print(json.dumps(row))
+    for variant in ("no_metrics", "metrics"):
+        rps = max(
+            asyncio.run(measure(variant, args.requests, args.concurrency))
+            for _ in range(args.rounds)
+        )
+        print(json.dumps({"path": "/calc", "variant": variant, "rps": rps}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+from fastapi import FastAPI, Request
+from httpx import ASGITransport, AsyncClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middlewares.trace_id import TraceIdMiddleware
+from app.routers.calc import make_calc_router
+from app.services.calc import CalcService
+
+CALC_PAYLOAD = {
+    "materials": [
+        {"name": "Сталь", "qty": 12.3, "price_rub": 54.5},
+        {"name": "Алюминий", "qty": 5.5, "price_rub": 120.0},
+    ]
+}
+
+
+def make_legacy_middleware(trace_id_ctx: ContextVar[str | None]):
+    class LegacyTraceIdMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request: Request, call_next):
+            token = trace_id_ctx.set(str(uuid.uuid4()))
+            try:
+                return await call_next(request)
+            finally:
+                trace_id_ctx.reset(token)
+
+    return LegacyTraceIdMiddleware
+
+
+def make_app(variant: str) -> FastAPI:
+    trace_id_ctx: ContextVar[str | None] = ContextVar("trace_id_ctx", default=None)
+    calc_service = AsyncMock(spec=CalcService)
+    calc_service.calculate_and_save.return_value = {
+        "id": 1,
+        "total_cost_rub": Decimal("1330.35"),
+        "created_at": datetime.now(timezone.utc),
+    }
+
+    app = FastAPI()
+    app.include_router(
+        make_calc_router(calc_service=calc_service, transaction=lambda func: func)
+    )
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "time": datetime.now(timezone.utc).isoformat()}
+
+    if variant == "base_http_middleware":
+        app.add_middleware(make_legacy_middleware(trace_id_ctx))
+    elif variant == "pure_asgi":
+        app.add_middleware(TraceIdMiddleware, trace_id_ctx=trace_id_ctx)
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                if path == "/calc":
+                    response = await client.post(path, json=CALC_PAYLOAD)
+                else:
+                    response = await client.get(path)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Пропускная способность TraceIdMiddleware: до и после"
+    )
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    for path in ("/health", "/calc"):
+        for variant in ("no_middleware", "base_http_middleware", "pure_asgi"):
+            app = make_app(variant)
+            rps = max(
+                asyncio.run(measure(app, path, args.requests, args.concurrency))
+                for _ in range(args.rounds)
+            )
+            print(json.dumps({"path": path, "variant": variant, "rps": rps}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+ALTER TABLE calc_schema.calc_results
+    ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
+CREATE UNIQUE INDEX IF NOT EXISTS calc_results_idempotency_key_uq
+    ON calc_schema.calc_results (idempotency_key);
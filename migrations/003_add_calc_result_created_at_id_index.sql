@@ -0,0 +1,2 @@
+CREATE INDEX CONCURRENTLY IF NOT EXISTS calc_results_created_at_id_idx
+    ON calc_schema.calc_results (created_at, id);
@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS calc_schema.calc_result_rollups (
+    granularity VARCHAR(8) NOT NULL,
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    shard SMALLINT NOT NULL,
+    count BIGINT NOT NULL,
+    total_cost_rub NUMERIC(20,2) NOT NULL,
+    PRIMARY KEY (granularity, bucket, shard)
+);
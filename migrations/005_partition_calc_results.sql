@@ -0,0 +1,71 @@
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS calc_schema.calc_result_idempotency_keys (
+    idempotency_key VARCHAR(255) PRIMARY KEY,
+    result_id INTEGER,
+    result_created_at TIMESTAMP WITH TIME ZONE
+);
+
+INSERT INTO calc_schema.calc_result_idempotency_keys
+    (idempotency_key, result_id, result_created_at)
+SELECT idempotency_key, id, created_at
+FROM calc_schema.calc_results
+WHERE idempotency_key IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE calc_schema.calc_results RENAME TO calc_results_legacy;
+ALTER TABLE calc_schema.calc_results_legacy DROP CONSTRAINT calc_results_pkey;
+ALTER TABLE calc_schema.calc_results_legacy
+    ADD CONSTRAINT calc_results_legacy_pkey PRIMARY KEY (id, created_at);
+ALTER INDEX calc_schema.calc_results_created_at_id_idx
+    RENAME TO calc_results_legacy_created_at_id_idx;
+DROP INDEX calc_schema.calc_results_idempotency_key_uq;
+ALTER TABLE calc_schema.calc_results_legacy DROP COLUMN idempotency_key;
+
+CREATE TABLE calc_schema.calc_results (
+    id INTEGER NOT NULL DEFAULT nextval('calc_schema.calc_results_id_seq'),
+    total_cost_rub NUMERIC(12,2) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE calc_schema.calc_results_id_seq OWNED BY calc_schema.calc_results.id;
+
+CREATE INDEX calc_results_created_at_id_idx
+    ON calc_schema.calc_results (created_at, id);
+
+DO $$
+DECLARE
+    boundary TIMESTAMP WITH TIME ZONE :=
+        date_trunc('month', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+        + interval '1 month';
+    month_start TIMESTAMP WITH TIME ZONE;
+BEGIN
+    EXECUTE format(
+        'ALTER TABLE calc_schema.calc_results_legacy
+             ADD CONSTRAINT calc_results_legacy_bound CHECK (created_at < %L)',
+        boundary
+    );
+    EXECUTE format(
+        'ALTER TABLE calc_schema.calc_results ATTACH PARTITION
+             calc_schema.calc_results_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        boundary
+    );
+    ALTER TABLE calc_schema.calc_results_legacy DROP CONSTRAINT calc_results_legacy_bound;
+
+    CREATE TABLE calc_schema.calc_results_default
+        PARTITION OF calc_schema.calc_results DEFAULT;
+
+    FOR i IN 0..2 LOOP
+        month_start := boundary + make_interval(months => i);
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS calc_schema.%I PARTITION OF calc_schema.calc_results
+                 FOR VALUES FROM (%L) TO (%L)',
+            'calc_results_p' || to_char(month_start AT TIME ZONE 'UTC', 'YYYYMM'),
+            month_start,
+            month_start + interval '1 month'
+        );
+    END LOOP;
+END $$;
+
+COMMIT;
@@ -0,0 +1,22 @@
+CREATE TABLE IF NOT EXISTS calc_schema.materials (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE,
+    price_rub NUMERIC(12,2) NOT NULL CHECK (price_rub > 0),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION calc_schema.notify_material_price_change()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'calc_material_prices',
+        json_build_object('id', OLD.id, 'name', OLD.name)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS materials_notify_price_change ON calc_schema.materials;
+CREATE TRIGGER materials_notify_price_change
+    AFTER UPDATE OR DELETE ON calc_schema.materials
+    FOR EACH ROW EXECUTE FUNCTION calc_schema.notify_material_price_change();
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS calc_schema.calc_result_items (
+    result_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    result_created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    material_id INTEGER,
+    name TEXT,
+    qty NUMERIC NOT NULL,
+    price_rub NUMERIC NOT NULL,
+    PRIMARY KEY (result_id, line_no)
+);
+
+CREATE INDEX IF NOT EXISTS calc_result_items_result_created_at_idx
+    ON calc_schema.calc_result_items USING brin (result_created_at);
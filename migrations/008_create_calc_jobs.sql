@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS calc_schema.calc_jobs (
+    id SERIAL PRIMARY KEY,
+    status VARCHAR(16) NOT NULL,
+    materials JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_id INTEGER,
+    result_total_cost_rub NUMERIC(12,2),
+    result_created_at TIMESTAMP WITH TIME ZONE,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS calc_jobs_unfinished_idx
+    ON calc_schema.calc_jobs (status, updated_at)
+    WHERE status IN ('queued', 'running');